@@ -1,22 +1,27 @@
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import UUID
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
 
-from .database import get_db
+from .database import AsyncSessionLectura, get_db, get_async_db
 from .models import Usuario
 from .schemas import TokenData
+from .services.hash_service import pwd_context, servicio_hash
+from .services.identidad_service import (
+    Identidad, cache_identidades, IDENTIDAD_TOKEN_STATELESS
+)
 
 # Configuración
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -24,13 +29,17 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    """Generar hash de contraseña"""
-    return pwd_context.hash(password)
+    """Generar hash de contraseña (en el pool de hashing)"""
+    return servicio_hash.hashear_sync(password)
 
 def get_user_by_username(db: Session, username: str) -> Optional[Usuario]:
     """Obtener usuario por username"""
     return db.query(Usuario).filter(Usuario.username == username).first()
 
+async def get_user_by_username_async(db: AsyncSession, username: str) -> Optional[Usuario]:
+    """Obtener usuario por username (sesión async)"""
+    return (await db.scalars(select(Usuario).where(Usuario.username == username))).first()
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[Usuario]:
     """Autenticar usuario"""
     user = get_user_by_username(db, username)
@@ -54,45 +63,127 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> Usuario:
-    """Obtener usuario actual desde el token"""
-    credentials_exception = HTTPException(
+def _credenciales_invalidas() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decodificar_token(token: str) -> dict:
+    """Validar el JWT y retornar su payload (con 'sub' obligatorio)"""
+    credentials_exception = _credenciales_invalidas()
     
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    
-    user = get_user_by_username(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
-    
-    if not user.activo:
+    return payload
+
+def _verificar_activo(activo: bool) -> None:
+    if not activo:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Usuario inactivo"
         )
-    
+
+def _usuario_actual(user: Optional[Usuario]) -> Usuario:
+    if user is None:
+        raise _credenciales_invalidas()
+    _verificar_activo(user.activo)
+    cache_identidades.guardar(Identidad.desde_usuario(user))
     return user
 
-async def get_current_active_admin(
-    current_user: Usuario = Depends(get_current_user)
+def _identidad_sin_consulta(payload: dict) -> Optional[Identidad]:
+    """Identidad desde los claims del token (modo stateless) o desde la caché"""
+    username = payload["sub"]
+    # Modo stateless: el token ya trae id y rol
+    if IDENTIDAD_TOKEN_STATELESS and payload.get("uid") and payload.get("rol"):
+        try:
+            return Identidad(id=UUID(payload["uid"]), username=username, activo=True, rol=payload["rol"])
+        except ValueError:
+            pass
+    return cache_identidades.obtener(username)
+
+def _identidad_desde_usuario(user: Optional[Usuario]) -> Identidad:
+    if user is None:
+        raise _credenciales_invalidas()
+    identidad = Identidad.desde_usuario(user)
+    cache_identidades.guardar(identidad)
+    return identidad
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Usuario:
+    """Obtener usuario actual (fila completa) desde el token"""
+    payload = _decodificar_token(token)
+    user = _usuario_actual(get_user_by_username(db, username=payload["sub"]))
+    db.info["usuario_id"] = user.id
+    return user
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
 ) -> Usuario:
+    """Obtener usuario actual (fila completa) desde el token, con sesión async"""
+    payload = _decodificar_token(token)
+    user = _usuario_actual(await get_user_by_username_async(db, username=payload["sub"]))
+    db.info["usuario_id"] = user.id
+    return user
+
+def get_current_identity(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> Identidad:
+    """
+    Obtener la identidad del usuario actual (id, username, rol, email).
+    Usa la caché de identidades y solo consulta la base de datos si no está.
+    """
+    payload = _decodificar_token(token)
+    identidad = _identidad_sin_consulta(payload)
+    if identidad is None:
+        identidad = _identidad_desde_usuario(get_user_by_username(db, username=payload["sub"]))
+    _verificar_activo(identidad.activo)
+    # Las escrituras de esta sesión activan la lectura de lo propio (ver database.py)
+    db.info["usuario_id"] = identidad.id
+    return identidad
+
+async def get_current_identity_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> Identidad:
+    """Igual que get_current_identity, para endpoints async"""
+    payload = _decodificar_token(token)
+    identidad = _identidad_sin_consulta(payload)
+    if identidad is None:
+        identidad = _identidad_desde_usuario(await get_user_by_username_async(db, username=payload["sub"]))
+    _verificar_activo(identidad.activo)
+    # Las escrituras de esta sesión activan la lectura de lo propio (ver database.py)
+    db.info["usuario_id"] = identidad.id
+    return identidad
+
+async def get_async_db_lectura(
+    identidad: Identidad = Depends(get_current_identity_async)
+):
+    """
+    Sesión async de solo lectura para el usuario actual: va a una réplica,
+    salvo que el usuario haya escrito hace poco (entonces a la primaria).
+    """
+    async with AsyncSessionLectura(identidad.id) as db:
+        yield db
+
+async def get_current_active_admin(
+    current_user: Identidad = Depends(get_current_identity)
+) -> Identidad:
     """Verificar que el usuario sea admin"""
     if current_user.rol != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="No tienes permisos de administrador"
         )
-    return current_user
\ No newline at end of file
+    return current_user
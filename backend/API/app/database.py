@@ -1,7 +1,22 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import cookie_parser
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+import itertools
+import logging
 import os
+import threading
+import time
+
+from .services.metricas_db_service import PoolAsyncInstrumentado, PoolInstrumentado, metricas_db
+
+logger = logging.getLogger(__name__)
 
 # URL de conexión a la base de datos
 DATABASE_URL = os.getenv(
@@ -9,17 +24,51 @@ DATABASE_URL = os.getenv(
     "postgresql://app_user:secure_password_123@db:5432/app_db"
 )
 
+# Tamaño del pool sync por proceso; con varios workers, sumar contra max_connections de PostgreSQL
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Segundos que se espera una conexión libre antes de fallar (aplica a todos los pools)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
 # Crear engine
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    poolclass=PoolInstrumentado,
+    pool_logging_name="primaria"
 )
 
 # Crear SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _url_async(url: str) -> str:
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+# Engine async (asyncpg) para los endpoints async; el engine sync queda para scripts y endpoints def
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _url_async(DATABASE_URL))
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "30"))
+
+# Las peticiones que esperan una conexión no ocupan hilos, así que el pool puede ser más grande
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=ASYNC_DB_POOL_SIZE,
+    max_overflow=ASYNC_DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    poolclass=PoolAsyncInstrumentado,
+    pool_logging_name="primaria_async"
+)
+
+metricas_db.registrar_engine("primaria", engine)
+metricas_db.registrar_engine("primaria_async", async_engine.sync_engine)
+
+# expire_on_commit=False: en async no se puede recargar un atributo de forma implícita
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base para los modelos
 Base = declarative_base()
 
@@ -29,4 +78,266 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency para obtener una sesión async de base de datos
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# ==================== RÉPLICAS DE LECTURA ====================
+
+# URLs de réplicas separadas por coma; vacío = todas las lecturas van a la primaria
+REPLICA_DATABASE_URLS = [u.strip() for u in os.getenv("REPLICA_DATABASE_URLS", "").split(",") if u.strip()]
+# round_robin o menos_conexiones
+REPLICA_ESTRATEGIA = os.getenv("REPLICA_ESTRATEGIA", "round_robin")
+# Segundos entre chequeos de salud de las réplicas
+REPLICA_CHEQUEO_SEGUNDOS = float(os.getenv("REPLICA_CHEQUEO_SEGUNDOS", "5"))
+# Retraso de replicación tolerado antes de sacar una réplica de rotación
+REPLICA_RETRASO_MAX_SEGUNDOS = float(os.getenv("REPLICA_RETRASO_MAX_SEGUNDOS", "5"))
+# Tras escribir, las lecturas del mismo usuario van a la primaria durante esta ventana
+LECTURA_PROPIA_SEGUNDOS = float(os.getenv("LECTURA_PROPIA_SEGUNDOS", "5"))
+# Cookie y header con los que el cliente devuelve la marca de su última escritura
+# (epoch hasta el que sus lecturas van a la primaria); así la marca sirve en cualquier worker
+LECTURA_PROPIA_COOKIE = "lectura_propia"
+LECTURA_PROPIA_HEADER = "X-Lectura-Propia"
+
+# Retraso en segundos; 0 si la réplica ya aplicó todo lo recibido (la primaria puede estar inactiva)
+_SQL_RETRASO = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class _Replica:
+    """Engines sync y async de una réplica y su último estado conocido"""
+
+    def __init__(self, url: str, posicion: int = 0):
+        self.nombre = make_url(url).render_as_string(hide_password=True)
+        self.engine = create_engine(
+            url, pool_pre_ping=True, pool_size=5, max_overflow=10, pool_timeout=DB_POOL_TIMEOUT,
+            connect_args={"connect_timeout": 3},
+            poolclass=PoolInstrumentado, pool_logging_name=f"replica{posicion}"
+        )
+        self.async_engine = create_async_engine(
+            _url_async(url), pool_pre_ping=True, pool_timeout=DB_POOL_TIMEOUT,
+            pool_size=ASYNC_DB_POOL_SIZE, max_overflow=ASYNC_DB_MAX_OVERFLOW,
+            poolclass=PoolAsyncInstrumentado, pool_logging_name=f"replica{posicion}_async"
+        )
+        metricas_db.registrar_engine(f"replica{posicion}", self.engine)
+        metricas_db.registrar_engine(f"replica{posicion}_async", self.async_engine.sync_engine)
+        self.sana = False
+        self.retraso: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def conexiones(self) -> int:
+        return self.engine.pool.checkedout() + self.async_engine.sync_engine.pool.checkedout()
+
+
+@dataclass
+class _MarcaLectura:
+    """Marca de escritura de la petición en curso"""
+    primaria_hasta: float = 0.0
+    escribio: bool = False
+
+
+_marca_actual: ContextVar[Optional[_MarcaLectura]] = ContextVar("lectura_propia", default=None)
+
+
+class EnrutadorLecturas:
+    """Elige la réplica de cada lectura y vigila su salud en un hilo"""
+
+    def __init__(self, urls: List[str], estrategia: str = REPLICA_ESTRATEGIA):
+        self.replicas = [_Replica(url, i) for i, url in enumerate(urls)]
+        self.estrategia = estrategia
+        self._turno = itertools.count()
+        # usuario_id -> instante (monotonic) hasta el que sus lecturas van a la primaria
+        self._escrituras: Dict[Any, float] = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo: Optional[threading.Thread] = None
+        self._contadores = {"replica": 0, "primaria_sin_replicas": 0, "primaria_por_escritura": 0}
+
+    def _contar(self, nombre: str) -> None:
+        with self._lock:
+            self._contadores[nombre] += 1
+
+    def elegir(self, usuario_id: Any = None) -> Optional[_Replica]:
+        """Réplica para una lectura, o None si debe ir a la primaria"""
+        if not self.replicas:
+            return None
+        if usuario_id is not None and self._escritura_reciente(usuario_id):
+            self._contar("primaria_por_escritura")
+            return None
+        sanas = [r for r in self.replicas if r.sana]
+        if not sanas:
+            self._contar("primaria_sin_replicas")
+            return None
+        self._contar("replica")
+        if self.estrategia == "menos_conexiones":
+            return min(sanas, key=lambda r: r.conexiones())
+        return sanas[next(self._turno) % len(sanas)]
+
+    # ---------- lecturas propias ----------
+
+    def registrar_escritura(self, usuario_id: Any) -> None:
+        ahora = time.monotonic()
+        with self._lock:
+            self._escrituras[usuario_id] = ahora + LECTURA_PROPIA_SEGUNDOS
+            if len(self._escrituras) > 10000:
+                self._escrituras = {u: t for u, t in self._escrituras.items() if t > ahora}
+
+    def _escritura_reciente(self, usuario_id: Any) -> bool:
+        # La marca del cliente cubre las escrituras hechas en otros workers
+        marca = _marca_actual.get()
+        if marca is not None and marca.primaria_hasta > time.time():
+            return True
+        with self._lock:
+            hasta = self._escrituras.get(usuario_id)
+        return hasta is not None and hasta > time.monotonic()
+
+    # ---------- salud ----------
+
+    def verificar(self) -> None:
+        """Medir el retraso de cada réplica y sacar de rotación las caídas o atrasadas"""
+        for replica in self.replicas:
+            try:
+                with replica.engine.connect() as conn:
+                    replica.retraso = float(conn.execute(_SQL_RETRASO).scalar())
+                replica.error = None
+                sana = replica.retraso <= REPLICA_RETRASO_MAX_SEGUNDOS
+            except Exception as e:
+                replica.retraso = None
+                replica.error = str(e).splitlines()[0]
+                sana = False
+            if sana != replica.sana:
+                logger.warning("Réplica %s %s (retraso=%s, error=%s)", replica.nombre,
+                               "en rotación" if sana else "fuera de rotación", replica.retraso, replica.error)
+            replica.sana = sana
+
+    def _bucle(self) -> None:
+        while not self._detener.wait(REPLICA_CHEQUEO_SEGUNDOS):
+            self.verificar()
+
+    def iniciar(self) -> None:
+        """Primer chequeo (las réplicas empiezan fuera de rotación) y luego uno periódico"""
+        if not self.replicas or (self._hilo and self._hilo.is_alive()):
+            return
+        self._detener.clear()
+        self.verificar()
+        self._hilo = threading.Thread(target=self._bucle, name="replicas", daemon=True)
+        self._hilo.start()
+
+    def detener(self) -> None:
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=REPLICA_CHEQUEO_SEGUNDOS + 5)
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+    async def cerrar_async(self) -> None:
+        for replica in self.replicas:
+            await replica.async_engine.dispose()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Estado de las réplicas para monitoreo"""
+        with self._lock:
+            contadores = dict(self._contadores)
+            ventanas = sum(1 for t in self._escrituras.values() if t > time.monotonic())
+        return {
+            "estrategia": self.estrategia,
+            "replicas": [
+                {"nombre": r.nombre, "sana": r.sana, "retraso_segundos": r.retraso,
+                 "error": r.error, "conexiones": r.conexiones()}
+                for r in self.replicas
+            ],
+            "lecturas": contadores,
+            "usuarios_en_ventana_de_escritura": ventanas,
+        }
+
+
+# Instancia compartida por la aplicación
+enrutador_lecturas = EnrutadorLecturas(REPLICA_DATABASE_URLS)
+
+def SessionLectura(usuario_id: Any = None) -> Session:
+    """Sesión sync de solo lectura (réplica o primaria)"""
+    replica = enrutador_lecturas.elegir(usuario_id)
+    return SessionLocal(bind=replica.engine) if replica else SessionLocal()
+
+def AsyncSessionLectura(usuario_id: Any = None):
+    """Sesión async de solo lectura (réplica o primaria)"""
+    replica = enrutador_lecturas.elegir(usuario_id)
+    return AsyncSessionLocal(bind=replica.async_engine) if replica else AsyncSessionLocal()
+
+# Dependency para lecturas que no dependen de escrituras recientes del usuario
+def get_db_lectura():
+    db = SessionLectura()
+    try:
+        yield db
+    finally:
+        db.close()
+
+if REPLICA_DATABASE_URLS:
+    # Lectura de lo propio: las dependencias de autenticación guardan el usuario en
+    # session.info; si la sesión escribió, sus próximas lecturas van a la primaria
+    @event.listens_for(Session, "after_flush")
+    def _marcar_escritura_orm(session, flush_context):
+        session.info["escribio"] = True
+
+    @event.listens_for(Session, "do_orm_execute")
+    def _marcar_escritura_dml(estado):
+        if estado.is_insert or estado.is_update or estado.is_delete:
+            estado.session.info["escribio"] = True
+
+    @event.listens_for(Session, "after_commit")
+    def _registrar_escritura(session):
+        if session.info.pop("escribio", False) and session.info.get("usuario_id") is not None:
+            enrutador_lecturas.registrar_escritura(session.info["usuario_id"])
+            # MiddlewareLecturaPropia la devuelve al cliente en la respuesta
+            marca = _marca_actual.get()
+            if marca is not None:
+                marca.escribio = True
+
+
+class MiddlewareLecturaPropia:
+    """
+    Middleware ASGI: lee la marca de escritura que trae el cliente (cookie o
+    header) y, si la petición escribió, responde con una nueva. La ventana en
+    memoria de EnrutadorLecturas solo la ve el worker que atendió la escritura.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        valor = headers.get(LECTURA_PROPIA_HEADER) or cookie_parser(headers.get("cookie", "")).get(LECTURA_PROPIA_COOKIE)
+        marca = _MarcaLectura()
+        if valor:
+            try:
+                # Acotada a la ventana: el cliente no puede fijar la primaria indefinidamente
+                marca.primaria_hasta = min(float(valor), time.time() + LECTURA_PROPIA_SEGUNDOS)
+            except ValueError:
+                pass
+        token = _marca_actual.set(marca)
+
+        async def enviar(mensaje):
+            if marca.escribio and mensaje["type"] == "http.response.start":
+                hasta = f"{time.time() + LECTURA_PROPIA_SEGUNDOS:.3f}"
+                respuesta = MutableHeaders(scope=mensaje)
+                respuesta.append(LECTURA_PROPIA_HEADER, hasta)
+                respuesta.append("Set-Cookie", f"{LECTURA_PROPIA_COOKIE}={hasta}; Max-Age={int(LECTURA_PROPIA_SEGUNDOS) + 1}; "
+                                               "Path=/; HttpOnly; SameSite=Lax")
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _marca_actual.reset(token)
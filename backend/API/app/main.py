@@ -1,30 +1,58 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, status
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from datetime import date, timedelta
 from typing import List, Optional, Dict, Any
-from uuid import UUID
-import json
+from uuid import UUID, uuid4
+import hmac
 import os
 
-from .database import engine, get_db, Base
+from .database import (
+    engine, async_engine, enrutador_lecturas, get_db, get_db_lectura, get_async_db, Base,
+    MiddlewareLecturaPropia, REPLICA_DATABASE_URLS
+)
 from .models import Usuario, Documento, DetalleDocumento, DireccionDespacho
 from .schemas import (
     UsuarioCreate, UsuarioResponse, UsuarioUpdate,
     DocumentoCreate, DocumentoResponse,
     DetalleDocumentoCreate, DetalleDocumentoResponse,
     CompraResponse,
+    ProductoResponse, ProductoListaResponse,
     CheckoutRequest,
-    Token,
+    Token, RefreshTokenRequest, CambioPassword,
     DireccionDespachoCreate, DireccionDespachoUpdate, DireccionDespachoResponse
 )
+from .paginacion import OrdenKeyset, CursorInvalidoError
+from .serializacion import SerializadorFilas
 from .validators import validar_rut_chileno, validar_telefono_chileno, validar_complejidad_password
-from .services.documento_service import generar_pdf_documento
+from .services.cola_pdf_service import cola_pdf, encolar_pdf, PDF_RETRY_AFTER_SEGUNDOS
+from .services.zip_pdf_service import generar_zip_pdfs
+from .services.identidad_service import Identidad, cache_identidades
+from .services.hash_service import servicio_hash, HashSaturadoError
+from .services import refresh_token_service
+from .services.refresh_token_service import (
+    emitir_refresh_token, rotar_refresh_token, revocar_familia, revocar_tokens_usuario,
+    RefreshTokenInvalidoError
+)
+from .services.limite_service import (
+    limitador_intentos, ip_cliente, LimiteExcedidoError,
+    REGLA_LOGIN_IP, REGLA_LOGIN_USUARIO, REGLA_REGISTRO_IP
+)
+from .services.metricas_db_service import metricas_db, MiddlewareMetricasDB, METRICS_TOKEN
+from .services.metricas_service import (
+    registro_metricas, MiddlewareMetricasHTTP, contador_checkouts, contador_login_fallido
+)
+from .services.perfil_service import almacen_perfiles, MiddlewarePerfil, PERFIL_HABILITADO
+from .services.catalogo_service import catalogo_productos, catalogo_envios
+from .services.stock_service import asegurar_productos_async, reservar_stock, StockInsuficienteError
 from .auth import (
-    authenticate_user, create_access_token, 
-    get_current_user, get_password_hash,
+    create_access_token, get_user_by_username_async,
+    get_current_user, get_current_user_async, get_current_identity, get_current_identity_async,
+    get_async_db_lectura, get_current_active_admin, get_password_hash,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
@@ -57,33 +85,196 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Consultas, tiempo en la base de datos y espera del pool por petición
+app.add_middleware(MiddlewareMetricasDB)
+# Latencia por ruta y código de estado (mide también a los demás middlewares)
+app.add_middleware(MiddlewareMetricasHTTP)
+
+# Marca de escritura en cookie/header para leer lo propio en cualquier worker; sin réplicas no hace falta
+if REPLICA_DATABASE_URLS:
+    app.add_middleware(MiddlewareLecturaPropia)
+
+# Perfilado bajo demanda; deshabilitado no se instala
+if PERFIL_HABILITADO:
+    app.add_middleware(MiddlewarePerfil)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Órdenes de los listados paginados; cada uno tiene su índice compuesto en init-db.sql
+_ORDEN_USUARIOS = OrdenKeyset("fecha_asc", Usuario.fecha_creacion, Usuario.id)
+_ORDEN_DOCUMENTOS = OrdenKeyset("fecha_asc", Documento.fecha_creacion, Documento.id)
+_ORDENES_COMPRAS = {
+    "fecha_desc": OrdenKeyset("fecha_desc", Documento.fecha_creacion, Documento.id, descendente=True),
+    "fecha_asc": OrdenKeyset("fecha_asc", Documento.fecha_creacion, Documento.id),
+    "monto_desc": OrdenKeyset("monto_desc", Documento.monto_total, Documento.id, descendente=True),
+    "monto_asc": OrdenKeyset("monto_asc", Documento.monto_total, Documento.id),
+}
+
+def _paginar(query, orden: OrdenKeyset, cursor: Optional[str], skip: int, limit: int):
+    """
+    Ordenar y paginar un listado: por cursor si se envía, si no por offset (modo legado).
+    El cursor de la página siguiente va en el header X-Next-Cursor.
+    """
+    try:
+        query = orden.aplicar(query, cursor)
+    except CursorInvalidoError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail={"cursor": str(e)})
+    if not cursor and skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def _headers_paginacion(orden: OrdenKeyset, filas, limit: int) -> Dict[str, str]:
+    siguiente = orden.siguiente_cursor(filas, limit)
+    return {"X-Next-Cursor": siguiente} if siguiente else {}
+
+@app.on_event("startup")
+def cargar_catalogos():
+    """Cargar catálogos de productos y envíos en memoria al iniciar"""
+    catalogo_productos.cargar()
+    catalogo_envios.cargar()
+
+@app.on_event("startup")
+def iniciar_cola_pdf():
+    """Iniciar los hilos que generan los PDFs pendientes"""
+    cola_pdf.iniciar()
+
+@app.on_event("shutdown")
+def detener_cola_pdf():
+    """Detener los hilos de la cola de PDFs"""
+    cola_pdf.detener()
+
+@app.on_event("startup")
+def iniciar_metricas():
+    """Publicar periódicamente las métricas de este worker (si hay METRICAS_DIR)"""
+    registro_metricas.iniciar()
+
+@app.on_event("shutdown")
+def detener_metricas():
+    """Dejar de publicar y pasar los contadores de este worker a acumulado.json"""
+    registro_metricas.detener()
+
+@app.on_event("startup")
+def iniciar_replicas():
+    """Primer chequeo de las réplicas de lectura y vigilancia periódica"""
+    enrutador_lecturas.iniciar()
+
+@app.on_event("shutdown")
+def detener_replicas():
+    """Detener la vigilancia de réplicas y cerrar sus conexiones sync"""
+    enrutador_lecturas.detener()
+
+@app.on_event("shutdown")
+async def cerrar_engine_async():
+    """Cerrar las conexiones de los pools async"""
+    await async_engine.dispose()
+    await enrutador_lecturas.cerrar_async()
+
 # ==================== AUTH ENDPOINTS ====================
 
+def _limite_excedido(error: LimiteExcedidoError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Demasiados intentos, intente nuevamente más tarde",
+        headers={"Retry-After": str(error.reintentar_en)},
+    )
+
+def limitar_login(request: Request, form_data: OAuth2PasswordRequestForm = Depends()) -> None:
+    """Rechazar el login si la IP o el username superaron su límite de intentos"""
+    try:
+        limitador_intentos.verificar(REGLA_LOGIN_IP, ip_cliente(request))
+        limitador_intentos.verificar(REGLA_LOGIN_USUARIO, form_data.username)
+    except LimiteExcedidoError as e:
+        contador_login_fallido.incrementar("limite")
+        raise _limite_excedido(e)
+
+def limitar_registro(request: Request) -> None:
+    """Rechazar el registro si la IP superó su límite de intentos"""
+    try:
+        limitador_intentos.verificar(REGLA_REGISTRO_IP, ip_cliente(request))
+    except LimiteExcedidoError as e:
+        raise _limite_excedido(e)
+
 @app.post("/token", response_model=Token)
 async def login(
+    _limite: None = Depends(limitar_login),
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Endpoint para obtener token JWT"""
-    user = authenticate_user(db, form_data.username, form_data.password)
-    if not user:
+    # La consulta es async y bcrypt corre en el pool de hashing: nada bloquea el event loop
+    try:
+        user = await get_user_by_username_async(db, form_data.username)
+        valida, nuevo_hash = await servicio_hash.verificar(
+            form_data.password, user.password_hash if user else None
+        )
+    except HashSaturadoError:
+        contador_login_fallido.incrementar("saturado")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, intente nuevamente",
+            headers={"Retry-After": "1"},
+        )
+    if not user or not valida or not user.activo:
+        contador_login_fallido.incrementar("credenciales")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # El costo de bcrypt cambió: guardar el hash recalculado con la contraseña ya verificada
+    if nuevo_hash:
+        user.password_hash = nuevo_hash
+    
+    refresh_token = await db.run_sync(emitir_refresh_token, user.id)
+    await db.commit()
+    identidad = Identidad.desde_usuario(user)
+    cache_identidades.guardar(identidad)
+    limitador_intentos.reiniciar(REGLA_LOGIN_USUARIO, form_data.username)
+    
+    return _emitir_tokens(identidad, refresh_token)
+
+def _emitir_tokens(identidad: Identidad, refresh_token: str) -> Dict[str, Any]:
+    """Respuesta de /token y /token/refresh"""
+    # uid y rol permiten validar el token sin consultar la base (IDENTIDAD_TOKEN_STATELESS)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": identidad.username, "uid": str(identidad.id), "rol": identidad.rol},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+    }
+
+@app.post("/token/refresh", response_model=Token)
+def refresh_access_token(datos: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Canjear un refresh token por un nuevo access token (sin verificar la contraseña)"""
+    try:
+        refresh_token, identidad = rotar_refresh_token(db, datos.refresh_token)
+    except RefreshTokenInvalidoError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token inválido o expirado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    cache_identidades.guardar(identidad)
+    return _emitir_tokens(identidad, refresh_token)
+
+@app.post("/token/revocar", status_code=status.HTTP_204_NO_CONTENT)
+def revocar_refresh_token(datos: RefreshTokenRequest, db: Session = Depends(get_db)):
+    """Cerrar la sesión: revocar el refresh token y toda su familia"""
+    revocar_familia(db, datos.refresh_token)
+    db.commit()
+    return None
 
 @app.post("/register", response_model=UsuarioResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
+def register_user(
+    user: UsuarioCreate,
+    _limite: None = Depends(limitar_registro),
+    db: Session = Depends(get_db)
+):
     """Registrar nuevo usuario"""
     errors = {}
     
@@ -160,6 +351,12 @@ def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
         db.commit()
         db.refresh(db_user)
         return db_user
+    except HashSaturadoError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, intente nuevamente",
+            headers={"Retry-After": "1"},
+        )
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -168,7 +365,7 @@ def register_user(user: UsuarioCreate, db: Session = Depends(get_db)):
         )
 
 @app.get("/users/me", response_model=UsuarioResponse)
-async def read_users_me(current_user: Usuario = Depends(get_current_user)):
+async def read_users_me(current_user: Usuario = Depends(get_current_user_async)):
     """Obtener información del usuario actual"""
     return current_user
 
@@ -218,64 +415,94 @@ def update_usuario_me(
         setattr(current_user, field, value)
     
     db.commit()
+    # El evento after_update ya invalida esta identidad; se repite por claridad
+    cache_identidades.invalidar(current_user.username)
     db.refresh(current_user)
     return current_user
 
+@app.put("/usuarios/me/password", status_code=status.HTTP_204_NO_CONTENT)
+def cambiar_password_me(
+    cambio: CambioPassword,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """Cambiar la contraseña del usuario actual y cerrar sus demás sesiones"""
+    try:
+        valida, _ = servicio_hash.verificar_sync(cambio.password_actual, current_user.password_hash)
+        if not valida:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"password_actual": "Contraseña actual incorrecta"}
+            )
+        
+        es_valido, mensaje = validar_complejidad_password(cambio.password_nueva)
+        if not es_valido:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={"password_nueva": mensaje}
+            )
+        
+        current_user.password_hash = get_password_hash(cambio.password_nueva)
+    except HashSaturadoError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servidor ocupado, intente nuevamente",
+            headers={"Retry-After": "1"},
+        )
+    
+    # Los refresh tokens emitidos con la contraseña anterior dejan de servir;
+    # los access tokens vigentes expiran solos (ACCESS_TOKEN_EXPIRE_MINUTES)
+    revocar_tokens_usuario(db, current_user.id)
+    db.commit()
+    return None
+
+_compras_json = SerializadorFilas(CompraResponse)
+
 @app.get("/usuarios/me/compras", response_model=List[CompraResponse])
-def get_mis_compras(
+async def get_mis_compras(
     skip: int = 0,
     limit: int = 20,
     estado: Optional[str] = None,
     orden: str = "fecha_desc",
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db_lectura),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Obtener compras anteriores del usuario actual"""
     # Validar límite máximo
     if limit > 100:
         limit = 100
     
-    # Construir query base
-    query = db.query(Documento).filter(Documento.usuario_id == current_user.id)
+    # Construir query base; los detalles de toda la página se cargan en una sola consulta
+    query = (
+        select(Documento)
+        .where(Documento.usuario_id == current_user.id)
+        .options(selectinload(Documento.detalles))
+    )
     
     # Filtrar por estado si se proporciona
     if estado:
-        query = query.filter(Documento.estado == estado)
-    
-    # Ordenar
-    if orden == "fecha_desc":
-        query = query.order_by(Documento.fecha_creacion.desc())
-    elif orden == "fecha_asc":
-        query = query.order_by(Documento.fecha_creacion.asc())
-    elif orden == "monto_desc":
-        query = query.order_by(Documento.monto_total.desc())
-    elif orden == "monto_asc":
-        query = query.order_by(Documento.monto_total.asc())
-    else:
-        query = query.order_by(Documento.fecha_creacion.desc())
-    
-    # Paginación
-    documentos = query.offset(skip).limit(limit).all()
+        query = query.where(Documento.estado == estado)
     
-    # Construir respuesta con detalles
-    compras = []
-    for doc in documentos:
-        detalles = db.query(DetalleDocumento).filter(
-            DetalleDocumento.documento_id == doc.id
-        ).all()
-        
-        compra_dict = {
-            "id": doc.id,
-            "estado": doc.estado,
-            "monto_total": doc.monto_total,
-            "fecha_creacion": doc.fecha_creacion,
-            "fecha_actualizacion": doc.fecha_actualizacion,
-            "detalles": detalles,
-            "ruta_documento": doc.ruta_documento if hasattr(doc, 'ruta_documento') else None
-        }
-        compras.append(CompraResponse(**compra_dict))
+    # Ordenar y paginar (cursor o, en modo legado, skip)
+    orden_keyset = _ORDENES_COMPRAS.get(orden, _ORDENES_COMPRAS["fecha_desc"])
+    documentos = (await db.scalars(_paginar(query, orden_keyset, cursor, skip, limit))).all()
     
-    return compras
+    # Filas recién leídas de la base: se serializan directo, sin validar contra el schema
+    return _compras_json.respuesta(documentos, headers=_headers_paginacion(orden_keyset, documentos, limit))
+
+@app.get("/usuarios/me/compras/pdfs.zip")
+def get_mis_compras_zip(current_user: Identidad = Depends(get_current_identity)):
+    """Descargar en un ZIP los comprobantes de todas las compras del usuario actual"""
+    return StreamingResponse(
+        generar_zip_pdfs(
+            Documento.usuario_id == current_user.id,
+            Documento.pdf_estado.isnot(None),
+            usuario_id=current_user.id
+        ),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="comprobantes.zip"'}
+    )
 
 # ==================== DIRECCIONES DESPACHO ENDPOINTS ====================
 
@@ -283,7 +510,7 @@ def get_mis_compras(
 def create_direccion_despacho(
     direccion: DireccionDespachoCreate,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Crear nueva dirección de despacho para el usuario actual"""
     # Si se marca como principal, desmarcar las demás
@@ -309,11 +536,13 @@ def create_direccion_despacho(
     db.refresh(db_direccion)
     return db_direccion
 
+_direcciones_json = SerializadorFilas(DireccionDespachoResponse)
+
 @app.get("/usuarios/me/direcciones", response_model=List[DireccionDespachoResponse])
 def get_direcciones_despacho(
     activa: Optional[bool] = None,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Listar direcciones de despacho del usuario actual"""
     query = db.query(DireccionDespacho).filter(
@@ -330,13 +559,13 @@ def get_direcciones_despacho(
         DireccionDespacho.fecha_creacion.desc()
     ).all()
     
-    return direcciones
+    return _direcciones_json.respuesta(direcciones)
 
 @app.get("/usuarios/me/direcciones/{direccion_id}", response_model=DireccionDespachoResponse)
 def get_direccion_despacho(
     direccion_id: UUID,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Obtener dirección de despacho por ID"""
     direccion = db.query(DireccionDespacho).filter(
@@ -354,7 +583,7 @@ def update_direccion_despacho(
     direccion_id: UUID,
     direccion_update: DireccionDespachoUpdate,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Actualizar dirección de despacho"""
     db_direccion = db.query(DireccionDespacho).filter(
@@ -389,7 +618,7 @@ def update_direccion_despacho(
 def delete_direccion_despacho(
     direccion_id: UUID,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Eliminar dirección de despacho"""
     db_direccion = db.query(DireccionDespacho).filter(
@@ -408,7 +637,7 @@ def delete_direccion_despacho(
 def marcar_direccion_principal(
     direccion_id: UUID,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Marcar dirección como principal"""
     db_direccion = db.query(DireccionDespacho).filter(
@@ -434,22 +663,25 @@ def marcar_direccion_principal(
 
 # ==================== USUARIOS ENDPOINTS ====================
 
+_usuarios_json = SerializadorFilas(UsuarioResponse)
+
 @app.get("/usuarios", response_model=List[UsuarioResponse])
 def get_usuarios(
     skip: int = 0, 
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db_lectura),
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Listar usuarios (requiere autenticación)"""
-    usuarios = db.query(Usuario).offset(skip).limit(limit).all()
-    return usuarios
+    usuarios = _paginar(db.query(Usuario), _ORDEN_USUARIOS, cursor, skip, limit).all()
+    return _usuarios_json.respuesta(usuarios, headers=_headers_paginacion(_ORDEN_USUARIOS, usuarios, limit))
 
 @app.get("/usuarios/{usuario_id}", response_model=UsuarioResponse)
 def get_usuario(
     usuario_id: UUID,
     db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    current_user: Identidad = Depends(get_current_identity)
 ):
     """Obtener usuario por ID"""
     usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
@@ -460,10 +692,10 @@ def get_usuario(
 # ==================== DOCUMENTOS ENDPOINTS ====================
 
 @app.post("/documentos", response_model=DocumentoResponse, status_code=status.HTTP_201_CREATED)
-def create_documento(
+async def create_documento(
     documento: DocumentoCreate,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Crear nuevo documento"""
     try:
@@ -496,11 +728,11 @@ def create_documento(
         )
         
         db.add(db_documento)
-        db.commit()
-        db.refresh(db_documento)
+        await db.commit()
+        await db.refresh(db_documento)
         return db_documento
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         import traceback
         error_trace = traceback.format_exc()
         print(f"Error al crear documento: {str(e)}")
@@ -510,99 +742,95 @@ def create_documento(
             detail=f"Error al crear documento: {str(e)}"
         )
 
+_documentos_json = SerializadorFilas(DocumentoResponse)
+
 @app.get("/documentos", response_model=List[DocumentoResponse])
-def get_documentos(
+async def get_documentos(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db_lectura),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Listar documentos del usuario actual"""
-    documentos = db.query(Documento).filter(
-        Documento.usuario_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    return documentos
+    query = select(Documento).where(Documento.usuario_id == current_user.id)
+    documentos = (await db.scalars(_paginar(query, _ORDEN_DOCUMENTOS, cursor, skip, limit))).all()
+    return _documentos_json.respuesta(documentos, headers=_headers_paginacion(_ORDEN_DOCUMENTOS, documentos, limit))
 
 @app.get("/documentos/{documento_id}", response_model=DocumentoResponse)
-def get_documento(
+async def get_documento(
     documento_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db_lectura),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Obtener documento por ID"""
-    documento = db.query(Documento).filter(
+    documento = (await db.scalars(select(Documento).where(
         Documento.id == documento_id,
         Documento.usuario_id == current_user.id
-    ).first()
+    ))).first()
 
     if not documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
 
-    # Recalcular monto_total al leer (no persistimos automáticamente aquí)
-    detalles = db.query(DetalleDocumento).filter(DetalleDocumento.documento_id == documento_id).all()
-    total = sum((d.precio or 0) * (d.cantidad or 0) for d in detalles)
-    documento.monto_total = float(total)
+    # monto_total lo mantiene el trigger de detalle_documentos (líneas + costo de envío)
     return documento
 
 @app.put("/documentos/{documento_id}", response_model=DocumentoResponse)
-def update_documento(
+async def update_documento(
     documento_id: UUID,
     documento: DocumentoCreate,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Actualizar documento"""
-    db_documento = db.query(Documento).filter(
+    db_documento = (await db.scalars(select(Documento).where(
         Documento.id == documento_id,
         Documento.usuario_id == current_user.id
-    ).first()
+    ))).first()
     
     if not db_documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
     
     db_documento.estado = documento.estado
-    # Recalcular monto_total desde los detalles actuales
-    detalles = db.query(DetalleDocumento).filter(DetalleDocumento.documento_id == documento_id).all()
-    total = sum((d.precio or 0) * (d.cantidad or 0) for d in detalles)
-    db_documento.monto_total = float(total)
+    # monto_total no se toca: lo mantiene el trigger de detalle_documentos
     
-    db.commit()
-    db.refresh(db_documento)
+    await db.commit()
+    await db.refresh(db_documento)
     return db_documento
 
 @app.delete("/documentos/{documento_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_documento(
+async def delete_documento(
     documento_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Eliminar documento"""
-    db_documento = db.query(Documento).filter(
+    db_documento = (await db.scalars(select(Documento).where(
         Documento.id == documento_id,
         Documento.usuario_id == current_user.id
-    ).first()
+    ))).first()
     
     if not db_documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
     
-    db.delete(db_documento)
-    db.commit()
+    await db.delete(db_documento)
+    await db.commit()
     return None
 
 # ==================== DETALLE DOCUMENTOS ENDPOINTS ====================
 
 @app.post("/documentos/{documento_id}/detalles", response_model=DetalleDocumentoResponse)
-def create_detalle(
+async def create_detalle(
     documento_id: UUID,
     detalle: DetalleDocumentoCreate,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Crear detalle de documento"""
-    documento = db.query(Documento).filter(
+    documento = (await db.scalars(select(Documento).where(
         Documento.id == documento_id,
         Documento.usuario_id == current_user.id
-    ).first()
+    ))).first()
     
     if not documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
@@ -625,57 +853,65 @@ def create_detalle(
     )
     
     db.add(db_detalle)
-    db.commit()
-    db.refresh(db_detalle)
-
-    # Recalcular y persistir monto_total del documento
-    detalles = db.query(DetalleDocumento).filter(DetalleDocumento.documento_id == documento_id).all()
-    total = sum((d.precio or 0) * (d.cantidad or 0) for d in detalles)
-    documento_obj = db.query(Documento).filter(Documento.id == documento_id).first()
-    if documento_obj:
-        documento_obj.monto_total = float(total)
-        db.add(documento_obj)
-        db.commit()
-        db.refresh(documento_obj)
-
+    await db.commit()
+    await db.refresh(db_detalle)
+    # El trigger por sentencia de detalle_documentos ya recalculó monto_total del documento
     return db_detalle
 
+_detalles_json = SerializadorFilas(DetalleDocumentoResponse)
+
 @app.get("/documentos/{documento_id}/detalles", response_model=List[DetalleDocumentoResponse])
-def get_detalles(
+async def get_detalles(
     documento_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db_lectura),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Obtener detalles de un documento"""
-    documento = db.query(Documento).filter(
+    documento = (await db.scalars(select(Documento).where(
         Documento.id == documento_id,
         Documento.usuario_id == current_user.id
-    ).first()
+    ))).first()
     
     if not documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
     
-    detalles = db.query(DetalleDocumento).filter(
-        DetalleDocumento.documento_id == documento_id
-    ).order_by(DetalleDocumento.fecha_creacion).all()
+    detalles = (await db.scalars(
+        select(DetalleDocumento)
+        .where(DetalleDocumento.documento_id == documento_id)
+        .order_by(DetalleDocumento.fecha_creacion)
+    )).all()
     
-    return detalles
+    return _detalles_json.respuesta(detalles)
 
 @app.get("/documentos/{documento_id}/pdf")
-def get_documento_pdf(
+async def get_documento_pdf(
     documento_id: UUID,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db_lectura),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Descargar PDF del documento"""
-    documento = db.query(Documento).filter(
+    documento = (await db.scalars(select(Documento).where(
         Documento.id == documento_id,
         Documento.usuario_id == current_user.id
-    ).first()
+    ))).first()
     
     if not documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado")
     
+    if documento.pdf_estado == "pendiente":
+        # Aún en la cola de generación
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"detail": "PDF en generación", "pdf_estado": documento.pdf_estado},
+            headers={"Retry-After": str(PDF_RETRY_AFTER_SEGUNDOS)}
+        )
+    
+    if documento.pdf_estado == "error":
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No se pudo generar el PDF de este documento"
+        )
+    
     if not documento.ruta_documento:
         raise HTTPException(
             status_code=404,
@@ -704,94 +940,50 @@ def get_documento_pdf(
         filename=f"comprobante_{documento_id}.pdf"
     )
 
-# ==================== CHECKOUT ENDPOINT ====================
+# ==================== PRODUCTOS ENDPOINTS ====================
 
-def _cargar_productos() -> Dict[int, Dict[str, Any]]:
-    """Cargar productos desde JSON"""
-    productos = {}
-    
-    # Intentar múltiples rutas posibles
-    posibles_rutas = [
-        # Ruta relativa desde el backend (desarrollo local)
-        os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "frontend", "public", "data", "productos.json"
-        ),
-        # Ruta absoluta desde el directorio actual
-        os.path.join(os.getcwd(), "frontend", "public", "data", "productos.json"),
-        # Ruta desde el directorio padre
-        os.path.join(os.path.dirname(os.getcwd()), "frontend", "public", "data", "productos.json"),
-        # Ruta en Docker (si está montado)
-        "/app/frontend/public/data/productos.json",
-    ]
-    
-    for productos_path in posibles_rutas:
-        try:
-            productos_path = os.path.normpath(productos_path)
-            if os.path.exists(productos_path):
-                with open(productos_path, 'r', encoding='utf-8') as f:
-                    productos_list = json.load(f)
-                    productos = {p['id']: p for p in productos_list}
-                    print(f"Productos cargados desde: {productos_path}")
-                    break
-        except Exception as e:
-            print(f"Error al cargar productos desde {productos_path}: {e}")
-            continue
-    
-    if not productos:
-        print("Advertencia: No se pudieron cargar productos desde ningún archivo")
+@app.get("/productos", response_model=ProductoListaResponse)
+def get_productos(
+    q: Optional[str] = None,
+    categoria: Optional[str] = None,
+    precio_min: Optional[float] = None,
+    precio_max: Optional[float] = None,
+    orden: str = "id",
+    skip: int = 0,
+    limit: int = 20
+):
+    """Buscar, filtrar y paginar productos del catálogo"""
+    # Validar límite máximo
+    if limit > 100:
+        limit = 100
     
-    return productos
+    indice = catalogo_productos.snapshot().indice
+    total, productos = indice.buscar(
+        q=q,
+        categoria=categoria,
+        precio_min=precio_min,
+        precio_max=precio_max,
+        orden=orden,
+        skip=skip,
+        limit=limit
+    )
+    return {"total": total, "skip": skip, "limit": limit, "items": productos}
 
-def _cargar_metodos_envio() -> Dict[int, Dict[str, Any]]:
-    """Cargar métodos de envío desde JSON"""
-    envios = {}
-    
-    # Intentar múltiples rutas posibles
-    posibles_rutas = [
-        # Ruta relativa desde el backend (desarrollo local)
-        os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "frontend", "public", "data", "envios.json"
-        ),
-        # Ruta absoluta desde el directorio actual
-        os.path.join(os.getcwd(), "frontend", "public", "data", "envios.json"),
-        # Ruta desde el directorio padre
-        os.path.join(os.path.dirname(os.getcwd()), "frontend", "public", "data", "envios.json"),
-        # Ruta en Docker (si está montado)
-        "/app/frontend/public/data/envios.json",
-    ]
-    
-    for envios_path in posibles_rutas:
-        try:
-            envios_path = os.path.normpath(envios_path)
-            if os.path.exists(envios_path):
-                with open(envios_path, 'r', encoding='utf-8') as f:
-                    envios_list = json.load(f)
-                    envios = {e['id']: e for e in envios_list}
-                    print(f"Métodos de envío cargados desde: {envios_path}")
-                    break
-        except Exception as e:
-            print(f"Error al cargar métodos de envío desde {envios_path}: {e}")
-            continue
-    
-    if not envios:
-        print("Advertencia: No se pudieron cargar métodos de envío desde ningún archivo")
-        # Datos por defecto si no se encuentra el archivo
-        envios = {
-            1: {"id": 1, "nombre": "Envío Estándar UNAB", "precio": 5.0},
-            2: {"id": 2, "nombre": "Envío Express UNAB", "precio": 12.0},
-            3: {"id": 3, "nombre": "Envío Premium UNAB", "precio": 25.0},
-            4: {"id": 4, "nombre": "Retiro en Campus UNAB", "precio": 0.0},
-        }
-    
-    return envios
+@app.get("/productos/{producto_id}", response_model=ProductoResponse)
+def get_producto(producto_id: int):
+    """Obtener producto por ID"""
+    producto = catalogo_productos.snapshot().indice.obtener(producto_id)
+    if not producto:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return producto
+
+# ==================== CHECKOUT ENDPOINT ====================
 
 @app.post("/checkout", response_model=DocumentoResponse, status_code=status.HTTP_201_CREATED)
-def checkout(
+async def checkout(
     checkout_data: CheckoutRequest,
-    db: Session = Depends(get_db),
-    current_user: Usuario = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Identidad = Depends(get_current_identity_async)
 ):
     """Procesar checkout y crear compra"""
     errors = {}
@@ -811,7 +1003,7 @@ def checkout(
         checkout_data.telefono = resultado
     
     # Validar método de envío
-    metodos_envio = _cargar_metodos_envio()
+    metodos_envio = catalogo_envios.obtener()
     if not metodos_envio:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -822,14 +1014,16 @@ def checkout(
     else:
         metodo_envio = metodos_envio[checkout_data.metodo_envio_id]
     
-    # Validar productos y stock
-    productos_data = _cargar_productos()
+    # Validar productos (el stock se reserva en la base de datos)
+    snapshot_productos = catalogo_productos.snapshot()
+    productos_data = snapshot_productos.datos
     if not productos_data:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="No se pudieron cargar los productos. Verifique que el archivo productos.json existe."
         )
     productos_validos = []
+    cantidades = {}  # producto_id -> cantidad total (agrupa líneas repetidas)
     subtotal = 0.0
     
     for producto_checkout in checkout_data.productos:
@@ -840,14 +1034,7 @@ def checkout(
             continue
         
         producto = productos_data[producto_id]
-        stock_disponible = producto.get('stock', 0)
-        
-        if producto_checkout.cantidad > stock_disponible:
-            errors[f"producto_{producto_id}"] = (
-                f"Stock insuficiente. Disponible: {stock_disponible}, "
-                f"Solicitado: {producto_checkout.cantidad}"
-            )
-            continue
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + producto_checkout.cantidad
         
         # Validar que el precio coincida (o usar el precio del producto)
         precio_final = producto.get('precio', producto_checkout.precio)
@@ -862,6 +1049,7 @@ def checkout(
     
     # Si hay errores, retornarlos
     if errors:
+        contador_checkouts.incrementar("invalido")
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=errors
@@ -871,29 +1059,48 @@ def checkout(
     costo_envio = metodo_envio.get('precio', 0.0)
     monto_total = subtotal + costo_envio
     
-    # Crear documento (compra)
-    db_documento = Documento(
-        usuario_id=current_user.id,
-        estado="completado",
-        monto_total=monto_total,
-    )
-    
-    # Guardar dirección de envío en metadata
-    db_documento.metadata_json = {
-        "rut": checkout_data.rut,
-        "email": checkout_data.email,
-        "telefono": checkout_data.telefono,
-        "direccion": checkout_data.direccion.model_dump(),
-        "metodo_envio": metodo_envio,
-        "costo_envio": costo_envio,
-        "subtotal": subtotal
-    }
+    # Reservar stock de todas las líneas en la misma transacción del documento
+    await asegurar_productos_async(db, snapshot_productos)
+    try:
+        await db.run_sync(reservar_stock, cantidades)
+    except StockInsuficienteError as e:
+        await db.rollback()
+        contador_checkouts.incrementar("sin_stock")
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail={
+                f"producto_{producto_id}": (
+                    f"Stock insuficiente. Disponible: {faltante['disponible']}, "
+                    f"Solicitado: {faltante['solicitado']}"
+                )
+                for producto_id, faltante in e.faltantes.items()
+            }
+        )
     
-    db.add(db_documento)
-    db.commit()
-    db.refresh(db_documento)
+    # Crear documento (compra) con INSERT ... RETURNING; la dirección de envío va en metadata
+    db_documento = (await db.scalars(
+        insert(Documento)
+        .values(
+            id=uuid4(),
+            usuario_id=current_user.id,
+            estado="completado",
+            monto_total=monto_total,
+            pdf_estado="pendiente",
+            metadata_json={
+                "rut": checkout_data.rut,
+                "email": checkout_data.email,
+                "telefono": checkout_data.telefono,
+                "direccion": checkout_data.direccion.model_dump(),
+                "metodo_envio": metodo_envio,
+                "costo_envio": costo_envio,
+                "subtotal": subtotal
+            }
+        )
+        .returning(Documento)
+    )).one()
     
-    # Crear detalles del documento
+    # Crear todos los detalles del documento en un solo INSERT multi-fila
+    filas_detalle = []
     for producto_info in productos_validos:
         # Guardar todas las características del producto en metadata
         producto_completo = producto_info.get('producto_completo', {})
@@ -910,42 +1117,123 @@ def checkout(
             **{k: v for k, v in producto_completo.items() 
                if k not in ['id', 'nombre', 'precio', 'stock']}
         }
-        
-        db_detalle = DetalleDocumento(
-            documento_id=db_documento.id,
-            producto=producto_info['nombre'],
-            precio=producto_info['precio'],
-            cantidad=producto_info['cantidad'],
-            metadata_json=metadata_producto
-        )
-        db.add(db_detalle)
+        filas_detalle.append({
+            'id': uuid4(),
+            'documento_id': db_documento.id,
+            'producto': producto_info['nombre'],
+            'precio': producto_info['precio'],
+            'cantidad': producto_info['cantidad'],
+            'metadata': metadata_producto
+        })
     
-    db.commit()
-    db.refresh(db_documento)
+    # El trigger por sentencia de detalle_documentos recalcula monto_total una sola vez
+    await db.execute(DetalleDocumento.__table__.insert().values(filas_detalle))
     
-    # Generar PDF del documento
-    try:
-        detalles_lista = db.query(DetalleDocumento).filter(
-            DetalleDocumento.documento_id == db_documento.id
-        ).all()
-        
-        ruta_pdf = generar_pdf_documento(
-            documento=db_documento,
-            usuario=current_user,
-            detalles=detalles_lista
-        )
-        
-        # Actualizar ruta del documento
-        db_documento.ruta_documento = ruta_pdf
-        db.commit()
-        db.refresh(db_documento)
-    except Exception as e:
-        # Si falla la generación del PDF, no fallar el checkout
-        # Solo registrar el error (en producción usar logging)
-        print(f"Error generando PDF: {e}")
+    # El PDF se genera en segundo plano; el trabajo se confirma junto con la compra
+    await db.run_sync(encolar_pdf, db_documento.id)
+    await db.commit()
+    contador_checkouts.incrementar("ok")
+    cola_pdf.notificar()
     
+    # monto_total y fecha_actualizacion los fija el trigger de detalle_documentos
+    await db.refresh(db_documento)
     return db_documento
 
+# ==================== ADMIN / MONITOREO ====================
+
+@app.get("/admin/documentos/pdfs.zip")
+def get_documentos_zip(
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    current_user: Identidad = Depends(get_current_active_admin)
+):
+    """Descargar en un ZIP los comprobantes de un rango de fechas (ambos extremos incluidos)"""
+    condiciones = [Documento.pdf_estado.isnot(None)]
+    if desde:
+        condiciones.append(Documento.fecha_creacion >= desde)
+    if hasta:
+        condiciones.append(Documento.fecha_creacion < hasta + timedelta(days=1))
+    nombre = f"comprobantes_{desde or 'inicio'}_{hasta or 'hoy'}.zip"
+    return StreamingResponse(
+        generar_zip_pdfs(*condiciones),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+@app.get("/admin/pdf/estado")
+def get_estado_cola_pdf(
+    db: Session = Depends(get_db),
+    current_user: Identidad = Depends(get_current_active_admin)
+):
+    """Estado de la cola de generación de PDFs"""
+    return cola_pdf.estadisticas(db)
+
+@app.get("/admin/hash/estado")
+def get_estado_hash(current_user: Identidad = Depends(get_current_active_admin)):
+    """Contadores del pool de hashing de contraseñas"""
+    return servicio_hash.estadisticas()
+
+@app.get("/admin/limites/estado")
+def get_estado_limites(current_user: Identidad = Depends(get_current_active_admin)):
+    """Contadores del límite de intentos de login y registro"""
+    return limitador_intentos.estadisticas()
+
+@app.get("/admin/refresh/estado")
+def get_estado_refresh_tokens(
+    db: Session = Depends(get_db),
+    current_user: Identidad = Depends(get_current_active_admin)
+):
+    """Refresh tokens vigentes y contadores de rotación"""
+    return refresh_token_service.estadisticas(db)
+
+@app.get("/admin/identidad/estado")
+def get_estado_identidades(current_user: Identidad = Depends(get_current_active_admin)):
+    """Contadores de la caché de identidades"""
+    return cache_identidades.estadisticas()
+
+@app.get("/admin/replicas/estado")
+def get_estado_replicas(current_user: Identidad = Depends(get_current_active_admin)):
+    """Salud, retraso y uso de las réplicas de lectura"""
+    return enrutador_lecturas.estadisticas()
+
+@app.get("/admin/db/estado")
+def get_estado_db(lentas: int = 20, current_user: Identidad = Depends(get_current_active_admin)):
+    """Pools, consultas por ruta y las sentencias lentas más costosas (SQL normalizado)"""
+    return metricas_db.estadisticas(lentas=lentas)
+
+@app.get("/admin/perfiles")
+def get_perfiles(current_user: Identidad = Depends(get_current_active_admin)):
+    """Perfiles guardados, más recientes primero"""
+    return almacen_perfiles.listar()
+
+@app.get("/admin/perfiles/{perfil_id}")
+def get_perfil(perfil_id: str, current_user: Identidad = Depends(get_current_active_admin)):
+    """Descargar un perfil en formato speedscope (abrir en https://www.speedscope.app)"""
+    ruta = almacen_perfiles.ruta(perfil_id)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(ruta, media_type="application/json", filename=f"{perfil_id}.speedscope.json")
+
+@app.get("/admin/catalogo/estado")
+def get_estado_catalogo(current_user: Identidad = Depends(get_current_active_admin)):
+    """Contadores de uso y recarga de los catálogos en memoria"""
+    return {
+        "productos": catalogo_productos.estadisticas(),
+        "envios": catalogo_envios.estadisticas(),
+    }
+
+# ==================== MÉTRICAS ====================
+
+def autorizar_metricas(authorization: Optional[str] = Header(None)):
+    """Exigir METRICS_TOKEN si está definido (el scraper de Prometheus lo envía como bearer)"""
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de métricas inválido")
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(_autorizado: None = Depends(autorizar_metricas)):
+    """Métricas en formato de texto de Prometheus (todos los workers si hay METRICAS_DIR)"""
+    return Response(registro_metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ==================== HEALTH CHECK ====================
 
 @app.get("/")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, DateTime, Integer, Text, ForeignKey, Float
+from sqlalchemy import Column, String, Boolean, DateTime, Integer, BigInteger, Text, ForeignKey, Float, CheckConstraint, LargeBinary, Index, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -33,8 +33,10 @@ class Documento(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
     estado = Column(String(50), default="borrador")
-    monto_total = Column(Float, default=0)
+    monto_total = Column(Float, nullable=False, default=0)
     ruta_documento = Column(String(255), nullable=True)
+    # Estado del comprobante PDF: pendiente, listo o error (NULL si no tiene comprobante)
+    pdf_estado = Column(String(20), nullable=True)
     metadata_json = Column("metadata", JSONB, default={})
     fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
     fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -74,4 +76,51 @@ class DireccionDespacho(Base):
     fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relaciones
-    usuario = relationship("Usuario", back_populates="direcciones_despacho")
\ No newline at end of file
+    usuario = relationship("Usuario", back_populates="direcciones_despacho")
+
+class Producto(Base):
+    __tablename__ = "productos"
+    __table_args__ = (
+        CheckConstraint("stock >= 0", name="ck_productos_stock_no_negativo"),
+    )
+    
+    # Mismo id que en productos.json
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    nombre = Column(String(255), nullable=False)
+    precio = Column(Float, nullable=False, default=0)
+    stock = Column(Integer, nullable=False, default=0)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class TrabajoPDF(Base):
+    __tablename__ = "trabajos_pdf"
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    documento_id = Column(UUID(as_uuid=True), ForeignKey("documentos.id", ondelete="CASCADE"), nullable=False, unique=True)
+    # pendiente -> procesando -> listo | error (procesando vuelve a pendiente al reintentar)
+    estado = Column(String(20), nullable=False, default="pendiente")
+    intentos = Column(Integer, nullable=False, default=0)
+    ultimo_error = Column(Text, nullable=True)
+    disponible_en = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    bloqueado_hasta = Column(DateTime(timezone=True), nullable=True)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("idx_refresh_tokens_familia", "familia"),
+        Index("idx_refresh_tokens_usuario", "usuario_id", postgresql_where=text("NOT revocado")),
+        Index("idx_refresh_tokens_expira", "expira_en"),
+    )
+    
+    # HMAC-SHA256 del token: el valor en claro nunca se guarda
+    token_hash = Column(LargeBinary(32), primary_key=True)
+    # Todas las rotaciones de un mismo login comparten familia
+    familia = Column(UUID(as_uuid=True), nullable=False)
+    usuario_id = Column(UUID(as_uuid=True), ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False)
+    expira_en = Column(DateTime(timezone=True), nullable=False)
+    # Fecha de rotación; presentar un token ya usado revoca la familia completa
+    usado_en = Column(DateTime(timezone=True), nullable=True)
+    revocado = Column(Boolean, nullable=False, default=False)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
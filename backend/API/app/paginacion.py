@@ -0,0 +1,91 @@
+"""
+Paginación por cursor (keyset) para los listados de la API
+
+En vez de OFFSET, cada página continúa después de la última fila de la
+anterior comparando (columna, id) contra los valores guardados en el cursor.
+Con un índice compuesto sobre esas columnas el costo no crece con la
+profundidad de la página, y las filas que se insertan mientras el cliente
+pagina no provocan duplicados ni saltos.
+
+El cursor es opaco para el cliente: JSON [orden, valor, id] en base64url.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import DateTime, literal, tuple_
+
+
+class CursorInvalidoError(ValueError):
+    """El cursor no se puede decodificar o pertenece a otro orden"""
+
+
+def codificar_cursor(orden: str, valor: Any, id_: Any) -> str:
+    """Construir el cursor que apunta después de la fila (valor, id)"""
+    if isinstance(valor, datetime):
+        valor = valor.isoformat()
+    datos = json.dumps([orden, valor, str(id_)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode()
+
+
+def decodificar_cursor(cursor: str) -> Tuple[str, Any, str]:
+    """Retorna (orden, valor, id) tal como se guardaron"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        orden, valor, id_ = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return orden, valor, id_
+    except (binascii.Error, ValueError, TypeError):
+        raise CursorInvalidoError("Cursor inválido")
+
+
+@dataclass(frozen=True)
+class OrdenKeyset:
+    """Orden de un listado: columna principal + id como desempate"""
+    nombre: str
+    columna: Any
+    id_columna: Any
+    descendente: bool = False
+
+    def _valores(self, cursor: str):
+        orden, valor, id_ = decodificar_cursor(cursor)
+        if orden != self.nombre:
+            raise CursorInvalidoError("El cursor pertenece a otro orden")
+        # El cursor viene del cliente: validar los tipos antes de armar los parámetros
+        tipo = self.columna.type.python_type
+        if tipo in (int, float):
+            valido = isinstance(valor, (int, float)) and not isinstance(valor, bool)
+        else:
+            valido = isinstance(valor, str)
+        if not valido or not isinstance(id_, str):
+            raise CursorInvalidoError("Cursor inválido")
+        try:
+            if tipo is datetime:
+                valor = datetime.fromisoformat(valor)
+                # El tipo del parámetro sigue al valor: la columna puede ser timestamp con o sin zona
+                return literal(valor, DateTime(timezone=valor.tzinfo is not None)), UUID(id_)
+            return literal(valor, self.columna.type), UUID(id_)
+        except (TypeError, ValueError):
+            raise CursorInvalidoError("Cursor inválido")
+
+    def aplicar(self, query, cursor: Optional[str] = None):
+        """Ordenar la consulta (select o Query) y, si hay cursor, continuar después de él"""
+        if cursor:
+            valor, id_ = self._valores(cursor)
+            clave = tuple_(self.columna, self.id_columna)
+            query = query.where(clave < tuple_(valor, id_) if self.descendente else clave > tuple_(valor, id_))
+        if self.descendente:
+            return query.order_by(self.columna.desc(), self.id_columna.desc())
+        return query.order_by(self.columna.asc(), self.id_columna.asc())
+
+    def siguiente_cursor(self, filas: Sequence[Any], limit: int) -> Optional[str]:
+        """Cursor de la página siguiente, o None si esta fue la última"""
+        if not filas or len(filas) < limit:
+            return None
+        ultima = filas[-1]
+        return codificar_cursor(
+            self.nombre, getattr(ultima, self.columna.key), getattr(ultima, self.id_columna.key)
+        )
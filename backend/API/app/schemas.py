@@ -8,6 +8,13 @@ from uuid import UUID
 class Token(BaseModel):
     access_token: str
     token_type: str
+    # Segundos de vigencia del access token
+    expires_in: Optional[int] = None
+    # Se canjea en /token/refresh por un nuevo par de tokens (un solo uso)
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=1, max_length=200)
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -34,6 +41,10 @@ class UsuarioUpdate(BaseModel):
     telefono: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
 
+class CambioPassword(BaseModel):
+    password_actual: str
+    password_nueva: str = Field(..., min_length=6)
+
 class UsuarioResponse(UsuarioBase):
     id: UUID
     activo: bool
@@ -101,6 +112,7 @@ class DocumentoResponse(DocumentoBase):
     id: UUID
     usuario_id: UUID
     ruta_documento: Optional[str] = None
+    pdf_estado: Optional[str] = None
     fecha_creacion: datetime
     fecha_actualizacion: datetime
     
@@ -143,10 +155,32 @@ class CompraResponse(BaseModel):
     fecha_actualizacion: datetime
     detalles: List[DetalleDocumentoResponse]
     ruta_documento: Optional[str] = None
+    pdf_estado: Optional[str] = None
     
     class Config:
         from_attributes = True
 
+# ==================== PRODUCTO SCHEMAS ====================
+
+class ProductoResponse(BaseModel):
+    """Schema para producto del catálogo"""
+    id: int
+    nombre: str
+    descripcion: Optional[str] = None
+    precio: float
+    categoria: Optional[str] = None
+    stock: Optional[int] = None
+    rating: Optional[float] = None
+    imagenes: List[str] = Field(default_factory=list)
+    caracteristicas: List[str] = Field(default_factory=list)
+
+class ProductoListaResponse(BaseModel):
+    """Schema para página de resultados de búsqueda de productos"""
+    total: int
+    skip: int
+    limit: int
+    items: List[ProductoResponse]
+
 # ==================== CHECKOUT SCHEMAS ====================
 
 class DireccionEnvio(BaseModel):
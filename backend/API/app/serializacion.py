@@ -0,0 +1,96 @@
+"""
+Serialización JSON directa de filas ORM para los listados pesados
+
+Con response_model, FastAPI valida cada objeto ORM contra el schema, lo pasa
+por jsonable_encoder y recién entonces lo codifica; en el historial de compras
+casi todo ese trabajo se va en el metadata de cada detalle (el registro
+completo del producto). Las filas que vienen directo de la base ya cumplen el
+schema, así que aquí solo se leen los atributos que expone el schema (con sus
+alias, en el mismo orden) y se codifican con orjson.
+
+Sin orjson, o si orjson no puede codificar algún valor, se usa el camino de
+Pydantic (validar con from_attributes y dump_json), que da el mismo JSON.
+"""
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Type, get_args, get_origin
+
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _es_modelo(tipo: Any) -> bool:
+    return isinstance(tipo, type) and issubclass(tipo, BaseModel)
+
+
+def _convertidor(esquema: Type[BaseModel]) -> Callable[[Any], Dict[str, Any]]:
+    """Función fila ORM -> dict con las claves y el orden de esquema.model_dump(by_alias=True)"""
+    claves, atributos, anidados = [], [], []
+    for nombre, campo in esquema.model_fields.items():
+        # Con from_attributes el alias es también el nombre del atributo (metadata -> metadata_json)
+        clave = campo.alias or nombre
+        claves.append(clave)
+        atributos.append(clave)
+        tipo = campo.annotation
+        if get_origin(tipo) in (list, List) and _es_modelo(get_args(tipo)[0]):
+            anidados.append((clave, _convertidor(get_args(tipo)[0]), True))
+        elif _es_modelo(tipo):
+            anidados.append((clave, _convertidor(tipo), False))
+
+    leer_estado = itemgetter(*atributos)
+    leer_atributos = attrgetter(*atributos)
+    if len(atributos) == 1:
+        leer_estado = lambda estado, clave=atributos[0]: (estado[clave],)
+        leer_atributos = lambda fila, leer=leer_atributos: (leer(fila),)
+
+    def leer(fila: Any) -> tuple:
+        # Los atributos ya cargados están en el __dict__ de la instancia ORM; leerlos
+        # de ahí evita el descriptor de SQLAlchemy. Si falta alguno (expirado o
+        # diferido) se leen por atributo para que SQLAlchemy los cargue.
+        try:
+            return leer_estado(fila.__dict__)
+        except (AttributeError, KeyError):
+            return leer_atributos(fila)
+
+    def convertir(fila: Any) -> Dict[str, Any]:
+        valores = dict(zip(claves, leer(fila)))
+        for clave, sub, es_lista in anidados:
+            valor = valores[clave]
+            if valor is not None:
+                valores[clave] = [sub(v) for v in valor] if es_lista else sub(valor)
+        return valores
+
+    return convertir
+
+
+class SerializadorFilas:
+    """Codifica una lista de filas ORM de confianza como List[esquema] sin validarlas"""
+
+    def __init__(self, esquema: Type[BaseModel]):
+        self.esquema = esquema
+        self._adapter = TypeAdapter(List[esquema])
+        self._convertir = _convertidor(esquema)
+
+    def dump_json_validado(self, filas: Sequence[Any]) -> bytes:
+        """Camino de Pydantic: valida desde los atributos y serializa con alias"""
+        return self._adapter.dump_json(self._adapter.validate_python(filas, from_attributes=True), by_alias=True)
+
+    def dump_json(self, filas: Sequence[Any]) -> bytes:
+        if ORJSON_AVAILABLE:
+            convertir = self._convertir
+            try:
+                # OPT_UTC_Z: las fechas en UTC terminan en "Z", igual que en Pydantic
+                return orjson.dumps([convertir(fila) for fila in filas], option=orjson.OPT_UTC_Z)
+            except orjson.JSONEncodeError:
+                # p. ej. enteros de más de 64 bits dentro de un JSONB
+                pass
+        return self.dump_json_validado(filas)
+
+    def respuesta(self, filas: Sequence[Any], headers: Optional[Mapping[str, str]] = None) -> Response:
+        """Response ya codificada; FastAPI no la vuelve a validar contra response_model"""
+        return Response(content=self.dump_json(filas), media_type="application/json", headers=headers)
@@ -0,0 +1,378 @@
+"""
+Índice en memoria del catálogo de productos.
+
+Se construye una vez por cada versión del catálogo y permite responder
+búsquedas, filtros, orden y paginación sin recorrer todos los productos:
+- índice invertido de tokens (y prefijos de 3 letras) sobre nombre y descripción
+- buckets de posiciones por categoría
+- arreglos pre-ordenados por precio y rating (con su rango por posición)
+
+Cada lista de posiciones se guarda como arreglo ordenado si es dispersa o
+como bitmap (entero de Python) si es densa, de modo que las intersecciones
+entre términos frecuentes se resuelven con un AND de bits.
+"""
+import bisect
+import re
+import unicodedata
+from array import array
+from typing import Any, Callable, Collection, Dict, Iterable, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Orden por defecto: id ascendente (las posiciones del índice siguen ese orden)
+ORDEN_POR_DEFECTO = "id"
+ORDENES_VALIDOS = ("id", "precio_asc", "precio_desc", "rating_asc", "rating_desc")
+
+# Una lista con más de n / _DENSIDAD_BITMAP posiciones se guarda como bitmap
+_DENSIDAD_BITMAP = 32
+# Largo de los prefijos precalculados; prefijos más cortos se buscan exactos
+_LARGO_PREFIJO = 3
+# Cantidad de buckets de bits por rango de precio
+_BUCKETS_PRECIO = 64
+# Sobre este tamaño relativo, un arreglo se filtra con bisect por candidato
+# en lugar de recorrerse completo
+_FACTOR_BISECT = 16
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas y sin tildes"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokenizar(texto: Optional[str]) -> List[str]:
+    """Separar un texto en tokens normalizados"""
+    if not texto:
+        return []
+    return _TOKEN_RE.findall(normalizar_texto(texto))
+
+
+def _orden_por(valores: List[float]) -> Tuple[array, array, array]:
+    """Posiciones ordenadas por valor, valores ordenados y rango de cada posición"""
+    orden = sorted(range(len(valores)), key=valores.__getitem__)
+    ordenados = array("d", (valores[i] for i in orden))
+    rango = array("I", bytes(4 * len(valores)))
+    for r, posicion in enumerate(orden):
+        rango[posicion] = r
+    return array("I", orden), ordenados, rango
+
+
+def _agregar_bits(mapa: bytearray, posiciones: Iterable[int]) -> None:
+    for p in posiciones:
+        mapa[p >> 3] |= 1 << (p & 7)
+
+
+class _Conjunto:
+    """Conjunto de posiciones: disperso (arreglo ordenado o set) o denso (bitmap)"""
+    __slots__ = ("tamano", "elementos", "bits", "_mapa")
+
+    def __init__(self, elementos: Optional[Collection[int]] = None,
+                 bits: Optional[int] = None, tamano: Optional[int] = None):
+        self.elementos = elementos
+        self.bits = bits
+        if tamano is None:
+            tamano = len(elementos) if elementos is not None else bits.bit_count()
+        self.tamano = tamano
+        self._mapa: Optional[bytes] = None
+
+    @classmethod
+    def desde_posiciones(cls, posiciones: List[int], n: int) -> "_Conjunto":
+        """Elegir la representación según la densidad"""
+        if len(posiciones) * _DENSIDAD_BITMAP > n:
+            mapa = bytearray((n + 7) // 8)
+            _agregar_bits(mapa, posiciones)
+            return cls(bits=int.from_bytes(mapa, "little"), tamano=len(posiciones))
+        return cls(elementos=array("I", posiciones))
+
+    @property
+    def denso(self) -> bool:
+        return self.bits is not None
+
+    def contiene(self) -> Callable[[int], bool]:
+        """Función de pertenencia O(1) (O(log n) para arreglos)"""
+        if self.bits is not None:
+            if self._mapa is None:
+                self._mapa = self.bits.to_bytes((self.bits.bit_length() + 8) // 8, "little")
+            mapa, largo = self._mapa, len(self._mapa)
+            return lambda i: (i >> 3) < largo and (mapa[i >> 3] >> (i & 7)) & 1 == 1
+        if isinstance(self.elementos, array):
+            elementos = self.elementos
+
+            def en_arreglo(i: int) -> bool:
+                j = bisect.bisect_left(elementos, i)
+                return j < len(elementos) and elementos[j] == i
+            return en_arreglo
+        return self.elementos.__contains__
+
+
+class IndiceCatalogo:
+    """Índice inmutable sobre una lista de productos"""
+
+    def __init__(self, productos: Iterable[Dict[str, Any]]):
+        self.productos: List[Dict[str, Any]] = sorted(productos, key=lambda p: p["id"])
+        self.posicion_por_id: Dict[int, int] = {
+            p["id"]: i for i, p in enumerate(self.productos)
+        }
+        n = len(self.productos)
+
+        invertido: Dict[str, List[int]] = {}
+        prefijos: Dict[str, List[int]] = {}
+        categorias: Dict[str, List[int]] = {}
+        precios: List[float] = []
+        ratings: List[float] = []
+        for i, producto in enumerate(self.productos):
+            tokens = set(tokenizar(producto.get("nombre")))
+            tokens.update(tokenizar(producto.get("descripcion")))
+            for token in tokens:
+                invertido.setdefault(token, []).append(i)
+            for prefijo in {t[:_LARGO_PREFIJO] for t in tokens if len(t) >= _LARGO_PREFIJO}:
+                prefijos.setdefault(prefijo, []).append(i)
+            categoria = producto.get("categoria")
+            if categoria:
+                categorias.setdefault(normalizar_texto(categoria), []).append(i)
+            precios.append(float(producto.get("precio") or 0))
+            ratings.append(float(producto.get("rating") or 0))
+
+        # Las posiciones se agregan en orden, por lo que cada lista ya está ordenada
+        self.invertido: Dict[str, _Conjunto] = {
+            t: _Conjunto.desde_posiciones(p, n) for t, p in invertido.items()
+        }
+        self.prefijos: Dict[str, _Conjunto] = {
+            t: _Conjunto.desde_posiciones(p, n) for t, p in prefijos.items()
+        }
+        self.vocabulario: List[str] = sorted(self.invertido)
+        self.categorias: Dict[str, _Conjunto] = {
+            c: _Conjunto.desde_posiciones(p, n) for c, p in categorias.items()
+        }
+        self.orden_precio, self.precios_ordenados, self.rango_precio = _orden_por(precios)
+        self.orden_rating, _, self.rango_rating = _orden_por(ratings)
+
+        # Bitmaps por tramo de rango de precio, para filtrar rangos amplios
+        self._tramo_precio = max(-(-n // _BUCKETS_PRECIO), 1)
+        self._bits_precio: List[int] = []
+        for inicio in range(0, n, self._tramo_precio):
+            mapa = bytearray((n + 7) // 8)
+            _agregar_bits(mapa, self.orden_precio[inicio:inicio + self._tramo_precio])
+            self._bits_precio.append(int.from_bytes(mapa, "little"))
+
+    def __len__(self) -> int:
+        return len(self.productos)
+
+    def obtener(self, producto_id: int) -> Optional[Dict[str, Any]]:
+        """Obtener producto por id"""
+        posicion = self.posicion_por_id.get(producto_id)
+        return self.productos[posicion] if posicion is not None else None
+
+    # ---------- conjuntos de filtro ----------
+
+    def _conjunto_prefijo(self, prefijo: str) -> Optional[_Conjunto]:
+        """Posiciones de productos con algún token que comienza con el prefijo"""
+        if len(prefijo) < _LARGO_PREFIJO:
+            return self.invertido.get(prefijo)
+        if len(prefijo) == _LARGO_PREFIJO:
+            return self.prefijos.get(prefijo)
+        inicio = bisect.bisect_left(self.vocabulario, prefijo)
+        fin = bisect.bisect_left(self.vocabulario, prefijo + "\uffff", inicio)
+        partes = [self.invertido[t] for t in self.vocabulario[inicio:fin]]
+        if not partes:
+            return None
+        if len(partes) == 1:
+            return partes[0]
+        return self._unir(partes)
+
+    def _unir(self, partes: List[_Conjunto]) -> _Conjunto:
+        n = len(self.productos)
+        if not any(p.denso for p in partes) and sum(p.tamano for p in partes) * _DENSIDAD_BITMAP <= n:
+            return _Conjunto(elementos=set().union(*(p.elementos for p in partes)))
+        bits = 0
+        for parte in partes:
+            if parte.denso:
+                bits |= parte.bits
+        mapa = bytearray(bits.to_bytes((n + 7) // 8, "little"))
+        for parte in partes:
+            if not parte.denso:
+                _agregar_bits(mapa, parte.elementos)
+        return _Conjunto(bits=int.from_bytes(mapa, "little"))
+
+    def _conjunto_precio(self, precio_min: Optional[float], precio_max: Optional[float]) -> _Conjunto:
+        """Posiciones con precio dentro del rango"""
+        n = len(self.productos)
+        inicio, fin = self._limites_precio(precio_min, precio_max)
+        if fin <= inicio:
+            return _Conjunto(elementos=set())
+        if (fin - inicio) * _DENSIDAD_BITMAP <= n:
+            return _Conjunto(elementos=set(self.orden_precio[inicio:fin]))
+        # Rango amplio: OR de los tramos completos más los bordes
+        tramo = self._tramo_precio
+        primer_tramo = -(-inicio // tramo)
+        ultimo_tramo = fin // tramo
+        bits = 0
+        for b in range(primer_tramo, ultimo_tramo):
+            bits |= self._bits_precio[b]
+        mapa = bytearray(bits.to_bytes((n + 7) // 8, "little"))
+        _agregar_bits(mapa, self.orden_precio[inicio:min(primer_tramo * tramo, fin)])
+        _agregar_bits(mapa, self.orden_precio[max(ultimo_tramo * tramo, inicio):fin])
+        return _Conjunto(bits=int.from_bytes(mapa, "little"), tamano=fin - inicio)
+
+    def _limites_precio(self, precio_min: Optional[float], precio_max: Optional[float]) -> Tuple[int, int]:
+        inicio = 0 if precio_min is None else bisect.bisect_left(self.precios_ordenados, precio_min)
+        fin = (len(self.precios_ordenados) if precio_max is None
+               else bisect.bisect_right(self.precios_ordenados, precio_max))
+        return inicio, fin
+
+    def _intersectar(self, conjuntos: List[_Conjunto]) -> _Conjunto:
+        """Intersección partiendo por el conjunto disperso más pequeño"""
+        densos = [c for c in conjuntos if c.denso]
+        dispersos = sorted((c for c in conjuntos if not c.denso), key=lambda c: c.tamano)
+
+        bits = None
+        for c in densos:
+            bits = c.bits if bits is None else bits & c.bits
+        if not dispersos:
+            return _Conjunto(bits=bits)
+
+        candidatos = set(dispersos[0].elementos)
+        for c in dispersos[1:]:
+            if not candidatos:
+                break
+            if isinstance(c.elementos, array) and c.tamano > _FACTOR_BISECT * len(candidatos):
+                contiene = c.contiene()
+                candidatos = {i for i in candidatos if contiene(i)}
+            else:
+                candidatos.intersection_update(c.elementos)
+        if bits is not None and candidatos:
+            contiene = _Conjunto(bits=bits, tamano=0).contiene()
+            candidatos = {i for i in candidatos if contiene(i)}
+        return _Conjunto(elementos=candidatos)
+
+    # ---------- búsqueda ----------
+
+    def buscar(
+        self,
+        q: Optional[str] = None,
+        categoria: Optional[str] = None,
+        precio_min: Optional[float] = None,
+        precio_max: Optional[float] = None,
+        orden: str = ORDEN_POR_DEFECTO,
+        skip: int = 0,
+        limit: int = 20
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Buscar productos.
+
+        Todos los tokens de `q` deben coincidir exactamente, salvo el último
+        que se busca como prefijo (búsqueda mientras se escribe).
+
+        Returns:
+            Tuple[int, List[dict]]: (total de coincidencias, página de productos)
+        """
+        if orden not in ORDENES_VALIDOS:
+            orden = ORDEN_POR_DEFECTO
+        skip = max(skip, 0)
+        limit = max(limit, 0)
+
+        conjuntos: List[_Conjunto] = []
+        tokens = tokenizar(q)
+        for i, token in enumerate(tokens):
+            conjunto = (self._conjunto_prefijo(token) if i == len(tokens) - 1
+                        else self.invertido.get(token))
+            if conjunto is None:
+                return 0, []
+            conjuntos.append(conjunto)
+        if categoria:
+            conjunto = self.categorias.get(normalizar_texto(categoria))
+            if conjunto is None:
+                return 0, []
+            conjuntos.append(conjunto)
+
+        if precio_min is not None or precio_max is not None:
+            if not conjuntos and orden in ("precio_asc", "precio_desc"):
+                # Solo filtro de precio: el rango ya viene ordenado por precio
+                return self._pagina_rango_precio(precio_min, precio_max, orden, skip, limit)
+            conjuntos.append(self._conjunto_precio(precio_min, precio_max))
+
+        if not conjuntos:
+            return len(self.productos), self._pagina_completa(orden, skip, limit)
+
+        if len(conjuntos) == 1 and isinstance(conjuntos[0].elementos, array) and orden == "id":
+            # Una sola lista ordenada por posición: ya está en orden de id
+            elementos = conjuntos[0].elementos
+            return len(elementos), [self.productos[i] for i in elementos[skip:skip + limit]]
+
+        resultado = conjuntos[0] if len(conjuntos) == 1 else self._intersectar(conjuntos)
+        return resultado.tamano, self._pagina_conjunto(resultado, orden, skip, limit)
+
+    # ---------- orden y paginación ----------
+
+    def _secuencia_ordenada(self, orden: str):
+        if orden == "precio_asc":
+            return self.orden_precio
+        if orden == "precio_desc":
+            return reversed(self.orden_precio)
+        if orden == "rating_asc":
+            return self.orden_rating
+        if orden == "rating_desc":
+            return reversed(self.orden_rating)
+        return range(len(self.productos))
+
+    def _pagina_completa(self, orden: str, skip: int, limit: int) -> List[Dict[str, Any]]:
+        n = len(self.productos)
+        if orden in ("precio_desc", "rating_desc"):
+            base = self.orden_precio if orden == "precio_desc" else self.orden_rating
+            fin = max(n - skip, 0)
+            return [self.productos[i] for i in reversed(base[max(fin - limit, 0):fin])]
+        if orden in ("precio_asc", "rating_asc"):
+            base = self.orden_precio if orden == "precio_asc" else self.orden_rating
+            return [self.productos[i] for i in base[skip:skip + limit]]
+        return self.productos[skip:skip + limit]
+
+    def _pagina_rango_precio(
+        self, precio_min: Optional[float], precio_max: Optional[float], orden: str, skip: int, limit: int
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        inicio, fin = self._limites_precio(precio_min, precio_max)
+        total = max(fin - inicio, 0)
+        if orden == "precio_asc":
+            posiciones = self.orden_precio[inicio + skip:min(inicio + skip + limit, fin)]
+        else:
+            hasta = max(fin - skip, inicio)
+            posiciones = reversed(self.orden_precio[max(hasta - limit, inicio):hasta])
+        return total, [self.productos[i] for i in posiciones]
+
+    def _pagina_conjunto(self, conjunto: _Conjunto, orden: str, skip: int, limit: int) -> List[Dict[str, Any]]:
+        k = conjunto.tamano
+        requeridos = skip + limit
+        if k == 0 or skip >= k:
+            return []
+
+        n = len(self.productos)
+        # Recorrer el arreglo pre-ordenado hasta completar la página toma
+        # ~requeridos * n / k pasos; conviene si los candidatos son densos
+        # (siempre para bitmaps) o si ordenarlos todos sería más caro
+        if conjunto.denso or requeridos * n < 2 * k * k:
+            contiene = conjunto.contiene()
+            pagina = []
+            vistos = 0
+            for i in self._secuencia_ordenada(orden):
+                if contiene(i):
+                    if vistos >= skip:
+                        pagina.append(self.productos[i])
+                        if len(pagina) == limit:
+                            break
+                    vistos += 1
+            return pagina
+
+        candidatos = conjunto.elementos
+        if orden == "id":
+            ordenados = sorted(candidatos)
+        elif orden.startswith("precio"):
+            ordenados = sorted(candidatos, key=self.rango_precio.__getitem__,
+                               reverse=orden == "precio_desc")
+        else:
+            ordenados = sorted(candidatos, key=self.rango_rating.__getitem__,
+                               reverse=orden == "rating_desc")
+        return [self.productos[i] for i in ordenados[skip:requeridos]]
+
+
+def construir_indice(datos: Dict[int, Dict[str, Any]]) -> IndiceCatalogo:
+    """Construir el índice a partir de los productos indexados por id"""
+    return IndiceCatalogo(datos.values())
@@ -0,0 +1,206 @@
+"""
+Servicio de catálogo en memoria para productos y métodos de envío.
+
+Los archivos JSON del catálogo se cargan una sola vez y se mantienen en
+memoria indexados por id. Cada cierto intervalo se revisa (con un simple
+stat) si el archivo cambió en disco; si cambió, se construye una nueva
+instantánea y se reemplaza de forma atómica, sin bloquear a los lectores.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .catalogo_indice import construir_indice
+
+logger = logging.getLogger(__name__)
+
+# Segundos mínimos entre dos revisiones del archivo en disco
+CATALOGO_RECHEQUEO_SEGUNDOS = float(os.getenv("CATALOGO_RECHEQUEO_SEGUNDOS", "5"))
+
+# Datos por defecto si no se encuentra envios.json
+ENVIOS_POR_DEFECTO = [
+    {"id": 1, "nombre": "Envío Estándar UNAB", "precio": 5.0},
+    {"id": 2, "nombre": "Envío Express UNAB", "precio": 12.0},
+    {"id": 3, "nombre": "Envío Premium UNAB", "precio": 25.0},
+    {"id": 4, "nombre": "Retiro en Campus UNAB", "precio": 0.0},
+]
+
+
+def _rutas_posibles(nombre_archivo: str) -> List[str]:
+    """Rutas candidatas para un archivo de datos del frontend"""
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return [
+        # Ruta relativa desde el backend (desarrollo local)
+        os.path.join(
+            os.path.dirname(os.path.dirname(app_dir)),
+            "frontend", "public", "data", nombre_archivo
+        ),
+        # Ruta absoluta desde el directorio actual
+        os.path.join(os.getcwd(), "frontend", "public", "data", nombre_archivo),
+        # Ruta desde el directorio padre
+        os.path.join(os.path.dirname(os.getcwd()), "frontend", "public", "data", nombre_archivo),
+        # Ruta en Docker (si está montado)
+        os.path.join("/app/frontend/public/data", nombre_archivo),
+    ]
+
+
+@dataclass(frozen=True)
+class SnapshotCatalogo:
+    """Instantánea inmutable de un archivo de catálogo"""
+    datos: Dict[int, Dict[str, Any]]
+    ruta: Optional[str]
+    firma: Optional[tuple]
+    version: int
+    cargado_en: float
+    indice: Any = None
+
+
+class CatalogoJSON:
+    """
+    Catálogo cargado desde un archivo JSON (lista de objetos con 'id').
+
+    Las lecturas devuelven siempre la instantánea vigente. La revisión del
+    archivo (mtime, inodo y tamaño) se hace como máximo una vez cada
+    `intervalo` segundos y solo un hilo a la vez la ejecuta. Si se entrega
+    `indexar`, cada instantánea incluye además el índice construido sobre
+    sus datos.
+    """
+
+    def __init__(
+        self,
+        nombre_archivo: str,
+        por_defecto: Optional[List[Dict[str, Any]]] = None,
+        intervalo: float = CATALOGO_RECHEQUEO_SEGUNDOS,
+        indexar: Optional[Callable[[Dict[int, Dict[str, Any]]], Any]] = None
+    ):
+        self.nombre_archivo = nombre_archivo
+        self.por_defecto = por_defecto
+        self.intervalo = intervalo
+        self.indexar = indexar
+        self._snapshot: Optional[SnapshotCatalogo] = None
+        self._proxima_revision = 0.0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._revisiones = 0
+        self._recargas = 0
+        self._errores = 0
+
+    # ---------- lectura ----------
+
+    def snapshot(self) -> SnapshotCatalogo:
+        """Obtener la instantánea vigente, revisando el archivo si corresponde"""
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() >= self._proxima_revision:
+            self._revisar(bloquear=snapshot is None)
+            snapshot = self._snapshot
+        self._hits += 1
+        return snapshot
+
+    def obtener(self) -> Dict[int, Dict[str, Any]]:
+        """Obtener los datos del catálogo indexados por id"""
+        return self.snapshot().datos
+
+    def cargar(self) -> SnapshotCatalogo:
+        """Forzar la carga del archivo (usado al iniciar la aplicación)"""
+        with self._lock:
+            self._recargar(self._buscar_ruta())
+        return self._snapshot
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores para monitoreo"""
+        snapshot = self._snapshot
+        return {
+            "archivo": self.nombre_archivo,
+            "ruta": snapshot.ruta if snapshot else None,
+            "version": snapshot.version if snapshot else 0,
+            "elementos": len(snapshot.datos) if snapshot else 0,
+            "cargado_en": snapshot.cargado_en if snapshot else None,
+            "hits": self._hits,
+            "revisiones": self._revisiones,
+            "recargas": self._recargas,
+            "errores": self._errores,
+            "intervalo_segundos": self.intervalo,
+        }
+
+    # ---------- revisión y recarga ----------
+
+    def _revisar(self, bloquear: bool) -> None:
+        # Si otro hilo ya está revisando, se sigue usando la instantánea actual
+        if not self._lock.acquire(blocking=bloquear):
+            return
+        try:
+            if self._snapshot is not None and time.monotonic() < self._proxima_revision:
+                return
+            self._revisiones += 1
+            snapshot = self._snapshot
+            ruta = snapshot.ruta if snapshot and snapshot.ruta else None
+            if ruta is None or self._firma(ruta) is None:
+                ruta = self._buscar_ruta()
+            if snapshot is None or ruta != snapshot.ruta or self._firma(ruta) != snapshot.firma:
+                self._recargar(ruta)
+            else:
+                self._proxima_revision = time.monotonic() + self.intervalo
+        finally:
+            self._lock.release()
+
+    def _recargar(self, ruta: Optional[str]) -> None:
+        anterior = self._snapshot
+        version = (anterior.version if anterior else 0) + 1
+        try:
+            if ruta is None:
+                if anterior is not None:
+                    # El archivo desapareció: mantener la última versión conocida
+                    return
+                logger.warning("No se pudo cargar %s desde ningún archivo", self.nombre_archivo)
+                lista, firma = (self.por_defecto or []), None
+            else:
+                firma = self._firma(ruta)
+                with open(ruta, 'r', encoding='utf-8') as f:
+                    lista = json.load(f)
+            datos = {item['id']: item for item in lista}
+            indice = self.indexar(datos) if self.indexar else None
+        except Exception as e:
+            self._errores += 1
+            logger.error("Error al cargar %s desde %s: %s", self.nombre_archivo, ruta, e)
+            if anterior is None:
+                datos = {item['id']: item for item in (self.por_defecto or [])}
+                self._snapshot = SnapshotCatalogo(
+                    datos=datos, ruta=None, firma=None, version=version, cargado_en=time.time(),
+                    indice=self.indexar(datos) if self.indexar else None
+                )
+            return
+        finally:
+            self._proxima_revision = time.monotonic() + self.intervalo
+
+        # Reemplazo atómico de la instantánea
+        self._snapshot = SnapshotCatalogo(
+            datos=datos, ruta=ruta, firma=firma, version=version, cargado_en=time.time(),
+            indice=indice
+        )
+        self._recargas += 1
+        logger.info("%s cargado desde %s (versión %d, %d elementos)",
+                    self.nombre_archivo, ruta, version, len(datos))
+
+    def _buscar_ruta(self) -> Optional[str]:
+        for ruta in _rutas_posibles(self.nombre_archivo):
+            ruta = os.path.normpath(ruta)
+            if os.path.isfile(ruta):
+                return ruta
+        return None
+
+    @staticmethod
+    def _firma(ruta: str) -> Optional[tuple]:
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+
+# Instancias compartidas por la aplicación
+catalogo_productos = CatalogoJSON("productos.json", indexar=construir_indice)
+catalogo_envios = CatalogoJSON("envios.json", por_defecto=ENVIOS_POR_DEFECTO)
@@ -0,0 +1,246 @@
+"""
+Cola de generación de comprobantes PDF en segundo plano.
+
+El checkout solo registra un trabajo en la tabla `trabajos_pdf` (en la misma
+transacción de la compra) y responde. Un grupo de hilos dentro del proceso de
+la API toma los trabajos con `FOR UPDATE SKIP LOCKED`, genera el PDF y marca el
+documento como listo. Como la cola vive en la base de datos, los trabajos
+sobreviven a reinicios y varios procesos de la API pueden consumirla a la vez.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import Documento, DetalleDocumento, TrabajoPDF
+from .documento_service import crear_snapshot_pdf
+from .metricas_service import contador_pdfs
+from .motor_pdf_service import motor_pdf
+
+logger = logging.getLogger(__name__)
+
+# Hilos que consumen la cola en cada proceso de la API (0 desactiva el consumo).
+# Cada hilo espera a un render del motor de procesos, así que conviene >= PDF_PROCESOS
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+# Intentos antes de marcar el documento con error
+PDF_MAX_INTENTOS = int(os.getenv("PDF_MAX_INTENTOS", "5"))
+# Espera base entre reintentos (se duplica en cada intento)
+PDF_REINTENTO_BASE_SEGUNDOS = float(os.getenv("PDF_REINTENTO_BASE_SEGUNDOS", "5"))
+# Segundos entre consultas a la cola cuando no hay avisos
+PDF_POLL_SEGUNDOS = float(os.getenv("PDF_POLL_SEGUNDOS", "2"))
+# Tiempo tras el cual un trabajo "procesando" se considera abandonado (proceso caído)
+PDF_LEASE_SEGUNDOS = float(os.getenv("PDF_LEASE_SEGUNDOS", "120"))
+# Valor de Retry-After para GET /documentos/{id}/pdf mientras el PDF está pendiente
+PDF_RETRY_AFTER_SEGUNDOS = int(os.getenv("PDF_RETRY_AFTER_SEGUNDOS", "2"))
+
+_SQL_TOMAR = text("""
+    UPDATE trabajos_pdf t
+    SET estado = 'procesando',
+        intentos = t.intentos + 1,
+        bloqueado_hasta = now() + make_interval(secs => :lease)
+    WHERE t.id = (
+        SELECT id FROM trabajos_pdf
+        WHERE (estado = 'pendiente' AND disponible_en <= now())
+           OR (estado = 'procesando' AND bloqueado_hasta < now())
+        ORDER BY disponible_en
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING t.id, t.documento_id, t.intentos
+""")
+
+
+def encolar_pdf(db: Session, documento_id: UUID) -> None:
+    """
+    Registrar (o reiniciar) el trabajo de PDF de un documento.
+    No hace commit: el trabajo se confirma junto con la transacción del llamador.
+    """
+    db.execute(
+        insert(TrabajoPDF)
+        .values(documento_id=documento_id, estado="pendiente", intentos=0)
+        .on_conflict_do_update(
+            index_elements=[TrabajoPDF.documento_id],
+            set_={
+                "estado": "pendiente",
+                "intentos": 0,
+                "ultimo_error": None,
+                "disponible_en": func.now(),
+                "bloqueado_hasta": None,
+            }
+        )
+    )
+
+
+class ColaPDF:
+    """Consumidores de `trabajos_pdf` ejecutados en hilos del proceso"""
+
+    def __init__(self, workers: int = PDF_WORKERS):
+        self.workers = workers
+        self._hilos: List[threading.Thread] = []
+        self._aviso = threading.Event()
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._procesados = 0
+        self._reintentos = 0
+        self._errores = 0
+        self._en_curso = 0
+        self._segundos_render = 0.0
+
+    # ---------- ciclo de vida ----------
+
+    def iniciar(self) -> None:
+        """Lanzar los hilos consumidores (idempotente)"""
+        if self._hilos or self.workers <= 0:
+            return
+        self._detener.clear()
+        for n in range(self.workers):
+            hilo = threading.Thread(target=self._bucle, name=f"cola-pdf-{n}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        logger.info("Cola de PDF iniciada con %d hilos", self.workers)
+
+    def detener(self, timeout: float = 10.0) -> None:
+        """Pedir a los hilos que terminen; los trabajos a medias se retoman al vencer su lease"""
+        self._detener.set()
+        self._aviso.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+        self._hilos = []
+        motor_pdf.cerrar()
+
+    def notificar(self) -> None:
+        """Despertar a los consumidores tras encolar un trabajo"""
+        self._aviso.set()
+
+    # ---------- consumo ----------
+
+    def _bucle(self) -> None:
+        while not self._detener.is_set():
+            try:
+                procesado = self.procesar_siguiente()
+            except Exception as e:
+                logger.error("Error consultando la cola de PDF: %s", e)
+                procesado = False
+            if not procesado:
+                self._aviso.wait(PDF_POLL_SEGUNDOS)
+                self._aviso.clear()
+
+    def procesar_siguiente(self) -> bool:
+        """Tomar y procesar un trabajo. Retorna False si la cola está vacía."""
+        with SessionLocal() as db:
+            fila = db.execute(_SQL_TOMAR, {"lease": PDF_LEASE_SEGUNDOS}).first()
+            db.commit()
+            if fila is None:
+                return False
+
+            with self._lock:
+                self._en_curso += 1
+            inicio = time.perf_counter()
+            try:
+                ruta = self._generar(db, fila.documento_id)
+            except Exception as e:
+                db.rollback()
+                self._registrar_fallo(db, fila.id, fila.documento_id, fila.intentos, e)
+            else:
+                self._registrar_exito(db, fila.id, fila.documento_id, fila.intentos, ruta)
+                contador_pdfs.incrementar("cola", "ok")
+                with self._lock:
+                    self._procesados += 1
+                    self._segundos_render += time.perf_counter() - inicio
+            finally:
+                with self._lock:
+                    self._en_curso -= 1
+            return True
+
+    @staticmethod
+    def _generar(db: Session, documento_id: UUID) -> Optional[str]:
+        documento = db.get(Documento, documento_id)
+        if documento is None:
+            # El documento se eliminó; el trabajo se borra en cascada
+            return None
+        detalles = db.execute(
+            select(DetalleDocumento)
+            .where(DetalleDocumento.documento_id == documento_id)
+            .order_by(DetalleDocumento.fecha_creacion)
+        ).scalars().all()
+        snapshot = crear_snapshot_pdf(documento, documento.usuario, detalles)
+        # Liberar la conexión mientras el pool de procesos renderiza
+        db.rollback()
+        return motor_pdf.renderizar(snapshot)
+
+    @staticmethod
+    def _registrar_exito(db: Session, trabajo_id: int, documento_id: UUID, intentos: int, ruta: Optional[str]) -> None:
+        # Solo si el trabajo sigue siendo nuestro (el lease pudo vencer y otro hilo tomarlo)
+        borrado = db.execute(
+            text("DELETE FROM trabajos_pdf WHERE id = :id AND intentos = :intentos"),
+            {"id": trabajo_id, "intentos": intentos}
+        ).rowcount
+        if borrado and ruta is not None:
+            db.execute(
+                text("UPDATE documentos SET ruta_documento = :ruta, pdf_estado = 'listo' WHERE id = :id"),
+                {"ruta": ruta, "id": documento_id}
+            )
+        db.commit()
+
+    def _registrar_fallo(self, db: Session, trabajo_id: int, documento_id: UUID, intentos: int, error: Exception) -> None:
+        mensaje = f"{type(error).__name__}: {error}"
+        if intentos >= PDF_MAX_INTENTOS:
+            logger.error("PDF del documento %s falló tras %d intentos: %s", documento_id, intentos, mensaje)
+            db.execute(
+                text("UPDATE trabajos_pdf SET estado = 'error', ultimo_error = :error, bloqueado_hasta = NULL "
+                     "WHERE id = :id AND intentos = :intentos"),
+                {"id": trabajo_id, "intentos": intentos, "error": mensaje}
+            )
+            db.execute(
+                text("UPDATE documentos SET pdf_estado = 'error' WHERE id = :id"),
+                {"id": documento_id}
+            )
+            contador_pdfs.incrementar("cola", "error")
+            with self._lock:
+                self._errores += 1
+        else:
+            espera = PDF_REINTENTO_BASE_SEGUNDOS * 2 ** (intentos - 1)
+            logger.warning("PDF del documento %s falló (intento %d), reintento en %.0fs: %s",
+                           documento_id, intentos, espera, mensaje)
+            db.execute(
+                text("UPDATE trabajos_pdf SET estado = 'pendiente', ultimo_error = :error, bloqueado_hasta = NULL, "
+                     "disponible_en = now() + make_interval(secs => :espera) "
+                     "WHERE id = :id AND intentos = :intentos"),
+                {"id": trabajo_id, "intentos": intentos, "error": mensaje, "espera": espera}
+            )
+            contador_pdfs.incrementar("cola", "reintento")
+            with self._lock:
+                self._reintentos += 1
+        db.commit()
+
+    # ---------- monitoreo ----------
+
+    def estadisticas(self, db: Session) -> Dict[str, Any]:
+        """Contadores del proceso y trabajos en la tabla por estado"""
+        por_estado = dict(db.execute(
+            select(TrabajoPDF.estado, func.count()).group_by(TrabajoPDF.estado)
+        ).all())
+        with self._lock:
+            return {
+                "workers": len(self._hilos),
+                "en_curso": self._en_curso,
+                "procesados": self._procesados,
+                "reintentos": self._reintentos,
+                "errores": self._errores,
+                "render_promedio_ms": (
+                    self._segundos_render / self._procesados * 1000 if self._procesados else None
+                ),
+                "trabajos": por_estado,
+                "motor": motor_pdf.estadisticas(),
+            }
+
+
+# Instancia compartida por la aplicación
+cola_pdf = ColaPDF()
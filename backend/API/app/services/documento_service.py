@@ -1,10 +1,13 @@
 """
 Servicio para generación de documentos PDF de compras
 """
+import copy
 import os
+import threading
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
 from uuid import UUID
 
 try:
@@ -23,6 +26,317 @@ from sqlalchemy.orm import Session
 from ..models import Documento, DetalleDocumento, Usuario
 
 
+# Copias planas y serializables (pickle) de los datos que usa el PDF. Tienen los
+# mismos atributos que los modelos, por lo que generar_pdf_documento acepta ambos.
+
+@dataclass(frozen=True)
+class DocumentoPDF:
+    id: UUID
+    fecha_creacion: datetime
+    estado: str
+    monto_total: float
+    metadata_json: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class UsuarioPDF:
+    nombre: Optional[str]
+    apellido: Optional[str]
+    email: str
+    rut: Optional[str]
+    telefono: Optional[str]
+
+
+@dataclass(frozen=True)
+class DetallePDF:
+    producto: str
+    precio: float
+    cantidad: int
+
+
+@dataclass(frozen=True)
+class SnapshotPDF:
+    documento: DocumentoPDF
+    usuario: UsuarioPDF
+    detalles: Tuple[DetallePDF, ...]
+
+
+def crear_snapshot_pdf(
+    documento: Documento,
+    usuario: Usuario,
+    detalles: list[DetalleDocumento]
+) -> SnapshotPDF:
+    """Copiar desde los modelos solo lo necesario para renderizar el PDF"""
+    return SnapshotPDF(
+        documento=DocumentoPDF(
+            id=documento.id,
+            fecha_creacion=documento.fecha_creacion,
+            estado=documento.estado or "",
+            monto_total=float(documento.monto_total or 0),
+            metadata_json=dict(documento.metadata_json or {}),
+        ),
+        usuario=UsuarioPDF(
+            nombre=usuario.nombre,
+            apellido=usuario.apellido,
+            email=usuario.email,
+            rut=usuario.rut,
+            telefono=usuario.telefono,
+        ),
+        detalles=tuple(
+            DetallePDF(producto=d.producto, precio=float(d.precio or 0), cantidad=d.cantidad or 0)
+            for d in detalles
+        ),
+    )
+
+
+def crear_snapshots_pdf(db: Session, documentos: list[Documento]) -> Dict[UUID, SnapshotPDF]:
+    """Snapshots de varios documentos con una consulta para usuarios y otra para detalles"""
+    if not documentos:
+        return {}
+    ids = [d.id for d in documentos]
+    usuarios = {
+        u.id: u for u in db.query(Usuario).filter(
+            Usuario.id.in_({d.usuario_id for d in documentos})
+        )
+    }
+    detalles: Dict[UUID, list] = {i: [] for i in ids}
+    for detalle in db.query(DetalleDocumento).filter(
+        DetalleDocumento.documento_id.in_(ids)
+    ).order_by(DetalleDocumento.documento_id, DetalleDocumento.fecha_creacion):
+        detalles[detalle.documento_id].append(detalle)
+    return {
+        d.id: crear_snapshot_pdf(d, usuarios[d.usuario_id], detalles[d.id])
+        for d in documentos
+    }
+
+
+def ruta_base_documentos() -> str:
+    """Directorio raíz de los PDFs (API/documents)"""
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+        "documents"
+    )
+
+def _estilo_clave_valor() -> "TableStyle":
+    # Tablas de dos columnas (etiqueta en gris a la izquierda)
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5F5F5')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ])
+
+
+class ReceiptTemplate:
+    """
+    Partes fijas del comprobante: estilos, estilos de tabla, anchos de columna
+    y los párrafos estáticos (encabezado, títulos de sección y pie de página).
+    Se construye una sola vez; cada comprobante solo arma las filas dinámicas.
+    """
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        
+        # Estilos personalizados
+        titulo_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=20,
+            textColor=colors.HexColor('#002B5C'),  # Azul UNAB
+            spaceAfter=30,
+            alignment=TA_CENTER
+        )
+        subtitulo_style = ParagraphStyle(
+            'CustomSubtitle',
+            parent=styles['Normal'],
+            fontSize=12,
+            textColor=colors.HexColor('#666666'),
+            alignment=TA_CENTER,
+            spaceAfter=20
+        )
+        
+        # Anchos de columna
+        self.anchos_clave_valor = [5*cm, 10*cm]
+        self.anchos_detalle = [8*cm, 2*cm, 3*cm, 2*cm]
+        self.anchos_totales = [10*cm, 5*cm]
+        
+        # Estilos de tabla
+        self.estilo_clave_valor = _estilo_clave_valor()
+        self.estilo_detalle = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#002B5C')),  # Azul UNAB
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9F9F9')]),
+        ])
+        self.estilo_totales = TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, -1), (-1, -1), 12),
+            ('FONTSIZE', (0, 0), (0, -2), 10),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#C8102E')),  # Rojo UNAB
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('LINEBELOW', (0, -2), (-1, -2), 1, colors.grey),
+        ])
+        
+        # Párrafos estáticos (el markup se interpreta una sola vez)
+        self.encabezado = [
+            Paragraph("COMPROBANTE DE COMPRA", titulo_style),
+            Paragraph("Universidad Andrés Bello", subtitulo_style),
+        ]
+        self.titulo_comprador = Paragraph("<b>DATOS DEL COMPRADOR</b>", styles['Heading2'])
+        self.titulo_envio = Paragraph("<b>INFORMACIÓN DE ENVÍO</b>", styles['Heading2'])
+        self.titulo_detalle = Paragraph("<b>DETALLE DE PRODUCTOS</b>", styles['Heading2'])
+        self.encabezados_detalle = ['Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']
+        self.pie = Paragraph("""
+        <para align="center">
+        <b>Universidad Andrés Bello</b><br/>
+        Gracias por su compra<br/>
+        Para consultas: contacto@unab.cl<br/>
+        <i>Este es un comprobante de compra, no constituye una factura tributaria.</i>
+        </para>
+        """, styles['Normal'])
+
+    @staticmethod
+    def estatico(flowable):
+        """Copia superficial de un flowable fijo: comparte el markup ya interpretado,
+        pero el layout (wrap/split) de cada comprobante no afecta al original"""
+        return copy.copy(flowable)
+
+    def tabla(self, filas, anchos, estilo) -> "Table":
+        tabla = Table(filas, colWidths=anchos)
+        tabla.setStyle(estilo)
+        return tabla
+
+    def construir_story(self, documento, usuario, detalles) -> list:
+        """Armar los flowables de un comprobante"""
+        story = [self.estatico(f) for f in self.encabezado]
+        story.append(Spacer(1, 0.5*cm))
+        
+        # Información del documento
+        info_data = [
+            ['Número de Compra:', str(documento.id)],
+            ['Fecha:', documento.fecha_creacion.strftime('%d/%m/%Y %H:%M:%S')],
+            ['Estado:', documento.estado.upper()],
+        ]
+        story.append(self.tabla(info_data, self.anchos_clave_valor, self.estilo_clave_valor))
+        story.append(Spacer(1, 0.5*cm))
+        
+        # Datos del comprador
+        story.append(self.estatico(self.titulo_comprador))
+        comprador_data = [
+            ['Nombre:', f"{usuario.nombre or ''} {usuario.apellido or ''}".strip() or 'N/A'],
+            ['Email:', usuario.email],
+        ]
+        
+        # Agregar RUT y teléfono si están disponibles
+        if usuario.rut:
+            comprador_data.append(['RUT:', usuario.rut])
+        if usuario.telefono:
+            comprador_data.append(['Teléfono:', usuario.telefono])
+        
+        story.append(self.tabla(comprador_data, self.anchos_clave_valor, self.estilo_clave_valor))
+        story.append(Spacer(1, 0.5*cm))
+        
+        # Información de envío desde metadata
+        if documento.metadata_json:
+            metadata = documento.metadata_json
+            if 'direccion' in metadata or 'metodo_envio' in metadata:
+                story.append(self.estatico(self.titulo_envio))
+                envio_data = []
+                
+                if 'direccion' in metadata:
+                    direccion = metadata['direccion']
+                    envio_data.append(['Dirección:', direccion.get('direccion', 'N/A')])
+                    if direccion.get('comuna'):
+                        envio_data.append(['Comuna:', direccion['comuna']])
+                    if direccion.get('ciudad'):
+                        envio_data.append(['Ciudad:', direccion['ciudad']])
+                    if direccion.get('codigo_postal'):
+                        envio_data.append(['Código Postal:', direccion['codigo_postal']])
+                
+                if 'metodo_envio' in metadata:
+                    metodo = metadata['metodo_envio']
+                    envio_data.append(['Método de Envío:', metodo.get('nombre', 'N/A')])
+                    if metodo.get('tiempo'):
+                        envio_data.append(['Tiempo Estimado:', metodo['tiempo']])
+                
+                if envio_data:
+                    story.append(self.tabla(envio_data, self.anchos_clave_valor, self.estilo_clave_valor))
+                    story.append(Spacer(1, 0.5*cm))
+        
+        # Detalle de productos
+        story.append(self.estatico(self.titulo_detalle))
+        detalle_data = [self.encabezados_detalle]
+        for detalle in detalles:
+            subtotal = (detalle.precio or 0) * (detalle.cantidad or 0)
+            detalle_data.append([
+                detalle.producto,
+                str(detalle.cantidad or 0),
+                f"${detalle.precio:,.0f}" if detalle.precio else "$0",
+                f"${subtotal:,.0f}"
+            ])
+        story.append(self.tabla(detalle_data, self.anchos_detalle, self.estilo_detalle))
+        story.append(Spacer(1, 0.5*cm))
+        
+        # Totales
+        subtotal_productos = sum((d.precio or 0) * (d.cantidad or 0) for d in detalles)
+        costo_envio = documento.metadata_json.get('costo_envio', 0) if documento.metadata_json else 0
+        total = documento.monto_total
+        
+        totales_data = [
+            ['Subtotal Productos:', f"${subtotal_productos:,.0f}"],
+            ['Costo de Envío:', f"${costo_envio:,.0f}"],
+            ['TOTAL:', f"${total:,.0f}"],
+        ]
+        story.append(self.tabla(totales_data, self.anchos_totales, self.estilo_totales))
+        story.append(Spacer(1, 1*cm))
+        
+        # Pie de página
+        story.append(self.estatico(self.pie))
+        return story
+
+
+_plantilla: Optional[ReceiptTemplate] = None
+
+
+def obtener_plantilla() -> ReceiptTemplate:
+    """Plantilla compartida, construida en el primer uso"""
+    global _plantilla
+    if _plantilla is None:
+        _plantilla = ReceiptTemplate()
+    return _plantilla
+
+
+def renderizar_pdf(
+    destino: Union[str, BinaryIO],
+    documento: Documento,
+    usuario: Usuario,
+    detalles: list[DetalleDocumento],
+    plantilla: Optional[ReceiptTemplate] = None
+) -> None:
+    """Renderizar el comprobante en una ruta o en un archivo abierto"""
+    if not REPORTLAB_AVAILABLE:
+        raise RuntimeError("reportlab no está instalado. Instálelo con: pip install reportlab")
+    plantilla = plantilla or obtener_plantilla()
+    doc = SimpleDocTemplate(destino, pagesize=A4)
+    doc.build(plantilla.construir_story(documento, usuario, detalles))
+
+
 def generar_pdf_documento(
     documento: Documento,
     usuario: Usuario,
@@ -46,10 +360,7 @@ def generar_pdf_documento(
     
     # Determinar ruta base
     if base_path is None:
-        base_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "documents"
-        )
+        base_path = ruta_base_documentos()
     
     # Crear estructura de carpetas por fecha
     fecha = documento.fecha_creacion.date()
@@ -65,197 +376,18 @@ def generar_pdf_documento(
     nombre_archivo = f"{documento.id}.pdf"
     ruta_completa = os.path.join(carpeta_fecha, nombre_archivo)
     
-    # Crear documento PDF
-    doc = SimpleDocTemplate(ruta_completa, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
-    
-    # Estilos personalizados
-    titulo_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor('#002B5C'),  # Azul UNAB
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    subtitulo_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=12,
-        textColor=colors.HexColor('#666666'),
-        alignment=TA_CENTER,
-        spaceAfter=20
-    )
-    
-    # Encabezado
-    story.append(Paragraph("COMPROBANTE DE COMPRA", titulo_style))
-    story.append(Paragraph("Universidad Andrés Bello", subtitulo_style))
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Información del documento
-    info_data = [
-        ['Número de Compra:', str(documento.id)],
-        ['Fecha:', documento.fecha_creacion.strftime('%d/%m/%Y %H:%M:%S')],
-        ['Estado:', documento.estado.upper()],
-    ]
-    
-    info_table = Table(info_data, colWidths=[5*cm, 10*cm])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5F5F5')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    story.append(info_table)
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Datos del comprador
-    story.append(Paragraph("<b>DATOS DEL COMPRADOR</b>", styles['Heading2']))
-    comprador_data = [
-        ['Nombre:', f"{usuario.nombre or ''} {usuario.apellido or ''}".strip() or 'N/A'],
-        ['Email:', usuario.email],
-    ]
-    
-    # Agregar RUT y teléfono si están disponibles
-    if usuario.rut:
-        comprador_data.append(['RUT:', usuario.rut])
-    if usuario.telefono:
-        comprador_data.append(['Teléfono:', usuario.telefono])
-    
-    comprador_table = Table(comprador_data, colWidths=[5*cm, 10*cm])
-    comprador_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5F5F5')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-    ]))
-    story.append(comprador_table)
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Información de envío desde metadata
-    if documento.metadata_json:
-        metadata = documento.metadata_json
-        if 'direccion' in metadata or 'metodo_envio' in metadata:
-            story.append(Paragraph("<b>INFORMACIÓN DE ENVÍO</b>", styles['Heading2']))
-            envio_data = []
-            
-            if 'direccion' in metadata:
-                direccion = metadata['direccion']
-                envio_data.append(['Dirección:', direccion.get('direccion', 'N/A')])
-                if direccion.get('comuna'):
-                    envio_data.append(['Comuna:', direccion['comuna']])
-                if direccion.get('ciudad'):
-                    envio_data.append(['Ciudad:', direccion['ciudad']])
-                if direccion.get('codigo_postal'):
-                    envio_data.append(['Código Postal:', direccion['codigo_postal']])
-            
-            if 'metodo_envio' in metadata:
-                metodo = metadata['metodo_envio']
-                envio_data.append(['Método de Envío:', metodo.get('nombre', 'N/A')])
-                if metodo.get('tiempo'):
-                    envio_data.append(['Tiempo Estimado:', metodo['tiempo']])
-            
-            if envio_data:
-                envio_table = Table(envio_data, colWidths=[5*cm, 10*cm])
-                envio_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5F5F5')),
-                    ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                    ('TOPPADDING', (0, 0), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-                ]))
-                story.append(envio_table)
-                story.append(Spacer(1, 0.5*cm))
-    
-    # Detalle de productos
-    story.append(Paragraph("<b>DETALLE DE PRODUCTOS</b>", styles['Heading2']))
-    
-    # Encabezados de tabla
-    detalle_headers = ['Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']
-    detalle_data = [detalle_headers]
-    
-    # Agregar productos
-    for detalle in detalles:
-        subtotal = (detalle.precio or 0) * (detalle.cantidad or 0)
-        detalle_data.append([
-            detalle.producto,
-            str(detalle.cantidad or 0),
-            f"${detalle.precio:,.0f}" if detalle.precio else "$0",
-            f"${subtotal:,.0f}"
-        ])
-    
-    # Crear tabla de detalles
-    detalle_table = Table(detalle_data, colWidths=[8*cm, 2*cm, 3*cm, 2*cm])
-    detalle_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#002B5C')),  # Azul UNAB
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
-        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9F9F9')]),
-    ]))
-    story.append(detalle_table)
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Totales
-    subtotal_productos = sum((d.precio or 0) * (d.cantidad or 0) for d in detalles)
-    costo_envio = documento.metadata_json.get('costo_envio', 0) if documento.metadata_json else 0
-    total = documento.monto_total
-    
-    totales_data = [
-        ['Subtotal Productos:', f"${subtotal_productos:,.0f}"],
-        ['Costo de Envío:', f"${costo_envio:,.0f}"],
-        ['TOTAL:', f"${total:,.0f}"],
-    ]
-    
-    totales_table = Table(totales_data, colWidths=[10*cm, 5*cm])
-    totales_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 12),
-        ('FONTSIZE', (0, 0), (0, -2), 10),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#C8102E')),  # Rojo UNAB
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('LINEBELOW', (0, -2), (-1, -2), 1, colors.grey),
-    ]))
-    story.append(totales_table)
-    story.append(Spacer(1, 1*cm))
-    
-    # Pie de página
-    pie_text = """
-    <para align="center">
-    <b>Universidad Andrés Bello</b><br/>
-    Gracias por su compra<br/>
-    Para consultas: contacto@unab.cl<br/>
-    <i>Este es un comprobante de compra, no constituye una factura tributaria.</i>
-    </para>
-    """
-    story.append(Paragraph(pie_text, styles['Normal']))
-    
-    # Construir PDF
-    doc.build(story)
+    # Construir PDF en un temporal propio del proceso y reemplazar de una vez: un
+    # render que siguió corriendo tras un timeout y su reintento no escriben el mismo archivo
+    temporal = f"{ruta_completa}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        renderizar_pdf(temporal, documento, usuario, detalles)
+        os.replace(temporal, ruta_completa)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
     
     # Retornar ruta relativa desde base_path
     ruta_relativa = os.path.relpath(ruta_completa, base_path)
@@ -263,5 +395,3 @@ def generar_pdf_documento(
     ruta_relativa = ruta_relativa.replace('\\', '/')
     
     return ruta_relativa
-
-
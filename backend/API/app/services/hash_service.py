@@ -0,0 +1,134 @@
+"""
+Servicio de hashing de contraseñas fuera del event loop.
+
+bcrypt consume ~100ms+ de CPU por verificación. Ejecutado dentro de un endpoint
+`async def` bloquea el event loop de uvicorn y detiene todas las peticiones en
+curso. Aquí verify/hash corren en un pool de hilos propio y acotado (la
+extensión de bcrypt libera el GIL mientras calcula), con una cola máxima para
+rechazar rápido en vez de acumular trabajo cuando llega una avalancha de logins.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Costo de bcrypt (log2 de iteraciones). Al cambiarlo, los hashes se actualizan en el siguiente login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Hilos dedicados a bcrypt por proceso
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+# Operaciones en espera (además de las en curso) antes de rechazar
+HASH_COLA_MAX = int(os.getenv("HASH_COLA_MAX", "64"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+@lru_cache(maxsize=1)
+def _hash_ficticio() -> str:
+    # Hash con el que se compara cuando el usuario no existe, para que la respuesta
+    # tarde lo mismo y no revele qué usernames están registrados
+    return pwd_context.hash("contraseña-inexistente")
+
+
+class HashSaturadoError(Exception):
+    """La cola de hashing está llena"""
+
+
+class ServicioHash:
+    """Pool acotado para bcrypt"""
+
+    def __init__(self, workers: int = HASH_WORKERS, cola_max: int = HASH_COLA_MAX):
+        self.workers = workers
+        self.cola_max = cola_max
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+        self._cupos = threading.BoundedSemaphore(workers + cola_max)
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._verificaciones = 0
+        self._hashes = 0
+        self._rehashes = 0
+        self._rechazos = 0
+
+    def _enviar(self, funcion, *args):
+        if not self._cupos.acquire(blocking=False):
+            with self._lock:
+                self._rechazos += 1
+            raise HashSaturadoError("Demasiadas operaciones de contraseña en curso")
+        with self._lock:
+            self._pendientes += 1
+
+        def ejecutar():
+            try:
+                return funcion(*args)
+            finally:
+                with self._lock:
+                    self._pendientes -= 1
+                self._cupos.release()
+
+        return self._pool.submit(ejecutar)
+
+    @staticmethod
+    def _verificar(password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        if not password_hash:
+            pwd_context.verify(password, _hash_ficticio())
+            return False, None
+        return pwd_context.verify_and_update(password, password_hash)
+
+    # ---------- API async (endpoints) ----------
+
+    async def verificar(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        Verificar una contraseña sin bloquear el event loop.
+
+        Returns:
+            (valida, nuevo_hash): nuevo_hash no es None si el hash usa un costo
+            distinto de BCRYPT_ROUNDS y debe reemplazarse
+        """
+        with self._lock:
+            self._verificaciones += 1
+        valida, nuevo_hash = await asyncio.wrap_future(self._enviar(self._verificar, password, password_hash))
+        if nuevo_hash is not None:
+            with self._lock:
+                self._rehashes += 1
+        return valida, nuevo_hash
+
+    async def hashear(self, password: str) -> str:
+        """Generar un hash sin bloquear el event loop"""
+        with self._lock:
+            self._hashes += 1
+        return await asyncio.wrap_future(self._enviar(pwd_context.hash, password))
+
+    # ---------- API sync (endpoints def y scripts) ----------
+
+    def hashear_sync(self, password: str) -> str:
+        """Generar un hash desde código síncrono, respetando el límite del pool"""
+        with self._lock:
+            self._hashes += 1
+        return self._enviar(pwd_context.hash, password).result()
+
+    def verificar_sync(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Verificar una contraseña desde código síncrono, respetando el límite del pool"""
+        with self._lock:
+            self._verificaciones += 1
+        return self._enviar(self._verificar, password, password_hash).result()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores para monitoreo"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "cola_max": self.cola_max,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "pendientes": self._pendientes,
+                "verificaciones": self._verificaciones,
+                "hashes": self._hashes,
+                "rehashes": self._rehashes,
+                "rechazos": self._rechazos,
+            }
+
+
+# Instancia compartida por la aplicación
+servicio_hash = ServicioHash()
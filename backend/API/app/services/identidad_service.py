@@ -0,0 +1,133 @@
+"""
+Caché de identidades para la autenticación.
+
+Cada petición autenticada necesita saber quién es el usuario (id, rol, si está
+activo), pero casi nunca la fila completa. Esta caché LRU con TTL, indexada por
+el `sub` del token, evita el SELECT de usuario en la mayoría de las peticiones.
+Las entradas se invalidan al actualizar o eliminar un Usuario mediante el ORM
+(eventos after_update/after_delete) y, en otros procesos, vencen por TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import event, inspect
+
+from ..models import Usuario
+
+# Segundos que una identidad puede servirse sin volver a la base de datos
+IDENTIDAD_CACHE_TTL_SEGUNDOS = float(os.getenv("IDENTIDAD_CACHE_TTL_SEGUNDOS", "30"))
+# Máximo de identidades en memoria por proceso
+IDENTIDAD_CACHE_MAX = int(os.getenv("IDENTIDAD_CACHE_MAX", "10000"))
+# Confiar en los claims uid/rol del token sin consultar (la desactivación aplica al expirar el token)
+IDENTIDAD_TOKEN_STATELESS = os.getenv("IDENTIDAD_TOKEN_STATELESS", "false").lower() in ("1", "true", "si", "yes")
+
+
+@dataclass(frozen=True)
+class Identidad:
+    """Datos del usuario autenticado que usan los endpoints"""
+    id: UUID
+    username: str
+    activo: bool
+    rol: str
+    email: Optional[str] = None
+
+    @classmethod
+    def desde_usuario(cls, usuario: Usuario) -> "Identidad":
+        return cls(
+            id=usuario.id,
+            username=usuario.username,
+            activo=bool(usuario.activo),
+            rol=usuario.rol or "user",
+            email=usuario.email,
+        )
+
+
+class CacheIdentidades:
+    """LRU acotada con expiración por entrada"""
+
+    def __init__(self, ttl: float = IDENTIDAD_CACHE_TTL_SEGUNDOS, maximo: int = IDENTIDAD_CACHE_MAX):
+        self.ttl = ttl
+        self.maximo = maximo
+        # username -> (identidad, vence_en)
+        self._entradas: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expiradas = 0
+        self._invalidaciones = 0
+        self._descartadas = 0
+
+    def obtener(self, username: str) -> Optional[Identidad]:
+        """Identidad vigente o None si no está o venció"""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(username)
+            if entrada is None:
+                self._misses += 1
+                return None
+            identidad, vence_en = entrada
+            if vence_en <= ahora:
+                del self._entradas[username]
+                self._expiradas += 1
+                self._misses += 1
+                return None
+            self._entradas.move_to_end(username)
+            self._hits += 1
+            return identidad
+
+    def guardar(self, identidad: Identidad) -> None:
+        with self._lock:
+            self._entradas[identidad.username] = (identidad, time.monotonic() + self.ttl)
+            self._entradas.move_to_end(identidad.username)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+                self._descartadas += 1
+
+    def invalidar(self, username: str) -> None:
+        with self._lock:
+            if self._entradas.pop(username, None) is not None:
+                self._invalidaciones += 1
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores para monitoreo"""
+        with self._lock:
+            consultas = self._hits + self._misses
+            return {
+                "entradas": len(self._entradas),
+                "maximo": self.maximo,
+                "ttl_segundos": self.ttl,
+                "stateless": IDENTIDAD_TOKEN_STATELESS,
+                "hits": self._hits,
+                "misses": self._misses,
+                "tasa_hits": self._hits / consultas if consultas else None,
+                "expiradas": self._expiradas,
+                "invalidaciones": self._invalidaciones,
+                "descartadas": self._descartadas,
+            }
+
+
+# Instancia compartida por la aplicación
+cache_identidades = CacheIdentidades()
+
+
+@event.listens_for(Usuario, "after_update")
+def _invalidar_al_actualizar(mapper, connection, usuario: Usuario) -> None:
+    # Si cambió el username también se invalida el anterior
+    historial = inspect(usuario).attrs.username.history
+    for username in list(historial.deleted or []) + [usuario.username]:
+        if username:
+            cache_identidades.invalidar(username)
+
+
+@event.listens_for(Usuario, "after_delete")
+def _invalidar_al_eliminar(mapper, connection, usuario: Usuario) -> None:
+    cache_identidades.invalidar(usuario.username)
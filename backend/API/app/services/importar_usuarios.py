@@ -0,0 +1,380 @@
+"""
+Importación masiva de usuarios desde CSV o JSONL.
+
+Lee el archivo en streaming y lo procesa por lotes: valida cada fila con las
+mismas reglas que /register (UsuarioCreate, complejidad de contraseña y RUT y
+teléfono con validar_ruts/validar_telefonos), detecta duplicados dentro del
+archivo y contra la base con una sola consulta por lote, calcula los hashes
+bcrypt en un pool de procesos y carga las filas válidas con COPY en una tabla
+temporal desde la que se insertan en usuarios con un INSERT ... SELECT. Cada
+lote es una transacción.
+
+Las filas con errores no detienen la importación: se escriben en un archivo
+JSONL ({"linea": n, "errores": {campo: mensaje}}) y se siguen procesando las
+demás.
+
+Columnas: email, username, password y opcionales nombre, apellido, rut,
+telefono y metadata (objeto JSON; en CSV como texto JSON).
+
+Uso (desde backend/API):
+    python -m app.services.importar_usuarios alumnos.csv
+    python -m app.services.importar_usuarios alumnos.jsonl --lote 2000 --procesos 8
+    python -m app.services.importar_usuarios alumnos.csv --simular
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from ..database import engine
+from ..schemas import UsuarioCreate
+from ..validators import validar_complejidad_password, validar_ruts, validar_telefonos
+from .hash_service import pwd_context
+
+CAMPOS_OPCIONALES = ("nombre", "apellido", "rut", "telefono")
+# Largo de las columnas de usuarios (un valor más largo haría fallar el COPY de todo el lote)
+LARGOS_MAXIMOS = {"email": 255, "username": 100, "nombre": 100, "apellido": 100, "rut": 12, "telefono": 20}
+# Campos únicos en usuarios
+CAMPOS_UNICOS = ("email", "username", "rut")
+MENSAJES_DUPLICADO = {"email": "Email ya registrado", "username": "Username ya registrado", "rut": "RUT ya registrado"}
+
+COLUMNAS_STAGING = ("linea", "email", "username", "password_hash", "nombre", "apellido", "rut", "telefono", "metadata")
+
+SQL_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS usuarios_importacion (
+    linea INTEGER NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    username VARCHAR(100) NOT NULL,
+    password_hash VARCHAR(255) NOT NULL,
+    nombre VARCHAR(100),
+    apellido VARCHAR(100),
+    rut VARCHAR(12),
+    telefono VARCHAR(20),
+    metadata JSONB
+) ON COMMIT DELETE ROWS
+"""
+
+# ON CONFLICT DO NOTHING: si alguien se registró entre la verificación y el insert,
+# esa fila se reporta como error en vez de abortar el lote
+SQL_MERGE = """
+INSERT INTO usuarios (email, username, password_hash, nombre, apellido, rut, telefono, metadata)
+SELECT email, username, password_hash, nombre, apellido, rut, telefono, COALESCE(metadata, '{}'::jsonb)
+FROM usuarios_importacion
+ON CONFLICT DO NOTHING
+RETURNING email
+"""
+
+SQL_EXISTENTES = """
+SELECT email, username, rut FROM usuarios
+WHERE email = ANY(CAST(:emails AS text[]))
+   OR username = ANY(CAST(:usernames AS text[]))
+   OR rut = ANY(CAST(:ruts AS text[]))
+"""
+
+
+@dataclass
+class Fila:
+    linea: int
+    datos: Dict[str, Any] = field(default_factory=dict)
+    errores: Dict[str, str] = field(default_factory=dict)
+    password_hash: Optional[str] = None
+
+
+# ==================== LECTURA ====================
+
+def leer_filas(ruta: str, formato: str) -> Iterator[Fila]:
+    """Filas del archivo sin cargarlo completo; las que no se pueden leer vienen con error"""
+    with open(ruta, "r", encoding="utf-8-sig", newline="") as archivo:
+        if formato == "csv":
+            lector = csv.DictReader(archivo)
+            for registro in lector:
+                fila = Fila(lector.line_num)
+                if None in registro:
+                    fila.errores["archivo"] = "La fila tiene más columnas que el encabezado"
+                else:
+                    fila.datos = registro
+                    if registro.get("metadata"):
+                        try:
+                            fila.datos["metadata"] = json.loads(registro["metadata"])
+                        except ValueError:
+                            fila.errores["metadata"] = "metadata no es JSON válido"
+                yield fila
+        else:
+            for linea, texto in enumerate(archivo, start=1):
+                if not texto.strip():
+                    continue
+                fila = Fila(linea)
+                try:
+                    datos = json.loads(texto)
+                except ValueError:
+                    fila.errores["archivo"] = "Línea JSON inválida"
+                else:
+                    if isinstance(datos, dict):
+                        fila.datos = datos
+                    else:
+                        fila.errores["archivo"] = "Cada línea debe ser un objeto JSON"
+                yield fila
+
+
+# ==================== HASHING ====================
+
+def _hashear_lote(passwords: List[str]) -> List[str]:
+    """Ejecutado en el proceso hijo"""
+    return [pwd_context.hash(password) for password in passwords]
+
+
+class HasheadorLotes:
+    """bcrypt repartido entre procesos (0 procesos = en este proceso)"""
+
+    def __init__(self, procesos: int):
+        self.procesos = procesos
+        self._pool: Optional[ProcessPoolExecutor] = None
+        if procesos > 0:
+            # spawn, igual que el motor de PDFs
+            self._pool = ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+
+    def hashear(self, passwords: List[str]) -> List[str]:
+        if self._pool is None or len(passwords) < 2:
+            return _hashear_lote(passwords)
+        # Pocas tareas por proceso: cada hash cuesta ~100 ms, el envío entre procesos es despreciable
+        tamano = max(1, -(-len(passwords) // (self.procesos * 4)))
+        partes = [passwords[i:i + tamano] for i in range(0, len(passwords), tamano)]
+        return list(itertools.chain.from_iterable(self._pool.map(_hashear_lote, partes)))
+
+    def cerrar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+# ==================== VALIDACIÓN ====================
+
+def _validar_esquema(fila: Fila) -> None:
+    """Mismas reglas que /register: strings vacíos opcionales a None, UsuarioCreate y complejidad de contraseña"""
+    # La contraseña se usa tal cual, como en /register
+    datos = {k: v.strip() if isinstance(v, str) and k != "password" else v
+             for k, v in fila.datos.items() if k is not None}
+    for campo in CAMPOS_OPCIONALES:
+        if datos.get(campo) == "":
+            datos[campo] = None
+    if datos.get("metadata") in ("", None):
+        datos.pop("metadata", None)
+    try:
+        usuario = UsuarioCreate.model_validate(datos)
+    except ValidationError as e:
+        for error in e.errors():
+            campo = str(error["loc"][0]) if error["loc"] else "archivo"
+            fila.errores.setdefault(campo, error["msg"])
+        return
+    fila.datos = usuario.model_dump()
+    if not usuario.username:
+        # En el COPY un string vacío se lee como NULL
+        fila.errores["username"] = "Username no puede estar vacío"
+    es_valido, mensaje = validar_complejidad_password(usuario.password)
+    if not es_valido:
+        fila.errores["password"] = mensaje
+
+
+def _validar_largos(fila: Fila) -> None:
+    for campo, maximo in LARGOS_MAXIMOS.items():
+        valor = fila.datos.get(campo)
+        if isinstance(valor, str) and len(valor) > maximo and campo not in fila.errores:
+            fila.errores[campo] = f"Máximo {maximo} caracteres"
+
+
+def validar_lote(filas: List[Fila]) -> None:
+    """Esquema y contraseña por fila; RUT y teléfono por lote (normalizados si son válidos)"""
+    for fila in filas:
+        if not fila.errores:
+            _validar_esquema(fila)
+
+    for campo, validar in (("rut", validar_ruts), ("telefono", validar_telefonos)):
+        con_valor = [f for f in filas if not f.errores and f.datos.get(campo) is not None]
+        resultado = validar([f.datos[campo] for f in con_valor])
+        for fila, valido, valor in zip(con_valor, resultado.validos, resultado.valores):
+            if valido:
+                fila.datos[campo] = valor
+            else:
+                fila.errores[campo] = valor
+
+    for fila in filas:
+        if not fila.errores:
+            _validar_largos(fila)
+
+
+# ==================== IMPORTACIÓN ====================
+
+class Importador:
+    """Procesa los lotes de un archivo sobre una conexión"""
+
+    def __init__(self, conexion, hasheador: Optional[HasheadorLotes], simular: bool = False):
+        self.conexion = conexion
+        self.hasheador = hasheador
+        self.simular = simular
+        # Valores únicos ya vistos en el archivo -> línea donde aparecieron
+        self.vistos: Dict[str, Dict[str, int]] = {campo: {} for campo in CAMPOS_UNICOS}
+        if not simular:
+            # Confirmada aparte para que un rollback de lote no la elimine
+            self.conexion.execute(text(SQL_STAGING))
+            self.conexion.commit()
+
+    def _duplicados_en_archivo(self, filas: List[Fila]) -> None:
+        for fila in filas:
+            if fila.errores:
+                continue
+            for campo in CAMPOS_UNICOS:
+                valor = fila.datos.get(campo)
+                if valor is None:
+                    continue
+                linea = self.vistos[campo].get(valor)
+                if linea is not None:
+                    fila.errores[campo] = f"Repetido en el archivo (línea {linea})"
+            if not fila.errores:
+                for campo in CAMPOS_UNICOS:
+                    if fila.datos.get(campo) is not None:
+                        self.vistos[campo][fila.datos[campo]] = fila.linea
+
+    def _existentes_en_base(self, filas: List[Fila]) -> None:
+        """Una consulta para todo el lote"""
+        candidatas = [f for f in filas if not f.errores]
+        if not candidatas:
+            return
+        valores = {campo: [f.datos[campo] for f in candidatas if f.datos.get(campo) is not None]
+                   for campo in CAMPOS_UNICOS}
+        existentes = {campo: set() for campo in CAMPOS_UNICOS}
+        for registro in self.conexion.execute(text(SQL_EXISTENTES), {
+            "emails": valores["email"], "usernames": valores["username"], "ruts": valores["rut"]
+        }):
+            for campo in CAMPOS_UNICOS:
+                existentes[campo].add(getattr(registro, campo))
+        for fila in candidatas:
+            for campo in CAMPOS_UNICOS:
+                if fila.datos.get(campo) is not None and fila.datos[campo] in existentes[campo]:
+                    fila.errores[campo] = MENSAJES_DUPLICADO[campo]
+
+    def _cargar(self, filas: List[Fila]) -> int:
+        """COPY a la tabla temporal e INSERT en usuarios; retorna las filas insertadas"""
+        salida = io.StringIO()
+        escritor = csv.writer(salida, lineterminator="\n")
+        for fila in filas:
+            datos = fila.datos
+            escritor.writerow((
+                fila.linea, datos["email"], datos["username"], fila.password_hash, datos.get("nombre"),
+                datos.get("apellido"), datos.get("rut"), datos.get("telefono"),
+                json.dumps(datos.get("metadata") or {}, ensure_ascii=False),
+            ))
+        salida.seek(0)
+        cursor = self.conexion.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY usuarios_importacion ({', '.join(COLUMNAS_STAGING)}) FROM STDIN WITH (FORMAT csv)", salida
+            )
+        finally:
+            cursor.close()
+        insertados = {registro.email for registro in self.conexion.execute(text(SQL_MERGE))}
+        for fila in filas:
+            if fila.datos["email"] not in insertados:
+                fila.errores["archivo"] = "Conflicto con un usuario registrado durante la importación"
+        return len(insertados)
+
+    def procesar(self, filas: List[Fila]) -> int:
+        """Validar e insertar un lote; los errores quedan en cada fila. Retorna las filas importadas."""
+        validar_lote(filas)
+        self._duplicados_en_archivo(filas)
+        self._existentes_en_base(filas)
+        validas = [f for f in filas if not f.errores]
+        if self.simular or not validas:
+            self.conexion.rollback()
+            return len(validas) if self.simular else 0
+
+        for fila, password_hash in zip(validas, self.hasheador.hashear([f.datos["password"] for f in validas])):
+            fila.password_hash = password_hash
+        try:
+            importadas = self._cargar(validas)
+            self.conexion.commit()
+        except Exception:
+            self.conexion.rollback()
+            raise
+        return importadas
+
+
+def importar(args: argparse.Namespace) -> int:
+    """Ejecutar la importación; retorna la cantidad de filas con errores"""
+    formato = args.formato or ("jsonl" if args.archivo.endswith((".jsonl", ".ndjson")) else "csv")
+    ruta_errores = args.errores or f"{args.archivo}.errores.jsonl"
+    hasheador = None if args.simular else HasheadorLotes(args.procesos)
+    leidas = importadas = con_errores = 0
+    inicio = time.perf_counter()
+    try:
+        with engine.connect() as conexion, open(ruta_errores, "w", encoding="utf-8") as archivo_errores:
+            importador = Importador(conexion, hasheador, simular=args.simular)
+            filas = leer_filas(args.archivo, formato)
+            while True:
+                lote = list(itertools.islice(filas, args.lote))
+                if not lote:
+                    break
+                importadas += importador.procesar(lote)
+                leidas += len(lote)
+                for fila in lote:
+                    if fila.errores:
+                        con_errores += 1
+                        archivo_errores.write(json.dumps({"linea": fila.linea, "errores": fila.errores},
+                                                         ensure_ascii=False) + "\n")
+                transcurrido = time.perf_counter() - inicio
+                print(f"{leidas} filas | {importadas} {'válidas' if args.simular else 'importadas'} | "
+                      f"{con_errores} con errores | {leidas / transcurrido:.1f} filas/s | "
+                      f"{timedelta(seconds=int(transcurrido))}", flush=True)
+    finally:
+        if hasheador is not None:
+            hasheador.cerrar()
+
+    verbo = "válidas (simulación, nada insertado)" if args.simular else "importadas"
+    print(f"Terminado: {leidas} filas, {importadas} {verbo}, {con_errores} con errores")
+    if con_errores:
+        print(f"Errores por fila en {ruta_errores}")
+    else:
+        os.remove(ruta_errores)
+    return con_errores
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.importar_usuarios",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("archivo", help="Archivo CSV (con encabezado) o JSONL")
+    parser.add_argument("--formato", choices=("csv", "jsonl"), help="Por defecto según la extensión")
+    parser.add_argument("--lote", type=int, default=1000, help="Filas por consulta de unicidad, COPY y commit")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1,
+                        help="Procesos para bcrypt (0 = en este proceso)")
+    parser.add_argument("--errores", help="Archivo JSONL de errores (por defecto <archivo>.errores.jsonl)")
+    parser.add_argument("--simular", action="store_true",
+                        help="Validar y verificar unicidad sin calcular hashes ni insertar")
+    args = parser.parse_args(argv)
+
+    try:
+        con_errores = importar(args)
+    except OperationalError as e:
+        print(f"PostgreSQL no disponible: {e.orig}", file=sys.stderr)
+        sys.exit(2)
+    except KeyboardInterrupt:
+        print("\nInterrumpido; los lotes ya confirmados quedan importados", file=sys.stderr)
+        sys.exit(130)
+    sys.exit(1 if con_errores else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Límite de intentos para login y registro.
+
+Cada intento de /token paga una verificación bcrypt completa, así que una ráfaga
+de logins fallidos puede ocupar todos los núcleos. Este módulo implementa una
+ventana deslizante aproximada (contador de la ventana actual + contador de la
+anterior ponderado por el solapamiento): O(1) por intento y dos enteros por
+clave. Las claves se guardan en memoria en una LRU acotada o, si se configura
+LIMITE_SQLITE_PATH, en un archivo SQLite local que comparten todos los workers
+de uvicorn del mismo nodo.
+
+Los límites se expresan como "<intentos>/<segundos>", por ejemplo "5/60".
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+def _leer_regla(nombre: str, valor_defecto: str) -> Tuple[int, float]:
+    valor = os.getenv(nombre, valor_defecto)
+    try:
+        limite, ventana = valor.split("/", 1)
+        return int(limite), float(ventana)
+    except ValueError:
+        raise ValueError(f"{nombre} debe tener el formato <intentos>/<segundos>, recibido: {valor!r}")
+
+
+# Intentos de login por username (los exitosos reinician el contador)
+LIMITE_LOGIN_USUARIO = _leer_regla("LIMITE_LOGIN_USUARIO", "5/60")
+# Intentos de login por IP, sin importar el username
+LIMITE_LOGIN_IP = _leer_regla("LIMITE_LOGIN_IP", "30/60")
+# Registros por IP
+LIMITE_REGISTRO_IP = _leer_regla("LIMITE_REGISTRO_IP", "10/3600")
+# Archivo SQLite compartido entre workers; vacío = contadores en memoria por proceso
+LIMITE_SQLITE_PATH = os.getenv("LIMITE_SQLITE_PATH", "")
+# Máximo de claves en memoria (se descartan las menos recientes)
+LIMITE_MAX_CLAVES = int(os.getenv("LIMITE_MAX_CLAVES", "100000"))
+# Tomar la IP del cliente desde X-Forwarded-For (solo detrás de un proxy de confianza)
+LIMITE_CONFIAR_PROXY = os.getenv("LIMITE_CONFIAR_PROXY", "false").lower() in ("1", "true", "si", "yes")
+
+# Largo máximo de la parte variable de una clave (username o IP)
+_LARGO_MAX_VALOR = 150
+
+
+@dataclass(frozen=True)
+class Regla:
+    """Límite de intentos para un tipo de clave"""
+    nombre: str
+    limite: int
+    ventana: float
+
+
+REGLA_LOGIN_USUARIO = Regla("login:usuario", *LIMITE_LOGIN_USUARIO)
+REGLA_LOGIN_IP = Regla("login:ip", *LIMITE_LOGIN_IP)
+REGLA_REGISTRO_IP = Regla("registro:ip", *LIMITE_REGISTRO_IP)
+
+
+class LimiteExcedidoError(Exception):
+    """Se superó el límite de intentos"""
+
+    def __init__(self, regla: Regla, reintentar_en: int):
+        super().__init__(f"Límite {regla.nombre} excedido")
+        self.regla = regla
+        self.reintentar_en = reintentar_en
+
+
+def _consumir(estado: Optional[Tuple[float, int, int]], regla: Regla, ahora: float):
+    """
+    Aplicar un intento a la ventana deslizante.
+
+    Args:
+        estado: (inicio_ventana, actual, anterior) o None si la clave es nueva
+
+    Returns:
+        (nuevo_estado, espera): espera es None si el intento se permite; si no,
+        segundos hasta que la ventana vuelva a tener cupo (el estado no cambia)
+    """
+    ventana = regla.ventana
+    # Las ventanas están alineadas a múltiplos de su duración
+    inicio_actual = ahora - (ahora % ventana)
+    if estado is None:
+        inicio, actual, anterior = inicio_actual, 0, 0
+    else:
+        inicio, actual, anterior = estado
+        if inicio_actual - inicio >= 2 * ventana:
+            inicio, actual, anterior = inicio_actual, 0, 0
+        elif inicio_actual > inicio:
+            inicio, actual, anterior = inicio_actual, 0, actual
+
+    peso_anterior = 1 - (ahora - inicio) / ventana
+    estimado = anterior * peso_anterior + actual
+    if estimado + 1 <= regla.limite:
+        return (inicio, actual + 1, anterior), None
+
+    if actual + 1 > regla.limite:
+        # Ni siquiera sin la ventana anterior hay cupo: esperar a que esta termine
+        espera = inicio + ventana - ahora
+    else:
+        # Esperar a que el aporte de la ventana anterior baje lo suficiente
+        espera = ventana * (1 - (regla.limite - actual - 1) / anterior) - (ahora - inicio)
+    return (inicio, actual, anterior), max(1, math.ceil(espera))
+
+
+class AlmacenMemoria:
+    """Contadores en una LRU acotada del proceso"""
+
+    def __init__(self, maximo: int = LIMITE_MAX_CLAVES):
+        self.maximo = maximo
+        self._entradas: "OrderedDict[str, Tuple[float, int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.descartadas = 0
+
+    def consumir(self, clave: str, regla: Regla, ahora: float) -> Optional[float]:
+        with self._lock:
+            estado, espera = _consumir(self._entradas.get(clave), regla, ahora)
+            self._entradas[clave] = estado
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+                self.descartadas += 1
+            return espera
+
+    def reiniciar(self, clave: str) -> None:
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def claves(self) -> int:
+        with self._lock:
+            return len(self._entradas)
+
+
+class AlmacenSQLite:
+    """Contadores en un archivo SQLite local compartido por los procesos del nodo"""
+
+    # Intentos entre limpiezas de claves vencidas
+    LIMPIAR_CADA = 1000
+
+    def __init__(self, ruta: str, ventana_max: float):
+        self.ruta = ruta
+        self.ventana_max = ventana_max
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._operaciones = 0
+        with self._conexion() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS limites ("
+                " clave TEXT PRIMARY KEY, inicio REAL NOT NULL,"
+                " actual INTEGER NOT NULL, anterior INTEGER NOT NULL)"
+            )
+
+    def _conexion(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: las transacciones se abren explícitamente
+            conn = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def consumir(self, clave: str, regla: Regla, ahora: float) -> Optional[float]:
+        conn = self._conexion()
+        # BEGIN IMMEDIATE toma el lock de escritura: leer y actualizar es atómico entre procesos
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fila = conn.execute(
+                "SELECT inicio, actual, anterior FROM limites WHERE clave = ?", (clave,)
+            ).fetchone()
+            estado, espera = _consumir(fila, regla, ahora)
+            if espera is None:
+                conn.execute(
+                    "INSERT INTO limites (clave, inicio, actual, anterior) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(clave) DO UPDATE SET inicio = excluded.inicio,"
+                    " actual = excluded.actual, anterior = excluded.anterior",
+                    (clave, *estado),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._limpiar_si_corresponde(conn, ahora)
+        return espera
+
+    def _limpiar_si_corresponde(self, conn: sqlite3.Connection, ahora: float) -> None:
+        with self._lock:
+            self._operaciones += 1
+            if self._operaciones % self.LIMPIAR_CADA:
+                return
+        # Una clave sin intentos en dos ventanas ya no aporta al conteo
+        conn.execute("DELETE FROM limites WHERE inicio < ?", (ahora - 2 * self.ventana_max,))
+
+    def reiniciar(self, clave: str) -> None:
+        self._conexion().execute("DELETE FROM limites WHERE clave = ?", (clave,))
+
+    def claves(self) -> int:
+        return self._conexion().execute("SELECT count(*) FROM limites").fetchone()[0]
+
+
+class LimitadorIntentos:
+    """Punto de entrada: verifica reglas y lleva contadores para monitoreo"""
+
+    def __init__(self, almacen):
+        self.almacen = almacen
+        self._lock = threading.Lock()
+        self._permitidos: Dict[str, int] = {}
+        self._rechazados: Dict[str, int] = {}
+
+    @staticmethod
+    def _clave(regla: Regla, valor: str) -> str:
+        return f"{regla.nombre}:{valor.strip().lower()[:_LARGO_MAX_VALOR]}"
+
+    def verificar(self, regla: Regla, valor: str) -> None:
+        """
+        Registrar un intento para la clave; lanza LimiteExcedidoError si no hay cupo.
+        Los intentos rechazados no cuentan.
+        """
+        espera = self.almacen.consumir(self._clave(regla, valor), regla, time.time())
+        contadores = self._permitidos if espera is None else self._rechazados
+        with self._lock:
+            contadores[regla.nombre] = contadores.get(regla.nombre, 0) + 1
+        if espera is not None:
+            raise LimiteExcedidoError(regla, int(espera))
+
+    def reiniciar(self, regla: Regla, valor: str) -> None:
+        """Olvidar los intentos de una clave (por ejemplo, tras un login exitoso)"""
+        self.almacen.reiniciar(self._clave(regla, valor))
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores para monitoreo"""
+        with self._lock:
+            permitidos = dict(self._permitidos)
+            rechazados = dict(self._rechazados)
+        return {
+            "almacen": "sqlite" if isinstance(self.almacen, AlmacenSQLite) else "memoria",
+            "claves": self.almacen.claves(),
+            "reglas": {
+                r.nombre: {"limite": r.limite, "ventana_segundos": r.ventana}
+                for r in (REGLA_LOGIN_USUARIO, REGLA_LOGIN_IP, REGLA_REGISTRO_IP)
+            },
+            "permitidos": permitidos,
+            "rechazados": rechazados,
+        }
+
+
+def ip_cliente(request) -> str:
+    """IP del cliente de una petición de Starlette"""
+    if LIMITE_CONFIAR_PROXY:
+        reenviada = request.headers.get("x-forwarded-for")
+        if reenviada:
+            return reenviada.split(",")[0].strip()
+    return request.client.host if request.client else "desconocida"
+
+
+def _crear_limitador() -> LimitadorIntentos:
+    if LIMITE_SQLITE_PATH:
+        ventana_max = max(r.ventana for r in (REGLA_LOGIN_USUARIO, REGLA_LOGIN_IP, REGLA_REGISTRO_IP))
+        return LimitadorIntentos(AlmacenSQLite(LIMITE_SQLITE_PATH, ventana_max))
+    return LimitadorIntentos(AlmacenMemoria())
+
+
+# Instancia compartida por la aplicación
+limitador_intentos = _crear_limitador()
@@ -0,0 +1,367 @@
+"""
+Instrumentación de la base de datos: consultas, tiempo en la base y espera del pool.
+
+Los eventos de SQLAlchemy (registrados para todos los engines al importar este
+módulo) miden cada sentencia; los pools instrumentados miden cuánto tarda en
+conseguirse una conexión. Cada petición HTTP acumula sus propios números en un
+ContextVar que fija MiddlewareMetricasDB, y al terminar se suman a los totales
+por ruta. Las sentencias lentas se guardan normalizadas (sin literales ni
+parámetros), así las variantes de una misma consulta se agrupan.
+
+Los totales se exponen en /metrics (vía metricas_service) y el
+detalle de sentencias lentas en /admin/db/estado. Con DB_METRICAS_HEADERS las
+respuestas incluyen los números de la petición como headers.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.datastructures import MutableHeaders
+
+from .metricas_service import Familia, registro_metricas
+
+logger = logging.getLogger(__name__)
+
+# Sentencias que tardan al menos esto se registran como lentas
+DB_CONSULTA_LENTA_MS = float(os.getenv("DB_CONSULTA_LENTA_MS", "100"))
+# Sentencias lentas distintas (ya normalizadas) que se conservan por proceso
+DB_CONSULTAS_LENTAS_MAX = int(os.getenv("DB_CONSULTAS_LENTAS_MAX", "200"))
+# Agregar X-DB-Query-Count, X-DB-Time-Ms y X-DB-Pool-Wait-Ms a las respuestas (solo para depurar)
+DB_METRICAS_HEADERS = os.getenv("DB_METRICAS_HEADERS", "false").lower() in ("1", "true", "si", "yes")
+# Si se define, /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+@dataclass
+class MedicionPeticion:
+    """Lo que una petición gastó en la base de datos"""
+    consultas: int = 0
+    segundos_db: float = 0.0
+    espera_pool: float = 0.0
+    # URL de la petición, para anotar las sentencias lentas
+    ruta: Optional[str] = None
+
+
+# Medición de la petición en curso; los hilos del threadpool y run_sync heredan el contexto
+_medicion_actual: ContextVar[Optional[MedicionPeticion]] = ContextVar("medicion_db", default=None)
+
+
+# ==================== NORMALIZACIÓN DE SQL ====================
+
+_RE_CADENA = re.compile(r"'(?:[^']|'')*'")
+_RE_PARAMETRO = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_RE_NUMERO = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTA = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_RE_FILAS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def normalizar_sql(sql: str) -> str:
+    """Reemplazar literales y parámetros por ? y colapsar listas IN / VALUES de largo variable"""
+    sql = _RE_CADENA.sub("?", sql)
+    sql = _RE_PARAMETRO.sub("?", sql)
+    sql = _RE_NUMERO.sub("?", sql)
+    sql = _RE_LISTA.sub("(...)", sql)
+    sql = _RE_FILAS.sub("(...), ...", sql)
+    return _RE_ESPACIOS.sub(" ", sql).strip()[:1000]
+
+
+# ==================== ACUMULADORES ====================
+
+class _EstadisticaPool:
+    __slots__ = ("checkouts", "espera_total", "espera_max", "timeouts")
+
+    def __init__(self):
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.timeouts = 0
+
+
+class _EstadisticaRuta:
+    __slots__ = ("peticiones", "consultas", "consultas_max", "segundos_db", "espera_pool")
+
+    def __init__(self):
+        self.peticiones = 0
+        self.consultas = 0
+        self.consultas_max = 0
+        self.segundos_db = 0.0
+        self.espera_pool = 0.0
+
+
+class _SentenciaLenta:
+    __slots__ = ("veces", "segundos_total", "segundos_max", "ultima_ruta")
+
+    def __init__(self):
+        self.veces = 0
+        self.segundos_total = 0.0
+        self.segundos_max = 0.0
+        self.ultima_ruta: Optional[str] = None
+
+
+class MetricasDB:
+    """Totales por proceso de consultas, pools y rutas"""
+
+    def __init__(self, umbral_lenta_ms: float = DB_CONSULTA_LENTA_MS, maximo_lentas: int = DB_CONSULTAS_LENTAS_MAX):
+        self.umbral_lenta = umbral_lenta_ms / 1000
+        self.maximo_lentas = maximo_lentas
+        self._lock = threading.Lock()
+        self._engines: Dict[str, Engine] = {}
+        self._pools: Dict[str, _EstadisticaPool] = {}
+        self._rutas: Dict[Tuple[str, str], _EstadisticaRuta] = {}
+        # sql normalizado -> estadística (LRU acotada)
+        self._lentas: "OrderedDict[str, _SentenciaLenta]" = OrderedDict()
+        self.consultas = 0
+        self.segundos_db = 0.0
+        self.consultas_lentas = 0
+
+    def registrar_engine(self, nombre: str, engine: Engine) -> None:
+        """Incluir el pool del engine en los gauges (tamaño, conexiones en uso, overflow)"""
+        with self._lock:
+            self._engines[nombre] = engine
+
+    def registrar_checkout(self, pool_nombre: str, espera: float, timeout: bool = False) -> None:
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.espera_pool += espera
+        with self._lock:
+            estadistica = self._pools.get(pool_nombre)
+            if estadistica is None:
+                estadistica = self._pools[pool_nombre] = _EstadisticaPool()
+            if timeout:
+                estadistica.timeouts += 1
+                return
+            estadistica.checkouts += 1
+            estadistica.espera_total += espera
+            if espera > estadistica.espera_max:
+                estadistica.espera_max = espera
+
+    def registrar_consulta(self, sql: str, duracion: float) -> None:
+        medicion = _medicion_actual.get()
+        if medicion is not None:
+            medicion.consultas += 1
+            medicion.segundos_db += duracion
+        with self._lock:
+            self.consultas += 1
+            self.segundos_db += duracion
+        if duracion >= self.umbral_lenta:
+            self._registrar_lenta(normalizar_sql(sql), duracion, medicion.ruta if medicion else None)
+
+    def _registrar_lenta(self, sql: str, duracion: float, ruta: Optional[str]) -> None:
+        logger.warning("Consulta lenta (%.1f ms) en %s: %s", duracion * 1e3, ruta or "-", sql[:200])
+        with self._lock:
+            self.consultas_lentas += 1
+            lenta = self._lentas.get(sql)
+            if lenta is None:
+                lenta = self._lentas[sql] = _SentenciaLenta()
+                if len(self._lentas) > self.maximo_lentas:
+                    self._lentas.popitem(last=False)
+            else:
+                self._lentas.move_to_end(sql)
+            lenta.veces += 1
+            lenta.segundos_total += duracion
+            lenta.segundos_max = max(lenta.segundos_max, duracion)
+            lenta.ultima_ruta = ruta
+
+    def registrar_peticion(self, metodo: str, ruta: str, medicion: MedicionPeticion) -> None:
+        with self._lock:
+            estadistica = self._rutas.get((metodo, ruta))
+            if estadistica is None:
+                estadistica = self._rutas[(metodo, ruta)] = _EstadisticaRuta()
+            estadistica.peticiones += 1
+            estadistica.consultas += medicion.consultas
+            estadistica.consultas_max = max(estadistica.consultas_max, medicion.consultas)
+            estadistica.segundos_db += medicion.segundos_db
+            estadistica.espera_pool += medicion.espera_pool
+
+    # ---------- exportación ----------
+
+    def _gauges_pools(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            engines = dict(self._engines)
+        gauges = {}
+        for nombre, engine in engines.items():
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                gauges[nombre] = {"tamano": pool.size(), "en_uso": pool.checkedout(),
+                                  "overflow": max(pool.overflow(), 0), "libres": pool.checkedin()}
+        return gauges
+
+    def estadisticas(self, lentas: int = 20) -> Dict[str, Any]:
+        """Pools, totales, rutas con más consultas y las sentencias lentas más costosas"""
+        gauges = self._gauges_pools()
+        with self._lock:
+            pools = {}
+            for nombre in {**gauges, **self._pools}:
+                e = self._pools.get(nombre) or _EstadisticaPool()
+                pools[nombre] = {
+                    **gauges.get(nombre, {}),
+                    "checkouts": e.checkouts,
+                    "espera_promedio_ms": round(e.espera_total / e.checkouts * 1e3, 3) if e.checkouts else 0.0,
+                    "espera_max_ms": round(e.espera_max * 1e3, 3),
+                    "timeouts": e.timeouts,
+                }
+            rutas = sorted(
+                ({"metodo": m, "ruta": r, "peticiones": e.peticiones,
+                  "consultas_promedio": round(e.consultas / e.peticiones, 2),
+                  "consultas_max": e.consultas_max,
+                  "db_ms_promedio": round(e.segundos_db / e.peticiones * 1e3, 3),
+                  "espera_pool_ms_promedio": round(e.espera_pool / e.peticiones * 1e3, 3)}
+                 for (m, r), e in self._rutas.items()),
+                key=lambda r: r["consultas_promedio"], reverse=True
+            )
+            sentencias = sorted(
+                ({"sql": sql, "veces": s.veces, "total_ms": round(s.segundos_total * 1e3, 1),
+                  "max_ms": round(s.segundos_max * 1e3, 1), "ultima_ruta": s.ultima_ruta}
+                 for sql, s in self._lentas.items()),
+                key=lambda s: s["total_ms"], reverse=True
+            )[:lentas]
+            return {
+                "consultas": self.consultas,
+                "db_segundos": round(self.segundos_db, 6),
+                "umbral_lenta_ms": self.umbral_lenta * 1e3,
+                "consultas_lentas": self.consultas_lentas,
+                "pools": pools,
+                "rutas": rutas,
+                "sentencias_lentas": sentencias,
+            }
+
+    def familias(self) -> List[Familia]:
+        """Totales como familias Prometheus (ver metricas_service)"""
+        gauges = self._gauges_pools()
+        with self._lock:
+            pools = list(self._pools.items())
+            rutas = list(self._rutas.items())
+            totales = (self.consultas, self.segundos_db, self.consultas_lentas)
+
+        def familia(nombre, tipo, ayuda, valores, agregacion="sum"):
+            return Familia(nombre, tipo, ayuda, [("", etiquetas, valor) for etiquetas, valor in valores], agregacion)
+
+        def por_ruta(metodo, ruta):
+            return (("method", metodo), ("route", ruta))
+
+        return [
+            familia("db_pool_size", "gauge", "Conexiones permanentes del pool",
+                    [((("pool", p),), g["tamano"]) for p, g in gauges.items()]),
+            familia("db_pool_checked_out", "gauge", "Conexiones en uso",
+                    [((("pool", p),), g["en_uso"]) for p, g in gauges.items()]),
+            familia("db_pool_overflow", "gauge", "Conexiones abiertas por encima de pool_size",
+                    [((("pool", p),), g["overflow"]) for p, g in gauges.items()]),
+            familia("db_pool_checkouts_total", "counter", "Conexiones entregadas por el pool",
+                    [((("pool", p),), e.checkouts) for p, e in pools]),
+            familia("db_pool_checkout_wait_seconds_total", "counter", "Tiempo esperando una conexión del pool",
+                    [((("pool", p),), e.espera_total) for p, e in pools]),
+            familia("db_pool_checkout_wait_seconds_max", "gauge", "Mayor espera por una conexión",
+                    [((("pool", p),), e.espera_max) for p, e in pools], agregacion="max"),
+            familia("db_pool_timeouts_total", "counter", "Checkouts que agotaron pool_timeout",
+                    [((("pool", p),), e.timeouts) for p, e in pools]),
+            familia("db_queries_total", "counter", "Sentencias SQL ejecutadas", [((), totales[0])]),
+            familia("db_query_seconds_total", "counter", "Tiempo de ejecución de sentencias SQL", [((), totales[1])]),
+            familia("db_slow_queries_total", "counter", f"Sentencias de {self.umbral_lenta * 1e3:g} ms o más",
+                    [((), totales[2])]),
+            familia("db_route_requests_total", "counter", "Peticiones instrumentadas por ruta",
+                    [(por_ruta(m, r), e.peticiones) for (m, r), e in rutas]),
+            familia("db_route_queries_total", "counter", "Sentencias SQL por ruta",
+                    [(por_ruta(m, r), e.consultas) for (m, r), e in rutas]),
+            familia("db_route_query_seconds_total", "counter", "Tiempo en la base de datos por ruta",
+                    [(por_ruta(m, r), e.segundos_db) for (m, r), e in rutas]),
+            familia("db_route_pool_wait_seconds_total", "counter", "Espera del pool por ruta",
+                    [(por_ruta(m, r), e.espera_pool) for (m, r), e in rutas]),
+        ]
+
+
+# Instancia compartida por la aplicación
+metricas_db = MetricasDB()
+registro_metricas.registrar(metricas_db.familias)
+
+
+# ==================== POOLS INSTRUMENTADOS ====================
+
+class _MedirCheckout:
+    """Mide cuánto tarda connect() en entregar una conexión (espera en cola, conexión nueva o pre-ping)"""
+
+    def connect(self):
+        nombre = self.logging_name or "default"
+        inicio = time.perf_counter()
+        try:
+            conexion = super().connect()
+        except exc.TimeoutError:
+            metricas_db.registrar_checkout(nombre, time.perf_counter() - inicio, timeout=True)
+            raise
+        metricas_db.registrar_checkout(nombre, time.perf_counter() - inicio)
+        return conexion
+
+
+class PoolInstrumentado(_MedirCheckout, QueuePool):
+    """QueuePool que registra la espera de cada checkout"""
+
+
+class PoolAsyncInstrumentado(_MedirCheckout, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool que registra la espera de cada checkout"""
+
+
+# ==================== EVENTOS DE SENTENCIAS ====================
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_inicio_sentencias", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info["_inicio_sentencias"].pop()
+    metricas_db.registrar_consulta(statement, time.perf_counter() - inicio)
+
+
+@event.listens_for(Engine, "handle_error")
+def _error_al_ejecutar(contexto):
+    if contexto.connection is not None:
+        inicios = contexto.connection.info.get("_inicio_sentencias")
+        if inicios:
+            metricas_db.registrar_consulta(contexto.statement or "", time.perf_counter() - inicios.pop())
+
+
+# ==================== MIDDLEWARE ====================
+
+class MiddlewareMetricasDB:
+    """Middleware ASGI: abre la medición de cada petición y la suma a su ruta al terminar"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        medicion = MedicionPeticion(ruta=scope["path"])
+        token = _medicion_actual.set(medicion)
+
+        async def enviar(mensaje):
+            if DB_METRICAS_HEADERS and mensaje["type"] == "http.response.start":
+                headers = MutableHeaders(scope=mensaje)
+                headers.append("X-DB-Query-Count", str(medicion.consultas))
+                headers.append("X-DB-Time-Ms", f"{medicion.segundos_db * 1e3:.2f}")
+                headers.append("X-DB-Pool-Wait-Ms", f"{medicion.espera_pool * 1e3:.2f}")
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            _medicion_actual.reset(token)
+            # Plantilla de la ruta (/documentos/{documento_id}), no la URL: cardinalidad acotada
+            ruta = scope.get("route")
+            metricas_db.registrar_peticion(
+                scope["method"], getattr(ruta, "path", "sin_ruta"), medicion
+            )
@@ -0,0 +1,384 @@
+"""
+Métricas de la API en formato Prometheus: latencia por ruta, peticiones en curso
+y contadores de negocio.
+
+MiddlewareMetricasHTTP mide cada petición y la suma al histograma de su
+(método, plantilla de ruta, código de estado). Solo el hilo del event loop
+escribe esos histogramas, así que se actualizan sin lock; los contadores de
+negocio (checkouts, PDFs, logins fallidos) se incrementan también desde hilos
+y usan uno.
+
+Cada worker de uvicorn tiene sus propios números. Con METRICAS_DIR, cada
+worker escribe periódicamente su snapshot en <METRICAS_DIR>/<pid>.json y
+/metrics suma los de todos los workers. Para que los contadores no bajen
+cuando un worker termina o se reinicia (Prometheus lo tomaría como un reinicio
+del contador), sus contadores e histogramas se suman a acumulado.json: al
+detenerse, o cuando otro worker ve que su pid ya no existe. Los gauges de un
+snapshot sin actualizar en 3 intervalos se ignoran.
+"""
+import bisect
+import fcntl
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) de los buckets de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Directorio compartido por los workers para agregar sus métricas (vacío = solo este proceso)
+METRICAS_DIR = os.getenv("METRICAS_DIR", "")
+# Cada cuántos segundos un worker publica su snapshot
+METRICAS_INTERVALO_SEGUNDOS = float(os.getenv("METRICAS_INTERVALO_SEGUNDOS", "5"))
+
+Etiquetas = Tuple[Tuple[str, str], ...]
+
+
+@dataclass
+class Familia:
+    """Una métrica con sus muestras: (sufijo, etiquetas, valor)"""
+    nombre: str
+    tipo: str
+    ayuda: str
+    muestras: List[Tuple[str, Etiquetas, float]] = field(default_factory=list)
+    # Cómo se combinan los workers: "sum" o "max"
+    agregacion: str = "sum"
+
+
+class Contador:
+    """Contador con etiquetas, seguro entre hilos"""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores: str, cantidad: float = 1) -> None:
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def familia(self) -> Familia:
+        with self._lock:
+            valores = list(self._valores.items())
+        return Familia(self.nombre, "counter", self.ayuda, [
+            ("", tuple(zip(self.etiquetas, clave)), valor) for clave, valor in valores
+        ])
+
+
+class _Histograma:
+    __slots__ = ("cuentas", "suma")
+
+    def __init__(self, n_buckets: int):
+        # Una cuenta por bucket más +Inf; se acumulan al exportar
+        self.cuentas = [0] * (n_buckets + 1)
+        self.suma = 0.0
+
+
+class MetricasHTTP:
+    """Histogramas de latencia por (método, ruta, estado) y peticiones en curso"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS_LATENCIA):
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, str, int], _Histograma] = {}
+        self.en_curso = 0
+
+    def observar(self, metodo: str, ruta: str, estado: int, segundos: float) -> None:
+        """Solo desde el event loop: no toma lock"""
+        clave = (metodo, ruta, estado)
+        histograma = self._series.get(clave)
+        if histograma is None:
+            histograma = self._series[clave] = _Histograma(len(self.buckets))
+        histograma.cuentas[bisect.bisect_left(self.buckets, segundos)] += 1
+        histograma.suma += segundos
+
+    def familias(self) -> List[Familia]:
+        latencia = Familia("http_request_duration_seconds", "histogram",
+                           "Duración de las peticiones por ruta y código de estado")
+        peticiones = Familia("http_requests_total", "counter", "Peticiones atendidas por ruta y código de estado")
+        limites = [_numero(b) for b in self.buckets] + ["+Inf"]
+        for (metodo, ruta, estado), histograma in list(self._series.items()):
+            etiquetas = (("method", metodo), ("route", ruta), ("status", str(estado)))
+            acumulado = 0
+            for limite, cuenta in zip(limites, list(histograma.cuentas)):
+                acumulado += cuenta
+                latencia.muestras.append(("_bucket", etiquetas + (("le", limite),), acumulado))
+            latencia.muestras.append(("_sum", etiquetas, histograma.suma))
+            latencia.muestras.append(("_count", etiquetas, acumulado))
+            peticiones.muestras.append(("", etiquetas, acumulado))
+        en_curso = Familia("http_requests_in_flight", "gauge", "Peticiones en curso",
+                           [("", (), self.en_curso)])
+        return [latencia, peticiones, en_curso]
+
+
+class MiddlewareMetricasHTTP:
+    """Middleware ASGI: latencia y código de estado de cada petición"""
+
+    def __init__(self, app, metricas: "MetricasHTTP" = None):
+        self.app = app
+        self.metricas = metricas or metricas_http
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = 500
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+            await send(mensaje)
+
+        metricas = self.metricas
+        metricas.en_curso += 1
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            metricas.en_curso -= 1
+            # Plantilla de la ruta que fija el router de FastAPI (cardinalidad acotada)
+            ruta = scope.get("route")
+            metricas.observar(scope["method"], ruta.path if ruta is not None else "sin_ruta", estado, duracion)
+
+
+# ==================== REGISTRO Y AGREGACIÓN ====================
+
+class RegistroMetricas:
+    """Junta las familias de todos los proveedores y, con METRICAS_DIR, las de los demás workers"""
+
+    def __init__(self, directorio: str = METRICAS_DIR, intervalo: float = METRICAS_INTERVALO_SEGUNDOS):
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self._proveedores: List[Callable[[], List[Familia]]] = []
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def registrar(self, proveedor: Callable[[], List[Familia]]) -> None:
+        self._proveedores.append(proveedor)
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Tuple[str, ...] = ()) -> Contador:
+        contador = Contador(nombre, ayuda, etiquetas)
+        self.registrar(lambda: [contador.familia()])
+        return contador
+
+    def familias_proceso(self) -> List[Familia]:
+        familias = []
+        for proveedor in self._proveedores:
+            familias.extend(proveedor())
+        return familias
+
+    # ---------- snapshots por worker ----------
+
+    def _archivo(self) -> str:
+        return os.path.join(self.directorio, f"{os.getpid()}.json")
+
+    def _acumulado(self) -> str:
+        return os.path.join(self.directorio, "acumulado.json")
+
+    def publicar(self) -> None:
+        """Escribir el snapshot de este worker"""
+        _escribir(self._archivo(), self.familias_proceso())
+
+    @contextmanager
+    def _bloqueo(self, modo: int):
+        """Lock entre workers: exclusivo para acumular, compartido para leer los snapshots"""
+        with open(os.path.join(self.directorio, ".lock"), "w") as archivo:
+            fcntl.flock(archivo, modo)
+            yield
+
+    def _acumular(self, ruta: str, familias: Optional[List[Familia]] = None) -> None:
+        """Sumar los contadores del snapshot de un worker terminado a acumulado.json y borrarlo"""
+        with self._bloqueo(fcntl.LOCK_EX):
+            if familias is None:
+                try:
+                    familias = _leer(ruta)
+                except FileNotFoundError:
+                    # Otro worker lo acumuló mientras esperábamos el lock
+                    return
+            contadores = [f for f in familias if f.tipo != "gauge"]
+            try:
+                acumulado = _leer(self._acumulado())
+            except FileNotFoundError:
+                acumulado = []
+            _escribir(self._acumulado(), combinar([acumulado, contadores]))
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+    def _snapshots_otros(self) -> List[List[Familia]]:
+        propio = self._archivo()
+        vivos = []
+        for ruta in glob.glob(os.path.join(self.directorio, "*.json")):
+            pid = os.path.basename(ruta)[:-len(".json")]
+            if ruta == propio or not pid.isdigit():
+                continue
+            if _proceso_vivo(int(pid)):
+                vivos.append(ruta)
+                continue
+            try:
+                self._acumular(ruta)
+            except (OSError, ValueError) as e:
+                logger.error("No se pudo acumular el snapshot %s: %s", ruta, e)
+
+        # Con el lock compartido ningún snapshot pasa a acumulado.json a mitad de la lectura
+        # (se contaría dos veces y el contador bajaría en la siguiente)
+        vigente_desde = time.time() - 3 * self.intervalo
+        snapshots = []
+        with self._bloqueo(fcntl.LOCK_SH):
+            for ruta in vivos + [self._acumulado()]:
+                try:
+                    vigente = os.path.getmtime(ruta) >= vigente_desde or ruta == self._acumulado()
+                    familias = _leer(ruta)
+                except (OSError, ValueError):
+                    continue
+                # Un worker colgado conserva sus contadores; sus gauges ya no dicen nada
+                snapshots.append(familias if vigente else [f for f in familias if f.tipo != "gauge"])
+        return snapshots
+
+    def _bucle(self) -> None:
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.publicar()
+            except OSError as e:
+                logger.error("No se pudo publicar el snapshot de métricas: %s", e)
+
+    def iniciar(self) -> None:
+        if not self.directorio or (self._hilo and self._hilo.is_alive()):
+            return
+        os.makedirs(self.directorio, exist_ok=True)
+        self._detener.clear()
+        self.publicar()
+        self._hilo = threading.Thread(target=self._bucle, name="metricas", daemon=True)
+        self._hilo.start()
+
+    def detener(self) -> None:
+        if not self._hilo:
+            return
+        self._detener.set()
+        self._hilo.join(timeout=self.intervalo + 1)
+        self._hilo = None
+        try:
+            self._acumular(self._archivo(), self.familias_proceso())
+        except OSError as e:
+            logger.error("No se pudieron acumular las métricas de este worker: %s", e)
+
+    # ---------- exportación ----------
+
+    def exportar(self) -> str:
+        """Texto para /metrics: este proceso más los demás workers si hay METRICAS_DIR"""
+        snapshots = [self.familias_proceso()]
+        if self.directorio:
+            snapshots.extend(self._snapshots_otros())
+        return formatear_prometheus(combinar(snapshots))
+
+
+def _escribir(ruta: str, familias: List[Familia]) -> None:
+    """Guardar familias en JSON (atómico: archivo temporal + rename)"""
+    datos = [[f.nombre, f.tipo, f.ayuda, f.agregacion, f.muestras] for f in familias]
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w") as archivo:
+        json.dump(datos, archivo)
+    os.replace(temporal, ruta)
+
+
+def _leer(ruta: str) -> List[Familia]:
+    with open(ruta) as archivo:
+        datos = json.load(archivo)
+    return [
+        Familia(nombre, tipo, ayuda, [(s, tuple(map(tuple, e)), v) for s, e, v in muestras], agregacion)
+        for nombre, tipo, ayuda, agregacion, muestras in datos
+    ]
+
+
+def _proceso_vivo(pid: int) -> bool:
+    """Los workers comparten METRICAS_DIR dentro del mismo nodo: basta con os.kill(pid, 0)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def combinar(snapshots: List[List[Familia]]) -> List[Familia]:
+    """Sumar (o tomar el máximo de) las muestras iguales de varios workers"""
+    if len(snapshots) == 1:
+        return snapshots[0]
+    familias: Dict[str, Familia] = {}
+    valores: Dict[str, Dict[Tuple[str, Etiquetas], float]] = {}
+    for snapshot in snapshots:
+        for familia in snapshot:
+            if familia.nombre not in familias:
+                familias[familia.nombre] = Familia(familia.nombre, familia.tipo, familia.ayuda,
+                                                   agregacion=familia.agregacion)
+                valores[familia.nombre] = {}
+            muestras = valores[familia.nombre]
+            for sufijo, etiquetas, valor in familia.muestras:
+                clave = (sufijo, etiquetas)
+                if clave not in muestras:
+                    muestras[clave] = valor
+                elif familia.agregacion == "max":
+                    muestras[clave] = max(muestras[clave], valor)
+                else:
+                    muestras[clave] += valor
+    for nombre, familia in familias.items():
+        familia.muestras = [(s, e, v) for (s, e), v in valores[nombre].items()]
+    return list(familias.values())
+
+
+def _numero(valor: float) -> str:
+    if isinstance(valor, float) and math.isinf(valor):
+        return "+Inf"
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+def _etiquetas(etiquetas: Etiquetas) -> str:
+    if not etiquetas:
+        return ""
+    partes = []
+    for clave, valor in etiquetas:
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{clave}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def formatear_prometheus(familias: List[Familia]) -> str:
+    lineas = []
+    for familia in familias:
+        lineas.append(f"# HELP {familia.nombre} {familia.ayuda}")
+        lineas.append(f"# TYPE {familia.nombre} {familia.tipo}")
+        for sufijo, etiquetas, valor in familia.muestras:
+            lineas.append(f"{familia.nombre}{sufijo}{_etiquetas(etiquetas)} {_numero(valor)}")
+    return "\n".join(lineas) + "\n"
+
+
+# Instancias compartidas por la aplicación
+metricas_http = MetricasHTTP()
+registro_metricas = RegistroMetricas()
+registro_metricas.registrar(metricas_http.familias)
+
+# Contadores de negocio
+contador_checkouts = registro_metricas.contador(
+    "checkouts_total", "Checkouts por resultado (ok, sin_stock, invalido)", ("resultado",)
+)
+contador_pdfs = registro_metricas.contador(
+    "pdf_renders_total", "Comprobantes PDF por origen (cola, zip) y resultado (ok, error, reintento)", ("origen", "resultado")
+)
+contador_login_fallido = registro_metricas.contador(
+    "login_failures_total", "Logins rechazados por motivo (credenciales, limite, saturado)", ("motivo",)
+)
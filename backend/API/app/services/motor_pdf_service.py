@@ -0,0 +1,196 @@
+"""
+Motor de renderizado de PDFs en procesos separados.
+
+El layout de ReportLab es Python puro y ocupa la CPU con el GIL tomado, así que
+un proceso de la API solo puede renderizar un comprobante a la vez. Este motor
+envía instantáneas planas (SnapshotPDF, no objetos ORM) a un ProcessPoolExecutor
+para usar varios núcleos, y mide la cola y el tiempo de cada render.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+from .documento_service import SnapshotPDF, generar_pdf_documento
+
+logger = logging.getLogger(__name__)
+
+# Procesos de renderizado (0 renderiza en el hilo que llama, sin procesos)
+PDF_PROCESOS = int(os.getenv("PDF_PROCESOS", str(min(4, os.cpu_count() or 1))))
+# Tiempo máximo de espera por un render
+PDF_RENDER_TIMEOUT_SEGUNDOS = float(os.getenv("PDF_RENDER_TIMEOUT_SEGUNDOS", "60"))
+
+
+def _renderizar(snapshot: SnapshotPDF, base_path: Optional[str]) -> Tuple[str, float]:
+    """Ejecutado en el proceso hijo: retorna la ruta relativa y los segundos de CPU usados"""
+    inicio = time.process_time()
+    ruta = generar_pdf_documento(
+        documento=snapshot.documento,
+        usuario=snapshot.usuario,
+        detalles=list(snapshot.detalles),
+        base_path=base_path
+    )
+    return ruta, time.process_time() - inicio
+
+
+class MotorPDF:
+    """Pool de procesos para generar comprobantes"""
+
+    def __init__(self, procesos: int = PDF_PROCESOS, timeout: float = PDF_RENDER_TIMEOUT_SEGUNDOS):
+        self.procesos = procesos
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._en_cola = 0
+        self._renders = 0
+        self._fallos = 0
+        self._segundos_render = 0.0
+        self._segundos_total = 0.0
+        self._max_ms = 0.0
+
+    def _obtener_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: los hilos de la API no se heredan a medio usar en los hijos
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info("Motor de PDF iniciado con %d procesos", self.procesos)
+            return self._pool
+
+    def _descartar_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Sacar un pool roto (un proceso hijo murió) para que el próximo envío cree otro"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                logger.error("Un proceso del motor de PDF terminó inesperadamente; se reinicia el pool")
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _enviar_al_pool(self, snapshot: SnapshotPDF, base_path: Optional[str]) -> Tuple[ProcessPoolExecutor, Future]:
+        """submit al pool; si está roto, lo reemplaza y reintenta una vez"""
+        pool = self._obtener_pool()
+        try:
+            interno = pool.submit(_renderizar, snapshot, base_path)
+        except BrokenProcessPool:
+            self._descartar_pool(pool)
+            pool = self._obtener_pool()
+            interno = pool.submit(_renderizar, snapshot, base_path)
+        return pool, interno
+
+    def enviar(self, snapshot: SnapshotPDF, base_path: Optional[str] = None) -> Future:
+        """
+        Encargar un render sin esperar el resultado.
+
+        Args:
+            snapshot: Datos del documento creados con crear_snapshot_pdf
+            base_path: Ruta base para guardar documentos (opcional)
+
+        Returns:
+            Future: se resuelve con la ruta relativa del archivo PDF generado
+        """
+        with self._lock:
+            self._en_cola += 1
+        inicio = time.perf_counter()
+        pool = None
+        if self.procesos <= 0:
+            interno = Future()
+            try:
+                interno.set_result(_renderizar(snapshot, base_path))
+            except Exception as e:
+                interno.set_exception(e)
+        else:
+            try:
+                pool, interno = self._enviar_al_pool(snapshot, base_path)
+            except BaseException:
+                with self._lock:
+                    self._en_cola -= 1
+                    self._fallos += 1
+                raise
+
+        resultado = Future()
+        # Render en curso (cambia si se reintenta), para cancelarlo junto con `resultado`
+        actual = [pool, interno]
+        reintentado = False
+
+        def terminar(futuro: Future) -> None:
+            nonlocal reintentado
+            total = time.perf_counter() - inicio
+            error = CancelledError() if futuro.cancelled() else futuro.exception()
+            if isinstance(error, BrokenProcessPool) and not reintentado and not resultado.done():
+                # El proceso que tenía este render murió: pool nuevo y un segundo intento
+                reintentado = True
+                self._descartar_pool(actual[0])
+                try:
+                    actual[:] = self._enviar_al_pool(snapshot, base_path)
+                    actual[1].add_done_callback(terminar)
+                    return
+                except Exception as e:
+                    error = e
+            with self._lock:
+                self._en_cola -= 1
+                if error is None:
+                    ruta, segundos_render = futuro.result()
+                    self._renders += 1
+                    self._segundos_render += segundos_render
+                    self._segundos_total += total
+                    self._max_ms = max(self._max_ms, total * 1000)
+                else:
+                    self._fallos += 1
+            if resultado.done():
+                # Cancelado por quien esperaba (ver renderizar)
+                return
+            if error is None:
+                resultado.set_result(ruta)
+            else:
+                resultado.set_exception(error)
+
+        # Cancelar `resultado` cancela el render si todavía no lo tomó un proceso
+        resultado.add_done_callback(lambda f: f.cancelled() and actual[1].cancel())
+        interno.add_done_callback(terminar)
+        return resultado
+
+    def renderizar(self, snapshot: SnapshotPDF, base_path: Optional[str] = None) -> str:
+        """
+        Renderizar un comprobante y esperar la ruta relativa del PDF.
+
+        Si se agota el timeout se cancela el render, pero solo si aún esperaba
+        un proceso libre: uno que ya empezó sigue hasta terminar y ocupa su
+        proceso. generar_pdf_documento escribe en un temporal y lo renombra, así
+        que un reintento simultáneo del mismo comprobante no mezcla los archivos.
+        """
+        futuro = self.enviar(snapshot, base_path)
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            futuro.cancel()
+            raise
+
+    def cerrar(self) -> None:
+        """Terminar los procesos del pool"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores para monitoreo"""
+        with self._lock:
+            return {
+                "procesos": self.procesos,
+                "pool_activo": self._pool is not None,
+                "en_cola": self._en_cola,
+                "renders": self._renders,
+                "fallos": self._fallos,
+                "cpu_promedio_ms": self._segundos_render / self._renders * 1000 if self._renders else None,
+                "total_promedio_ms": self._segundos_total / self._renders * 1000 if self._renders else None,
+                "total_max_ms": self._max_ms,
+            }
+
+
+# Instancia compartida por la aplicación
+motor_pdf = MotorPDF()
@@ -0,0 +1,306 @@
+"""
+Perfilado bajo demanda de peticiones individuales.
+
+Con PERFIL_HABILITADO, MiddlewarePerfil perfila una petición cuando trae el
+header `X-Profile: <PERFIL_TOKEN>` o cuando le toca por PERFIL_MUESTREO. Un
+hilo toma muestras de la pila (sys._current_frames) cada PERFIL_INTERVALO_MS
+del hilo del event loop y de los hilos que ejecutan SQL de la petición
+(endpoints def y run_sync). Cada sentencia se registra con su duración y, si
+una muestra cae mientras una sentencia está en curso, la pila termina en un
+frame "SQL: <sentencia normalizada>".
+
+El resultado se guarda en PERFIL_DIR en formato speedscope
+(https://www.speedscope.app): un perfil muestreado por hilo más una línea de
+tiempo de las sentencias SQL. Si se pidió por header, la respuesta incluye
+X-Profile-Id para descargarlo en /admin/perfiles/{id}.
+
+Deshabilitado no tiene costo: ni el middleware ni los eventos de SQLAlchemy
+se registran. En el event loop, las muestras incluyen las otras peticiones que
+se estén atendiendo a la vez; conviene perfilar con poca concurrencia.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from .metricas_db_service import normalizar_sql
+
+logger = logging.getLogger(__name__)
+
+PERFIL_HABILITADO = os.getenv("PERFIL_HABILITADO", "false").lower() in ("1", "true", "si", "yes")
+# Valor del header X-Profile que activa el perfilado de una petición (vacío = solo muestreo)
+PERFIL_TOKEN = os.getenv("PERFIL_TOKEN", "")
+# Fracción de peticiones que se perfilan sin pedirlo (0.001 = una de cada mil)
+PERFIL_MUESTREO = float(os.getenv("PERFIL_MUESTREO", "0"))
+# Milisegundos entre muestras de la pila
+PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "2"))
+# Directorio de los perfiles (compartido por los workers) y cuántos se conservan
+PERFIL_DIR = os.getenv("PERFIL_DIR", "/tmp/perfiles")
+PERFIL_MAX_ARCHIVOS = int(os.getenv("PERFIL_MAX_ARCHIVOS", "50"))
+
+# Frame de speedscope: (nombre, archivo, línea)
+ClaveFrame = Tuple[str, str, int]
+
+_perfil_actual: ContextVar[Optional["Perfil"]] = ContextVar("perfil", default=None)
+
+
+class Perfil:
+    """Muestras de pila y sentencias SQL de una petición"""
+
+    def __init__(self, nombre: str):
+        self.id = uuid.uuid4().hex
+        self.nombre = nombre
+        self.fecha = datetime.now()
+        self.inicio = time.perf_counter()
+        self.fin: Optional[float] = None
+        # Se crea en el hilo del event loop
+        self.hilo_principal = threading.get_ident()
+        self.hilos = {self.hilo_principal}
+        # (instante, hilo, pila raíz -> hoja)
+        self.muestras: List[Tuple[float, int, Tuple[ClaveFrame, ...]]] = []
+        # (hilo, sql normalizado, inicio, fin)
+        self.sentencias: List[Tuple[int, str, float, float]] = []
+        # hilo -> (sql normalizado, inicio) de la sentencia en curso
+        self._en_curso: Dict[int, Tuple[str, float]] = {}
+
+    def iniciar_sql(self, sql: str) -> None:
+        hilo = threading.get_ident()
+        self.hilos.add(hilo)
+        self._en_curso[hilo] = (normalizar_sql(sql), time.perf_counter())
+
+    def terminar_sql(self) -> None:
+        actual = self._en_curso.pop(threading.get_ident(), None)
+        if actual is not None:
+            self.sentencias.append((threading.get_ident(), actual[0], actual[1], time.perf_counter()))
+
+    def muestrear(self) -> None:
+        """Llamado desde el hilo muestreador"""
+        ahora = time.perf_counter()
+        frames = sys._current_frames()
+        for hilo in list(self.hilos):
+            frame = frames.get(hilo)
+            if frame is None:
+                continue
+            pila = []
+            while frame is not None:
+                codigo = frame.f_code
+                pila.append((codigo.co_qualname, codigo.co_filename, codigo.co_firstlineno))
+                frame = frame.f_back
+            pila.reverse()
+            en_curso = self._en_curso.get(hilo)
+            if en_curso is not None:
+                pila.append((f"SQL: {en_curso[0][:150]}", "<sql>", 0))
+            self.muestras.append((ahora, hilo, tuple(pila)))
+
+    # ---------- speedscope ----------
+
+    def speedscope(self) -> Dict[str, Any]:
+        frames: List[Dict[str, Any]] = []
+        indices: Dict[ClaveFrame, int] = {}
+
+        def indice(clave: ClaveFrame) -> int:
+            if clave not in indices:
+                indices[clave] = len(frames)
+                nombre, archivo, linea = clave
+                frames.append({"name": nombre, "file": archivo, "line": linea} if linea else {"name": nombre})
+            return indices[clave]
+
+        def ms(instante: float) -> float:
+            return round((instante - self.inicio) * 1e3, 3)
+
+        duracion = ms(self.fin or time.perf_counter())
+        perfiles = []
+        for hilo in sorted({h for _, h, _ in self.muestras}, key=lambda h: h != self.hilo_principal):
+            muestras, pesos, anterior = [], [], self.inicio
+            for instante, h, pila in self.muestras:
+                if h != hilo:
+                    continue
+                muestras.append([indice(clave) for clave in pila])
+                pesos.append(round((instante - anterior) * 1e3, 3))
+                anterior = instante
+            perfiles.append({
+                "type": "sampled", "name": f"{self.nombre} (hilo {hilo})", "unit": "milliseconds",
+                "startValue": 0, "endValue": duracion, "samples": muestras, "weights": pesos,
+            })
+        # Línea de tiempo de SQL: un perfil por hilo para que los eventos no se crucen
+        for hilo in sorted({h for h, _, _, _ in self.sentencias}):
+            eventos = []
+            for h, sql, inicio, fin in sorted(s for s in self.sentencias if s[0] == hilo):
+                frame = indice((f"SQL ({(fin - inicio) * 1e3:.2f} ms): {sql[:150]}", "<sql>", 0))
+                eventos.append({"type": "O", "frame": frame, "at": ms(inicio)})
+                eventos.append({"type": "C", "frame": frame, "at": ms(fin)})
+            perfiles.append({
+                "type": "evented", "name": f"SQL (hilo {hilo})", "unit": "milliseconds",
+                "startValue": 0, "endValue": duracion, "events": eventos,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.nombre} {self.fecha.isoformat(timespec='seconds')}",
+            "exporter": "perfil_service",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": perfiles,
+        }
+
+
+class _Muestreador(threading.Thread):
+    def __init__(self, perfil: Perfil, intervalo: float):
+        super().__init__(name=f"perfil-{perfil.id[:8]}", daemon=True)
+        self.perfil = perfil
+        self.intervalo = intervalo
+        self.detener = threading.Event()
+
+    def run(self):
+        while not self.detener.wait(self.intervalo):
+            self.perfil.muestrear()
+
+
+# ==================== ALMACENAMIENTO ====================
+
+class AlmacenPerfiles:
+    """Perfiles en disco como <id>.speedscope.json, acotados a los más recientes"""
+
+    def __init__(self, directorio: str = PERFIL_DIR, maximo: int = PERFIL_MAX_ARCHIVOS):
+        self.directorio = directorio
+        self.maximo = maximo
+
+    def guardar(self, perfil: Perfil) -> None:
+        os.makedirs(self.directorio, exist_ok=True)
+        with open(os.path.join(self.directorio, f"{perfil.id}.speedscope.json"), "w") as archivo:
+            json.dump(perfil.speedscope(), archivo)
+        for ruta in self._archivos()[self.maximo:]:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+    def _archivos(self) -> List[str]:
+        """Más recientes primero"""
+        try:
+            nombres = [n for n in os.listdir(self.directorio) if n.endswith(".speedscope.json")]
+        except FileNotFoundError:
+            return []
+        rutas = [os.path.join(self.directorio, n) for n in nombres]
+        return sorted(rutas, key=lambda r: os.path.getmtime(r) if os.path.exists(r) else 0, reverse=True)
+
+    def ruta(self, perfil_id: str) -> Optional[str]:
+        # El id es hex de uuid4: no se aceptan rutas
+        if len(perfil_id) != 32 or any(c not in "0123456789abcdef" for c in perfil_id):
+            return None
+        ruta = os.path.join(self.directorio, f"{perfil_id}.speedscope.json")
+        return ruta if os.path.isfile(ruta) else None
+
+    def listar(self) -> List[Dict[str, Any]]:
+        perfiles = []
+        for ruta in self._archivos():
+            try:
+                with open(ruta) as archivo:
+                    nombre = json.load(archivo).get("name")
+                perfiles.append({
+                    "id": os.path.basename(ruta).split(".")[0],
+                    "nombre": nombre,
+                    "bytes": os.path.getsize(ruta),
+                })
+            except (OSError, ValueError):
+                continue
+        return perfiles
+
+
+# Instancia compartida por la aplicación
+almacen_perfiles = AlmacenPerfiles()
+
+
+# ==================== MIDDLEWARE ====================
+
+class MiddlewarePerfil:
+    """Middleware ASGI: perfila las peticiones pedidas por header o elegidas por muestreo"""
+
+    def __init__(self, app, token: str = PERFIL_TOKEN, muestreo: float = PERFIL_MUESTREO,
+                 intervalo_ms: float = PERFIL_INTERVALO_MS, almacen: AlmacenPerfiles = None):
+        self.app = app
+        self.token = token.encode()
+        self.muestreo = muestreo
+        self.intervalo = intervalo_ms / 1000
+        self.almacen = almacen or almacen_perfiles
+
+    def _pedido(self, scope) -> bool:
+        if not self.token:
+            return False
+        for clave, valor in scope["headers"]:
+            if clave == b"x-profile":
+                return hmac.compare_digest(valor, self.token)
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        pedido = self._pedido(scope)
+        if not pedido and not (self.muestreo and random.random() < self.muestreo):
+            await self.app(scope, receive, send)
+            return
+
+        perfil = Perfil(f"{scope['method']} {scope['path']}")
+        token = _perfil_actual.set(perfil)
+        muestreador = _Muestreador(perfil, self.intervalo)
+
+        async def enviar(mensaje):
+            if pedido and mensaje["type"] == "http.response.start":
+                MutableHeaders(scope=mensaje).append("X-Profile-Id", perfil.id)
+            await send(mensaje)
+
+        muestreador.start()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            muestreador.detener.set()
+            perfil.fin = time.perf_counter()
+            _perfil_actual.reset(token)
+            ruta = scope.get("route")
+            if ruta is not None:
+                perfil.nombre = f"{scope['method']} {ruta.path}"
+            await asyncio.to_thread(self._guardar, muestreador, perfil)
+
+    def _guardar(self, muestreador: _Muestreador, perfil: Perfil) -> None:
+        muestreador.join()
+        try:
+            self.almacen.guardar(perfil)
+        except OSError as e:
+            logger.error("No se pudo guardar el perfil %s: %s", perfil.id, e)
+
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    perfil = _perfil_actual.get()
+    if perfil is not None:
+        perfil.iniciar_sql(statement)
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    perfil = _perfil_actual.get()
+    if perfil is not None:
+        perfil.terminar_sql()
+
+
+def _error_al_ejecutar(contexto):
+    perfil = _perfil_actual.get()
+    if perfil is not None:
+        perfil.terminar_sql()
+
+
+if PERFIL_HABILITADO:
+    event.listen(Engine, "before_cursor_execute", _antes_de_ejecutar)
+    event.listen(Engine, "after_cursor_execute", _despues_de_ejecutar)
+    event.listen(Engine, "handle_error", _error_al_ejecutar)
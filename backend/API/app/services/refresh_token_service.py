@@ -0,0 +1,178 @@
+"""
+Refresh tokens con rotación.
+
+El login entrega un access token corto y un refresh token opaco. Renovar cuesta
+un HMAC-SHA256 y un UPDATE por clave primaria en vez de otra verificación
+bcrypt. En la base de datos solo se guarda el HMAC del token, agrupado por
+familia (todas las rotaciones que descienden de un mismo login):
+
+- cada refresh token sirve una sola vez; al usarlo se emite el siguiente de la familia
+- presentar un token ya usado (posible robo) revoca la familia completa
+- cambiar la contraseña revoca todos los tokens del usuario
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ..models import RefreshToken, Usuario
+from .identidad_service import Identidad
+
+# Días de vigencia de cada refresh token (se renueva en cada rotación)
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Clave del HMAC; por defecto la misma que firma los JWT
+REFRESH_TOKEN_SECRET = os.getenv(
+    "REFRESH_TOKEN_SECRET", os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+).encode()
+# Emisiones entre limpiezas de tokens vencidos
+REFRESH_LIMPIEZA_CADA = int(os.getenv("REFRESH_LIMPIEZA_CADA", "1000"))
+
+
+class RefreshTokenInvalidoError(Exception):
+    """El refresh token no existe, venció, ya se usó o fue revocado"""
+
+
+def _huella(token: str) -> bytes:
+    return hmac.new(REFRESH_TOKEN_SECRET, token.encode(), hashlib.sha256).digest()
+
+
+class _Contadores:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.valores: Dict[str, int] = {"emitidos": 0, "rotados": 0, "invalidos": 0, "reusos": 0, "revocados": 0}
+
+    def sumar(self, nombre: str, cantidad: int = 1) -> int:
+        with self._lock:
+            self.valores[nombre] += cantidad
+            return self.valores[nombre]
+
+
+_contadores = _Contadores()
+
+
+def emitir_refresh_token(db: Session, usuario_id: UUID, familia: Optional[UUID] = None) -> str:
+    """
+    Crear un refresh token (nueva familia si no se indica). No hace commit.
+
+    Returns:
+        str: token en claro para entregar al cliente
+    """
+    token = secrets.token_urlsafe(32)
+    db.execute(insert(RefreshToken).values(
+        token_hash=_huella(token),
+        familia=familia or uuid.uuid4(),
+        usuario_id=usuario_id,
+        expira_en=datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    if _contadores.sumar("emitidos") % REFRESH_LIMPIEZA_CADA == 0:
+        limpiar_vencidos(db)
+    return token
+
+
+def rotar_refresh_token(db: Session, token: str) -> Tuple[str, Identidad]:
+    """
+    Canjear un refresh token por el siguiente de su familia. Hace commit.
+
+    El UPDATE marca el token como usado solo si sigue vigente: dos canjes
+    simultáneos del mismo token no pueden tener éxito ambos.
+
+    Returns:
+        (nuevo_token, identidad del usuario)
+    """
+    huella = _huella(token)
+    # Con las tablas (no las entidades ORM) el RETURNING incluye las columnas de usuarios
+    rt, usuarios = RefreshToken.__table__, Usuario.__table__
+    fila = db.execute(
+        update(rt)
+        .where(
+            rt.c.token_hash == huella,
+            rt.c.usado_en.is_(None),
+            rt.c.revocado.is_(False),
+            rt.c.expira_en > func.now(),
+            usuarios.c.id == rt.c.usuario_id,
+            usuarios.c.activo.is_(True),
+        )
+        .values(usado_en=func.now())
+        .returning(rt.c.familia, usuarios.c.id, usuarios.c.username, usuarios.c.rol, usuarios.c.email)
+    ).first()
+
+    if fila is None:
+        _rechazar(db, huella)
+
+    nuevo_token = emitir_refresh_token(db, fila.id, familia=fila.familia)
+    db.commit()
+    _contadores.sumar("rotados")
+    identidad = Identidad(id=fila.id, username=fila.username, activo=True, rol=fila.rol or "user", email=fila.email)
+    return nuevo_token, identidad
+
+
+def _rechazar(db: Session, huella: bytes) -> None:
+    existente = db.execute(
+        select(RefreshToken.familia, RefreshToken.usado_en, RefreshToken.revocado)
+        .where(RefreshToken.token_hash == huella)
+    ).first()
+    if existente is not None and existente.usado_en is not None and not existente.revocado:
+        # Un token rotado volvió a presentarse: alguien más lo tiene
+        _revocar(db, RefreshToken.familia == existente.familia)
+        db.commit()
+        _contadores.sumar("reusos")
+    else:
+        db.rollback()
+    _contadores.sumar("invalidos")
+    raise RefreshTokenInvalidoError("Refresh token inválido o expirado")
+
+
+def _revocar(db: Session, condicion) -> int:
+    resultado = db.execute(
+        update(RefreshToken)
+        .where(condicion, RefreshToken.revocado.is_(False))
+        .values(revocado=True)
+        .execution_options(synchronize_session=False)
+    )
+    _contadores.sumar("revocados", resultado.rowcount)
+    return resultado.rowcount
+
+
+def revocar_familia(db: Session, token: str) -> int:
+    """Revocar la familia del token (cierre de sesión). No hace commit."""
+    familia = select(RefreshToken.familia).where(RefreshToken.token_hash == _huella(token)).scalar_subquery()
+    return _revocar(db, RefreshToken.familia == familia)
+
+
+def revocar_tokens_usuario(db: Session, usuario_id: UUID) -> int:
+    """Revocar todos los refresh tokens del usuario. No hace commit."""
+    return _revocar(db, RefreshToken.usuario_id == usuario_id)
+
+
+def limpiar_vencidos(db: Session) -> int:
+    """Eliminar tokens vencidos (ya no sirven ni para detectar reuso)"""
+    resultado = db.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.expira_en < func.now())
+        .execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount
+
+
+def estadisticas(db: Session) -> Dict[str, Any]:
+    """Contadores del proceso y tokens vigentes en la base de datos"""
+    vigentes = db.scalar(
+        select(func.count()).select_from(RefreshToken).where(
+            RefreshToken.usado_en.is_(None),
+            RefreshToken.revocado.is_(False),
+            RefreshToken.expira_en > func.now(),
+        )
+    )
+    return {
+        "vigencia_dias": REFRESH_TOKEN_EXPIRE_DAYS,
+        "vigentes": vigentes,
+        **dict(_contadores.valores),
+    }
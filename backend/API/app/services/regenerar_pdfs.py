@@ -0,0 +1,198 @@
+"""
+Regeneración masiva de comprobantes PDF.
+
+Recorre los documentos con un cursor del lado del servidor (sin cargar la tabla
+en memoria), los renderiza en paralelo con el motor de procesos y actualiza
+`ruta_documento` en commits por lote. Después de cada lote guarda un punto de
+control en disco, de modo que una ejecución interrumpida continúa desde el
+último lote confirmado.
+
+Uso (desde backend/API):
+    python -m app.services.regenerar_pdfs --desde 2025-01-01 --hasta 2025-06-30
+    python -m app.services.regenerar_pdfs --estado completado --procesos 8 --lote 500
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import wait
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select, tuple_, update
+
+from ..database import SessionLocal
+from ..models import Documento
+from .documento_service import crear_snapshots_pdf
+from .motor_pdf_service import MotorPDF
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_POR_DEFECTO = ".regenerar_pdfs.json"
+
+
+def _filtros(args: argparse.Namespace) -> List[Any]:
+    condiciones = []
+    if args.desde:
+        condiciones.append(Documento.fecha_creacion >= args.desde)
+    if args.hasta:
+        # --hasta incluye el día completo
+        condiciones.append(Documento.fecha_creacion < args.hasta + timedelta(days=1))
+    if args.estado:
+        condiciones.append(Documento.estado == args.estado)
+    if not args.todos:
+        # Solo documentos con comprobante (los creados por el checkout)
+        condiciones.append(Documento.pdf_estado.isnot(None))
+    return condiciones
+
+
+def _clave_filtros(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "desde": args.desde.isoformat() if args.desde else None,
+        "hasta": args.hasta.isoformat() if args.hasta else None,
+        "estado": args.estado,
+        "todos": args.todos,
+    }
+
+
+def _leer_checkpoint(ruta: str, filtros: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("filtros") != filtros:
+        raise SystemExit(
+            f"El punto de control {ruta} es de otra ejecución ({checkpoint.get('filtros')}). "
+            "Use --reiniciar o --checkpoint con otra ruta."
+        )
+    return checkpoint
+
+
+def _guardar_checkpoint(ruta: str, checkpoint: Dict[str, Any]) -> None:
+    # Escritura atómica: un corte a mitad no deja el archivo corrupto
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporal, ruta)
+
+
+def _procesar_lote(escritor, motor: MotorPDF, documentos: List[Documento], base_path: Optional[str]):
+    """Renderizar un lote y persistir las rutas. Retorna (listos, errores)."""
+    snapshots = crear_snapshots_pdf(escritor, documentos)
+    futuros = {
+        motor.enviar(snapshot, base_path): documento_id
+        for documento_id, snapshot in snapshots.items()
+    }
+    wait(futuros)
+
+    cambios, errores = [], 0
+    for futuro, documento_id in futuros.items():
+        if futuro.exception() is None:
+            cambios.append({"id": documento_id, "ruta_documento": futuro.result(), "pdf_estado": "listo"})
+        else:
+            errores += 1
+            logger.error("No se pudo generar el PDF de %s: %s", documento_id, futuro.exception())
+            cambios.append({"id": documento_id, "pdf_estado": "error"})
+
+    # UPDATE por clave primaria en lote (executemany)
+    listos = [c for c in cambios if "ruta_documento" in c]
+    fallidos = [c for c in cambios if "ruta_documento" not in c]
+    if listos:
+        escritor.execute(update(Documento), listos)
+    if fallidos:
+        escritor.execute(update(Documento), fallidos)
+    escritor.commit()
+    return len(listos), errores
+
+
+def regenerar(args: argparse.Namespace) -> None:
+    """Ejecutar la regeneración según los argumentos de línea de comandos"""
+    filtros = _clave_filtros(args)
+    if args.reiniciar and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = _leer_checkpoint(args.checkpoint, filtros) or {
+        "filtros": filtros, "ultimo": None, "listos": 0, "errores": 0
+    }
+
+    condiciones = _filtros(args)
+    orden = tuple_(Documento.fecha_creacion, Documento.id)
+    if checkpoint["ultimo"]:
+        fecha, documento_id = checkpoint["ultimo"]
+        condiciones.append(orden > (datetime.fromisoformat(fecha), UUID(documento_id)))
+        print(f"Continuando desde {fecha} / {documento_id} "
+              f"({checkpoint['listos']} listos, {checkpoint['errores']} errores previos)")
+
+    motor = MotorPDF(procesos=args.procesos)
+    with SessionLocal() as lector, SessionLocal() as escritor:
+        total = lector.scalar(select(func.count()).select_from(Documento).where(*condiciones))
+        print(f"{total} documentos por regenerar con {args.procesos} procesos")
+        if not total:
+            return
+
+        # yield_per usa un cursor con nombre (del lado del servidor) en PostgreSQL
+        resultado = lector.scalars(
+            select(Documento)
+            .where(*condiciones)
+            .order_by(Documento.fecha_creacion, Documento.id)
+            .execution_options(yield_per=args.lote)
+        )
+        inicio = time.perf_counter()
+        hechos = 0
+        try:
+            for lote in resultado.partitions():
+                listos, errores = _procesar_lote(escritor, motor, lote, args.base_path)
+                hechos += len(lote)
+                checkpoint["listos"] += listos
+                checkpoint["errores"] += errores
+                checkpoint["ultimo"] = [lote[-1].fecha_creacion.isoformat(), str(lote[-1].id)]
+                _guardar_checkpoint(args.checkpoint, checkpoint)
+
+                transcurrido = time.perf_counter() - inicio
+                velocidad = hechos / transcurrido
+                eta = (total - hechos) / velocidad if velocidad else 0
+                print(f"{hechos}/{total} ({hechos / total:.1%}) | {velocidad:.1f} doc/s | "
+                      f"ETA {timedelta(seconds=int(eta))} | errores {checkpoint['errores']}",
+                      flush=True)
+        finally:
+            motor.cerrar()
+
+    print(f"Terminado: {checkpoint['listos']} listos, {checkpoint['errores']} errores")
+    if os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+
+def _fecha(valor: str) -> datetime:
+    return datetime.strptime(valor, "%Y-%m-%d")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.regenerar_pdfs",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--desde", type=_fecha, help="Fecha de creación mínima (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=_fecha, help="Fecha de creación máxima, inclusive (AAAA-MM-DD)")
+    parser.add_argument("--estado", help="Solo documentos con este estado (ej. completado)")
+    parser.add_argument("--todos", action="store_true",
+                        help="Incluir documentos sin comprobante (pdf_estado nulo)")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--lote", type=int, default=200, help="Documentos por commit y punto de control")
+    parser.add_argument("--base-path", help="Directorio de documentos (por defecto API/documents)")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_POR_DEFECTO, help="Archivo de punto de control")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignorar el punto de control existente")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    try:
+        regenerar(args)
+    except KeyboardInterrupt:
+        print(f"\nInterrumpido; se continuará desde {args.checkpoint}", file=sys.stderr)
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Servicio de stock transaccional para el checkout.
+
+El stock vive en la tabla `productos`. La reserva de todas las líneas de una
+compra se hace con un único UPDATE condicional (stock >= cantidad) dentro de
+la transacción del checkout: solo se bloquean las filas de los productos
+involucrados y, si alguna línea no tiene stock suficiente, el llamador hace
+rollback de toda la compra.
+"""
+import asyncio
+import threading
+from typing import Any, Dict
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .catalogo_service import SnapshotCatalogo
+
+
+class StockInsuficienteError(Exception):
+    """Una o más líneas no pudieron reservarse"""
+
+    def __init__(self, faltantes: Dict[int, Dict[str, int]]):
+        # producto_id -> {"disponible": int, "solicitado": int}
+        self.faltantes = faltantes
+        super().__init__(f"Stock insuficiente para productos {sorted(faltantes)}")
+
+
+# Bloquea las filas en orden de id (evita deadlocks entre compras que comparten
+# productos) y descuenta solo si alcanza el stock de cada línea
+_SQL_RESERVAR = text("""
+    WITH pedido AS (
+        SELECT unnest(CAST(:ids AS integer[])) AS id,
+               unnest(CAST(:cantidades AS integer[])) AS cantidad
+    ),
+    bloqueados AS (
+        SELECT p.id FROM productos p JOIN pedido USING (id)
+        ORDER BY p.id
+        FOR UPDATE OF p
+    )
+    UPDATE productos p
+    SET stock = p.stock - pedido.cantidad
+    FROM pedido
+    WHERE p.id = pedido.id
+      AND p.id IN (SELECT id FROM bloqueados)
+      AND p.stock >= pedido.cantidad
+    RETURNING p.id, p.stock
+""")
+
+_SQL_SINCRONIZAR = text("""
+    INSERT INTO productos (id, nombre, precio, stock)
+    SELECT * FROM unnest(
+        CAST(:ids AS integer[]),
+        CAST(:nombres AS varchar[]),
+        CAST(:precios AS float[]),
+        CAST(:stocks AS integer[])
+    )
+    ON CONFLICT (id) DO NOTHING
+""")
+
+_version_sincronizada = 0
+_lock_sincronizacion = threading.Lock()
+# En el event loop no se puede usar el lock de hilos: las sesiones async comparten hilo
+_lock_sincronizacion_async = asyncio.Lock()
+
+
+def sincronizar_productos(db: Session, productos: Dict[int, Dict[str, Any]]) -> None:
+    """
+    Registrar en la tabla productos los que aún no existen, con el stock
+    inicial del catálogo. El stock de productos ya registrados no se toca.
+    """
+    if not productos:
+        return
+    lista = list(productos.values())
+    db.execute(_SQL_SINCRONIZAR, {
+        "ids": [p["id"] for p in lista],
+        "nombres": [p.get("nombre", f"Producto {p['id']}") for p in lista],
+        "precios": [float(p.get("precio") or 0) for p in lista],
+        "stocks": [int(p.get("stock") or 0) for p in lista],
+    })
+
+
+def asegurar_productos(db: Session, snapshot: SnapshotCatalogo) -> None:
+    """Sincronizar una sola vez por cada versión del catálogo"""
+    global _version_sincronizada
+    if _version_sincronizada == snapshot.version:
+        return
+    with _lock_sincronizacion:
+        if _version_sincronizada == snapshot.version:
+            return
+        sincronizar_productos(db, snapshot.datos)
+        db.commit()
+        _version_sincronizada = snapshot.version
+
+
+async def asegurar_productos_async(db: AsyncSession, snapshot: SnapshotCatalogo) -> None:
+    """Igual que asegurar_productos, para sesiones async"""
+    global _version_sincronizada
+    if _version_sincronizada == snapshot.version:
+        return
+    async with _lock_sincronizacion_async:
+        if _version_sincronizada == snapshot.version:
+            return
+        # La sincronización es idempotente: no importa si un hilo sync la repite
+        await db.run_sync(sincronizar_productos, snapshot.datos)
+        await db.commit()
+        _version_sincronizada = snapshot.version
+
+
+def reservar_stock(db: Session, cantidades: Dict[int, int]) -> Dict[int, int]:
+    """
+    Descontar stock para todas las líneas en una sola sentencia.
+
+    Args:
+        db: Sesión con la transacción del checkout (no se hace commit aquí)
+        cantidades: producto_id -> cantidad solicitada
+
+    Returns:
+        Dict[int, int]: producto_id -> stock restante
+
+    Raises:
+        StockInsuficienteError: si alguna línea no alcanzó; el llamador debe
+            hacer rollback para liberar lo ya descontado
+    """
+    ids = sorted(cantidades)
+    filas = db.execute(_SQL_RESERVAR, {
+        "ids": ids,
+        "cantidades": [cantidades[i] for i in ids],
+    }).all()
+    restantes = {fila.id: fila.stock for fila in filas}
+    if len(restantes) == len(ids):
+        return restantes
+
+    # Alguna línea falló: consultar el stock actual solo para informar
+    faltan = [i for i in ids if i not in restantes]
+    disponibles = dict(db.execute(
+        text("SELECT id, stock FROM productos WHERE id = ANY(CAST(:ids AS integer[]))"),
+        {"ids": faltan}
+    ).all())
+    raise StockInsuficienteError({
+        i: {"disponible": disponibles.get(i, 0), "solicitado": cantidades[i]}
+        for i in faltan
+    })
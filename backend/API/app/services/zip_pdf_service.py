@@ -0,0 +1,130 @@
+"""
+Exportación de comprobantes PDF en un ZIP generado al vuelo.
+
+El ZIP se escribe sobre un destino no "seekable" que solo acumula los bytes del
+último bloque; el generador los entrega a la respuesta HTTP y los descarta, así
+que no hay archivo temporal ni se guarda el archivo completo en memoria (solo
+el índice del ZIP, de unos cientos de bytes por entrada, que el formato escribe
+al final). Los documentos se recorren por lotes con un cursor del servidor y los
+PDFs que faltan en disco se renderizan en el momento.
+"""
+import io
+import logging
+import os
+import zipfile
+from concurrent.futures import wait
+from typing import Any, Dict, Iterator, List
+
+from sqlalchemy import select, update
+
+from ..database import SessionLectura, SessionLocal
+from ..models import Documento
+from .documento_service import crear_snapshots_pdf, ruta_base_documentos
+from .metricas_service import contador_pdfs
+from .motor_pdf_service import motor_pdf
+
+logger = logging.getLogger(__name__)
+
+# Documentos por lote leído de la base de datos
+ZIP_LOTE = 500
+# Tamaño de lectura de cada PDF
+ZIP_BLOQUE_BYTES = 64 * 1024
+
+
+class _SalidaZip(io.RawIOBase):
+    """Destino de solo escritura: guarda los bytes hasta que se retiran con vaciar()"""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._posicion = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self._posicion
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _completar_faltantes(documentos: List[Documento], base_path: str) -> Dict[Any, str]:
+    """Renderizar (en paralelo) los PDFs del lote que no existen en disco; retorna id -> ruta"""
+    faltantes = [
+        d for d in documentos
+        if not d.ruta_documento or not os.path.isfile(os.path.join(base_path, d.ruta_documento))
+    ]
+    if not faltantes:
+        return {}
+    with SessionLocal() as escritor:
+        snapshots = crear_snapshots_pdf(escritor, faltantes)
+        futuros = {motor_pdf.enviar(snapshot, base_path): documento_id
+                   for documento_id, snapshot in snapshots.items()}
+        wait(futuros)
+        cambios = []
+        for futuro, documento_id in futuros.items():
+            if futuro.exception() is not None:
+                logger.error("No se pudo generar el PDF de %s: %s", documento_id, futuro.exception())
+                contador_pdfs.incrementar("zip", "error")
+                continue
+            contador_pdfs.incrementar("zip", "ok")
+            cambios.append({"id": documento_id, "ruta_documento": futuro.result(), "pdf_estado": "listo"})
+        if cambios:
+            escritor.execute(update(Documento), cambios)
+            escritor.commit()
+    # No se modifican los objetos del lector: quedarían retenidos en la sesión
+    return {c["id"]: c["ruta_documento"] for c in cambios}
+
+
+def generar_zip_pdfs(*condiciones: Any, usuario_id: Any = None) -> Iterator[bytes]:
+    """
+    Generar un ZIP con los PDFs de los documentos que cumplen las condiciones.
+
+    Usa su propia sesión: el generador se consume después de que la sesión
+    de la petición ya se cerró. La lectura va a una réplica si hay; con
+    usuario_id, a la primaria si ese usuario escribió hace poco.
+
+    Yields:
+        bytes: fragmentos consecutivos del archivo ZIP
+    """
+    base_path = ruta_base_documentos()
+    salida = _SalidaZip()
+    # Los PDF ya vienen comprimidos: se guardan sin volver a comprimir
+    with SessionLectura(usuario_id) as lector, zipfile.ZipFile(salida, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        resultado = lector.scalars(
+            select(Documento)
+            .where(*condiciones)
+            .order_by(Documento.fecha_creacion, Documento.id)
+            .execution_options(yield_per=ZIP_LOTE)
+        )
+        for lote in resultado.partitions():
+            generados = _completar_faltantes(lote, base_path)
+            for documento in lote:
+                ruta_relativa = generados.get(documento.id, documento.ruta_documento)
+                ruta = os.path.join(base_path, ruta_relativa) if ruta_relativa else None
+                if not ruta or not os.path.isfile(ruta):
+                    continue
+                # Misma estructura AAAA/MM/DD/<id>.pdf que el directorio documents
+                with open(ruta, "rb") as origen, zf.open(ruta_relativa, "w", force_zip64=True) as destino:
+                    while True:
+                        bloque = origen.read(ZIP_BLOQUE_BYTES)
+                        if not bloque:
+                            break
+                        destino.write(bloque)
+                        datos = salida.vaciar()
+                        if datos:
+                            yield datos
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+    # Directorio central del ZIP
+    datos = salida.vaciar()
+    if datos:
+        yield datos
@@ -1,9 +1,88 @@
 """
 Funciones de validación para el sistema de e-commerce UNAB
 Incluye validaciones de RUT chileno, teléfono y contraseña
+
+Las versiones por lotes (validar_ruts, validar_telefonos) devuelven un
+ResultadoLote y, para RUTs, calculan los dígitos verificadores de todo el lote
+juntos (vectorizado con NumPy si está instalado).
 """
 import re
-from typing import Tuple
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Patrones precompilados
+_ESPACIOS = re.compile(r'\s')
+_SEPARADORES_TELEFONO = re.compile(r'[\s\-\(\)]')
+_MAYUSCULA = re.compile(r'[A-Z]')
+_MINUSCULA = re.compile(r'[a-z]')
+_DIGITO = re.compile(r'\d')
+
+# Dígito verificador según el resto de la suma ponderada módulo 11
+_DV_POR_RESTO = "0K987654321"
+# Pesos de derecha a izquierda: 2, 3, 4, 5, 6, 7, 2, 3, ...
+_PESOS = (2, 3, 4, 5, 6, 7, 2, 3, 4, 5, 6, 7)
+# Suma ponderada de cada grupo de 3 dígitos (unidades, miles, millones, miles de millones)
+_TABLA_DV = [
+    [sum((x // 10 ** j) % 10 * _PESOS[3 * grupo + j] for j in range(3)) for x in range(1000)]
+    for grupo in range(4)
+]
+# Con lotes chicos convertir a arreglo de NumPy cuesta más de lo que ahorra
+_LOTE_MINIMO_NUMPY = 256
+
+
+@dataclass
+class ResultadoLote:
+    """
+    Resultado de una validación por lotes, en el orden de las entradas.
+    validos[i] es 1 si la entrada i es válida; valores[i] tiene el valor
+    normalizado o el mensaje de error (igual que las funciones individuales).
+    """
+    validos: bytearray
+    valores: List[str]
+
+    def __len__(self) -> int:
+        return len(self.validos)
+
+    @property
+    def cantidad_validos(self) -> int:
+        return self.validos.count(1)
+
+    def errores(self) -> Iterator[Tuple[int, str]]:
+        """(índice, mensaje) de cada entrada inválida"""
+        for i, valido in enumerate(self.validos):
+            if not valido:
+                yield i, self.valores[i]
+
+
+def _digito_verificador(numero: int) -> str:
+    """DV de un número menor a 10^12, sumando por grupos de 3 dígitos"""
+    t0, t1, t2, t3 = _TABLA_DV
+    return _DV_POR_RESTO[(t0[numero % 1000] + t1[numero // 1000 % 1000]
+                          + t2[numero // 1_000_000 % 1000] + t3[numero // 1_000_000_000]) % 11]
+
+
+def digitos_verificadores(numeros: Sequence[int]) -> str:
+    """
+    Dígitos verificadores de una secuencia de números de RUT (menores a 10^12).
+    
+    Returns:
+        str: un carácter ('0'-'9' o 'K') por número, en el mismo orden
+    """
+    if NUMPY_AVAILABLE and len(numeros) >= _LOTE_MINIMO_NUMPY:
+        restantes = np.asarray(numeros, dtype=np.int64)
+        suma = np.zeros_like(restantes)
+        for peso in _PESOS:
+            suma += restantes % 10 * peso
+            restantes //= 10
+        codigos = np.frombuffer(_DV_POR_RESTO.encode(), dtype=np.uint8)[suma % 11]
+        return codigos.tobytes().decode()
+    return "".join([_digito_verificador(numero) for numero in numeros])
 
 
 def validar_rut_chileno(rut: str) -> Tuple[bool, str]:
@@ -18,70 +97,95 @@ def validar_rut_chileno(rut: str) -> Tuple[bool, str]:
         Si es válido: (True, rut_normalizado)
         Si es inválido: (False, mensaje_de_error)
     """
+    resultado = _separar_rut(rut)
+    if isinstance(resultado, str):
+        return False, resultado
+    numero_str, numero, dv = resultado
+    return _comparar_dv(numero_str, dv, _digito_verificador(numero))
+
+
+def _separar_rut(rut: str):
+    """(número como texto, número, dv) o el mensaje de error si el formato es inválido"""
     if not rut:
-        return False, "RUT no puede estar vacío"
+        return "RUT no puede estar vacío"
     
     # Limpiar el RUT: quitar puntos y espacios, convertir a mayúsculas
-    rut_limpio = re.sub(r'[.\s]', '', rut.strip().upper())
+    rut_limpio = rut.strip().upper().replace('.', '')
+    if not rut_limpio.replace('-', '').isalnum():
+        rut_limpio = _ESPACIOS.sub('', rut_limpio)
     
     # Separar número y dígito verificador
     if '-' in rut_limpio:
         partes = rut_limpio.split('-')
         if len(partes) != 2:
-            return False, "Formato de RUT inválido"
+            return "Formato de RUT inválido"
         numero_str, dv = partes
     else:
         # Si no tiene guion, el último carácter es el dígito verificador
         if len(rut_limpio) < 2:
-            return False, "RUT demasiado corto"
+            return "RUT demasiado corto"
         numero_str = rut_limpio[:-1]
         dv = rut_limpio[-1]
     
     # Validar que el número solo contenga dígitos
     if not numero_str.isdigit():
-        return False, "El número del RUT solo puede contener dígitos"
+        return "El número del RUT solo puede contener dígitos"
     
     # Validar dígito verificador (puede ser dígito o 'K')
     if dv not in '0123456789K':
-        return False, "Dígito verificador inválido (debe ser un número o K)"
+        return "Dígito verificador inválido (debe ser un número o K)"
     
     # Convertir a entero para cálculo
     try:
         numero = int(numero_str)
     except ValueError:
-        return False, "Número de RUT inválido"
+        return "Número de RUT inválido"
     
     # Validar rango razonable (RUTs chilenos típicamente entre 1.000.000 y 99.999.999)
     if numero < 1000000 or numero > 99999999:
-        return False, "Número de RUT fuera del rango válido"
-    
-    # Calcular dígito verificador esperado
-    multiplicadores = [2, 3, 4, 5, 6, 7]
-    suma = 0
-    numero_reverso = numero_str[::-1]  # Invertir para multiplicar desde la derecha
-    
-    for i, digito in enumerate(numero_reverso):
-        multiplicador = multiplicadores[i % len(multiplicadores)]
-        suma += int(digito) * multiplicador
+        return "Número de RUT fuera del rango válido"
     
-    resto = suma % 11
-    dv_calculado = 11 - resto
-    
-    # Manejar casos especiales
-    if dv_calculado == 11:
-        dv_calculado = '0'
-    elif dv_calculado == 10:
-        dv_calculado = 'K'
-    else:
-        dv_calculado = str(dv_calculado)
-    
-    # Comparar dígito verificador
+    return numero_str, numero, dv
+
+
+def _comparar_dv(numero_str: str, dv: str, dv_calculado: str) -> Tuple[bool, str]:
     if dv != dv_calculado:
         return False, f"Dígito verificador inválido. Esperado: {dv_calculado}"
-    
     # Retornar RUT normalizado (con guion)
-    rut_normalizado = f"{numero_str}-{dv}"
-    return True, rut_normalizado
+    return True, f"{numero_str}-{dv}"
+
+
+def validar_ruts(ruts: Iterable[str]) -> ResultadoLote:
+    """
+    Valida un lote de RUTs con las mismas reglas y mensajes que validar_rut_chileno.
+    Con NumPy y lotes grandes, los dígitos verificadores se calculan todos juntos al final.
+    """
+    ruts = ruts if isinstance(ruts, (list, tuple)) else list(ruts)
+    validos = bytearray(len(ruts))
+    valores: List[Optional[str]] = [None] * len(ruts)
+    separar, digito_verificador, comparar = _separar_rut, _digito_verificador, _comparar_dv
+    
+    if not (NUMPY_AVAILABLE and len(ruts) >= _LOTE_MINIMO_NUMPY):
+        for i, rut in enumerate(ruts):
+            resultado = separar(rut)
+            if resultado.__class__ is str:
+                valores[i] = resultado
+            else:
+                validos[i], valores[i] = comparar(resultado[0], resultado[2], digito_verificador(resultado[1]))
+        return ResultadoLote(validos, valores)
+    
+    pendientes: List[Tuple[int, str, str]] = []
+    numeros: List[int] = []
+    for i, rut in enumerate(ruts):
+        resultado = separar(rut)
+        if resultado.__class__ is str:
+            valores[i] = resultado
+        else:
+            pendientes.append((i, resultado[0], resultado[2]))
+            numeros.append(resultado[1])
+    for (i, numero_str, dv), dv_calculado in zip(pendientes, digitos_verificadores(numeros)):
+        validos[i], valores[i] = comparar(numero_str, dv, dv_calculado)
+    return ResultadoLote(validos, valores)
 
 
 def validar_telefono_chileno(telefono: str) -> Tuple[bool, str]:
@@ -105,8 +209,10 @@ def validar_telefono_chileno(telefono: str) -> Tuple[bool, str]:
     if not telefono:
         return False, "Teléfono no puede estar vacío"
     
-    # Limpiar: quitar espacios, guiones, paréntesis
-    telefono_limpio = re.sub(r'[\s\-\(\)]', '', telefono.strip())
+    # Limpiar: quitar espacios, guiones, paréntesis (sin regex si ya viene solo con dígitos)
+    telefono_limpio = telefono.strip()
+    if not telefono_limpio.lstrip('+').isdigit():
+        telefono_limpio = _SEPARADORES_TELEFONO.sub('', telefono_limpio)
     
     # Remover el + si existe
     if telefono_limpio.startswith('+'):
@@ -150,6 +256,17 @@ def validar_telefono_chileno(telefono: str) -> Tuple[bool, str]:
         return False, f"Longitud de teléfono inválida ({len(telefono_limpio)} dígitos). Debe tener 8, 9, 10 u 11 dígitos"
 
 
+def validar_telefonos(telefonos: Iterable[str]) -> ResultadoLote:
+    """Valida un lote de teléfonos con las mismas reglas y mensajes que validar_telefono_chileno"""
+    validos = bytearray()
+    valores: List[str] = []
+    for telefono in telefonos:
+        valido, valor = validar_telefono_chileno(telefono)
+        validos.append(valido)
+        valores.append(valor)
+    return ResultadoLote(validos, valores)
+
+
 def validar_complejidad_password(password: str) -> Tuple[bool, str]:
     """
     Valida la complejidad de una contraseña.
@@ -174,13 +291,13 @@ def validar_complejidad_password(password: str) -> Tuple[bool, str]:
     if len(password) < 8:
         return False, "La contraseña debe tener al menos 8 caracteres"
     
-    if not re.search(r'[A-Z]', password):
+    if not _MAYUSCULA.search(password):
         return False, "La contraseña debe contener al menos una letra mayúscula"
     
-    if not re.search(r'[a-z]', password):
+    if not _MINUSCULA.search(password):
         return False, "La contraseña debe contener al menos una letra minúscula"
     
-    if not re.search(r'\d', password):
+    if not _DIGITO.search(password):
         return False, "La contraseña debe contener al menos un número"
     
     return True, ""
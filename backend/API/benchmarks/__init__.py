@@ -0,0 +1 @@
+# Benchmarks del backend (ejecutar desde backend/API con python -m benchmarks.<modulo>)
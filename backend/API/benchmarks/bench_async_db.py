@@ -0,0 +1,144 @@
+"""
+Benchmark: endpoints sync (psycopg2 + threadpool) vs. async (asyncpg) con alta concurrencia
+
+Levanta uvicorn en este proceso con dos endpoints que hacen la misma consulta
+(`SELECT pg_sleep(...)`, simula una consulta que espera a PostgreSQL):
+- /sync: `def` con sesión sync; FastAPI lo despacha al threadpool (40 hilos)
+- /async: `async def` con AsyncSession; la espera no ocupa hilos
+
+Ambos engines usan el mismo tamaño de pool, así que la diferencia viene de
+cuántas peticiones puede tener esperando un solo worker. Para cada nivel de
+concurrencia mide peticiones/s y latencia. Requiere PostgreSQL (DATABASE_URL)
+con max_connections mayor que --pool.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_async_db --concurrencia 50 200 500 --pool 80
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import ASYNC_DATABASE_URL, DATABASE_URL
+
+CONSULTA = text("SELECT pg_sleep(:segundos)")
+
+
+def crear_app(pool: int, latencia: float) -> FastAPI:
+    engine = create_engine(DATABASE_URL, pool_size=pool, max_overflow=0, pool_timeout=120)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=pool, max_overflow=0, pool_timeout=120)
+    Sesion = sessionmaker(bind=engine)
+    SesionAsync = async_sessionmaker(async_engine)
+
+    def get_db():
+        with Sesion() as db:
+            yield db
+
+    async def get_async_db():
+        async with SesionAsync() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    def endpoint_sync(db=Depends(get_db)):
+        db.execute(CONSULTA, {"segundos": latencia})
+        return {"ok": True}
+
+    @app.get("/async")
+    async def endpoint_async(db=Depends(get_async_db)):
+        await db.execute(CONSULTA, {"segundos": latencia})
+        return {"ok": True}
+
+    @app.on_event("shutdown")
+    async def cerrar():
+        engine.dispose()
+        await async_engine.dispose()
+
+    return app
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def carga(url: str, ruta: str, concurrencia: int, peticiones: int):
+    """Latencias (ms) y segundos totales de `peticiones` con `concurrencia` en vuelo"""
+    latencias = []
+    errores = 0
+    semaforo = asyncio.Semaphore(concurrencia)
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=120) as http:
+        async def una():
+            nonlocal errores
+            async with semaforo:
+                inicio = time.perf_counter()
+                respuesta = await http.get(ruta)
+                if respuesta.status_code != 200:
+                    errores += 1
+                latencias.append((time.perf_counter() - inicio) * 1e3)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(una() for _ in range(peticiones)))
+        return latencias, time.perf_counter() - inicio, errores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[50, 200, 500])
+    parser.add_argument("--pool", type=int, default=80, help="Conexiones de cada engine")
+    parser.add_argument("--latencia-ms", type=float, default=20.0, help="Duración de la consulta simulada")
+    parser.add_argument("--rondas", type=int, default=5, help="Peticiones por cliente concurrente")
+    args = parser.parse_args()
+
+    try:
+        with create_engine(DATABASE_URL).connect():
+            pass
+    except OperationalError as e:
+        print(f"PostgreSQL no disponible: {e.orig}")
+        return
+
+    puerto = _puerto_libre()
+    app = crear_app(args.pool, args.latencia_ms / 1000)
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning"))
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.05)
+    url = f"http://127.0.0.1:{puerto}"
+
+    # Calentar ambos pools
+    asyncio.run(carga(url, "/sync", 10, 20))
+    asyncio.run(carga(url, "/async", 10, 20))
+
+    print(f"consulta de {args.latencia_ms:.0f} ms, pool de {args.pool} conexiones por engine\n")
+    print(f"{'concurrencia':>12}{'endpoint':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errores':>9}")
+    for concurrencia in args.concurrencia:
+        for ruta in ("/sync", "/async"):
+            latencias, total, errores = asyncio.run(
+                carga(url, ruta, concurrencia, concurrencia * args.rondas)
+            )
+            latencias.sort()
+            p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+            print(f"{concurrencia:>12}{ruta:>10}{len(latencias) / total:>10.0f}"
+                  f"{statistics.median(latencias):>10.1f}{p99:>10.1f}{errores:>9}")
+
+    servidor.should_exit = True
+    hilo.join(10)
+
+
+if __name__ == "__main__":
+    main()
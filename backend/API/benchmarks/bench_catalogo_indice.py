@@ -0,0 +1,147 @@
+"""
+Benchmark del índice de catálogo (GET /productos)
+
+Genera un catálogo sintético, construye el índice y mide la latencia de
+consultas típicas comparándolas con un recorrido lineal de la lista.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_catalogo_indice --productos 100000
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from app.services.catalogo_indice import IndiceCatalogo, tokenizar, normalizar_texto
+
+CATEGORIAS = ["Tecnología", "Libros", "Deportes", "Hogar", "Ropa", "Papelería", "Música", "Salud"]
+SILABAS = ["ca", "lo", "ma", "ti", "re", "no", "su", "pa", "de", "ri", "ven", "tor", "mar", "sol", "bra", "que"]
+
+
+def generar_vocabulario(n: int, rnd: random.Random):
+    """Palabras sintéticas distintas; el índice en la lista es su rango de frecuencia"""
+    vistas = set()
+    vocabulario = []
+    while len(vocabulario) < n:
+        palabra = "".join(rnd.choices(SILABAS, k=rnd.randint(2, 4)))
+        if palabra not in vistas:
+            vistas.add(palabra)
+            vocabulario.append(palabra)
+    return vocabulario
+
+
+_rnd = random.Random(42)
+VOCABULARIO = generar_vocabulario(20000, _rnd)
+# Distribución de Zipf: la palabra de rango r aparece con frecuencia ~ 1/r
+_PESOS_ACUMULADOS = list(itertools.accumulate(1 / r for r in range(1, len(VOCABULARIO) + 1)))
+
+
+def generar_productos(n: int, semilla: int = 42):
+    """Catálogo sintético con vocabulario Zipf y distribución de precios realista"""
+    rnd = random.Random(semilla)
+    productos = []
+    for i in range(1, n + 1):
+        nombre = rnd.choices(VOCABULARIO, cum_weights=_PESOS_ACUMULADOS, k=3)
+        descripcion = rnd.choices(VOCABULARIO, cum_weights=_PESOS_ACUMULADOS, k=15)
+        productos.append({
+            "id": i,
+            "nombre": " ".join(nombre).title() + f" {i % 5000}",
+            "descripcion": " ".join(descripcion).capitalize(),
+            "precio": float(rnd.randint(1, 2000) * 500),
+            "categoria": rnd.choice(CATEGORIAS),
+            "stock": rnd.randint(0, 100),
+            "rating": round(rnd.uniform(1, 5), 1),
+        })
+    return productos
+
+
+def buscar_lineal(productos, q=None, categoria=None, precio_min=None, precio_max=None,
+                  orden="id", skip=0, limit=20):
+    """Implementación de referencia: recorrido completo de la lista"""
+    tokens = tokenizar(q)
+    resultado = []
+    for p in productos:
+        if categoria and normalizar_texto(p["categoria"]) != normalizar_texto(categoria):
+            continue
+        if precio_min is not None and p["precio"] < precio_min:
+            continue
+        if precio_max is not None and p["precio"] > precio_max:
+            continue
+        if tokens:
+            texto = set(tokenizar(p["nombre"])) | set(tokenizar(p["descripcion"]))
+            if not all(t in texto for t in tokens[:-1]):
+                continue
+            ultimo = tokens[-1]
+            if len(ultimo) < 3 and ultimo not in texto:
+                continue
+            if not any(t.startswith(ultimo) for t in texto):
+                continue
+        resultado.append(p)
+    claves = {
+        "precio_asc": lambda p: p["precio"], "precio_desc": lambda p: -p["precio"],
+        "rating_asc": lambda p: p["rating"], "rating_desc": lambda p: -p["rating"],
+    }
+    if orden in claves:
+        resultado.sort(key=claves[orden])
+    return len(resultado), resultado[skip:skip + limit]
+
+
+# Consultas sobre palabras de distinta frecuencia (rango 0 = la más común)
+CONSULTAS = {
+    "sin filtros": {},
+    "pagina profunda": {"skip": 50000, "limit": 20},
+    "texto frecuente": {"q": VOCABULARIO[5]},
+    "texto medio": {"q": VOCABULARIO[300]},
+    "texto + prefijo": {"q": f"{VOCABULARIO[20]} {VOCABULARIO[60][:3]}"},
+    "texto precio_asc": {"q": VOCABULARIO[50], "orden": "precio_asc"},
+    "categoria + precio_desc": {"categoria": "libros", "orden": "precio_desc"},
+    "rango precio": {"precio_min": 10000, "precio_max": 20000, "orden": "precio_asc"},
+    "texto + categoria + rating": {"q": VOCABULARIO[30], "categoria": "tecnologia", "orden": "rating_desc"},
+    "todo combinado": {"q": f"{VOCABULARIO[10]} {VOCABULARIO[80]}", "categoria": "hogar",
+                       "precio_min": 50000, "precio_max": 500000, "orden": "precio_asc"},
+}
+
+
+def medir(funcion, repeticiones: int):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1e6)
+    tiempos.sort()
+    return statistics.median(tiempos), tiempos[int(len(tiempos) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--productos", type=int, default=100000)
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--sin-lineal", action="store_true", help="No medir el recorrido lineal")
+    args = parser.parse_args()
+
+    productos = generar_productos(args.productos)
+    inicio = time.perf_counter()
+    indice = IndiceCatalogo(productos)
+    print(f"Índice de {len(indice)} productos construido en {time.perf_counter() - inicio:.2f}s "
+          f"({len(indice.vocabulario)} tokens)\n")
+
+    print(f"{'consulta':<28}{'total':>8}{'p50 µs':>10}{'p99 µs':>10}{'lineal p50 µs':>16}")
+    for nombre, params in CONSULTAS.items():
+        total, pagina = indice.buscar(**params)
+        ref_total, ref_pagina = buscar_lineal(productos, **params)
+        # Los totales deben coincidir; el orden solo difiere en empates
+        assert total == ref_total, (nombre, total, ref_total)
+        if params.get("orden", "id") == "id":
+            assert [p["id"] for p in pagina] == [p["id"] for p in ref_pagina], nombre
+
+        p50, p99 = medir(lambda: indice.buscar(**params), args.repeticiones)
+        lineal = "-"
+        if not args.sin_lineal:
+            lineal_p50, _ = medir(lambda: buscar_lineal(productos, **params), 3)
+            lineal = f"{lineal_p50:,.0f}"
+        print(f"{nombre:<28}{total:>8}{p50:>10.1f}{p99:>10.1f}{lineal:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: costo por intento del límite de login
+
+Mide verificaciones por segundo del limitador con el almacén en memoria y con
+el archivo SQLite compartido, usando muchas claves distintas (IPs y usernames
+aleatorios) para incluir el costo de la LRU, y la compara con el costo de una
+verificación bcrypt, que es lo que el límite evita.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_limite_intentos --intentos 200000 --claves 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.services.hash_service import pwd_context
+from app.services.limite_service import (
+    AlmacenMemoria, AlmacenSQLite, LimitadorIntentos, LimiteExcedidoError, Regla
+)
+
+
+def medir(limitador: LimitadorIntentos, regla: Regla, claves, intentos: int):
+    rechazados = 0
+    inicio = time.perf_counter()
+    for i in range(intentos):
+        try:
+            limitador.verificar(regla, claves[i % len(claves)])
+        except LimiteExcedidoError:
+            rechazados += 1
+    return intentos / (time.perf_counter() - inicio), rechazados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--intentos", type=int, default=200000)
+    parser.add_argument("--claves", type=int, default=50000)
+    args = parser.parse_args()
+
+    rnd = random.Random(7)
+    claves = [f"10.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(256)}" for _ in range(args.claves)]
+    regla = Regla("bench", 5, 60)
+
+    hash_prueba = pwd_context.hash("Clave-Segura-123")
+    inicio = time.perf_counter()
+    pwd_context.verify("otra", hash_prueba)
+    bcrypt_ms = (time.perf_counter() - inicio) * 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        almacenes = (
+            ("memoria", AlmacenMemoria(), args.intentos),
+            # SQLite confirma cada intento en disco: se mide con menos intentos
+            ("sqlite", AlmacenSQLite(os.path.join(tmp, "limites.db"), regla.ventana), args.intentos // 10),
+        )
+        print(f"{args.claves} claves, límite {regla.limite}/{regla.ventana:.0f}s; bcrypt: {bcrypt_ms:.1f} ms por intento\n")
+        print(f"{'almacén':<10}{'intentos/s':>14}{'µs/intento':>12}{'rechazados':>12}")
+        for nombre, almacen, intentos in almacenes:
+            por_segundo, rechazados = medir(LimitadorIntentos(almacen), regla, claves, intentos)
+            print(f"{nombre:<10}{por_segundo:>14,.0f}{1e6 / por_segundo:>12.1f}{rechazados:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Prueba de carga: latencia de un endpoint no relacionado durante una avalancha de logins
+
+Levanta uvicorn en este proceso con una aplicación mínima que tiene:
+- /login-bloqueante: bcrypt directo dentro de `async def` (comportamiento anterior)
+- /login: bcrypt a través del pool de hashing (servicio_hash)
+- /ping: endpoint trivial cuya latencia se mide
+
+Para cada escenario lanza N clientes que hacen login sin pausa y mide p50/p99
+de /ping. No necesita base de datos.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_login_carga --clientes 16 --segundos 5
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from app.services.hash_service import pwd_context, servicio_hash
+
+HASH = pwd_context.hash("Clave-Segura-123")
+
+app = FastAPI()
+
+
+@app.post("/login-bloqueante")
+async def login_bloqueante():
+    return {"ok": pwd_context.verify("Clave-Segura-123", HASH)}
+
+
+@app.post("/login")
+async def login():
+    valida, _ = await servicio_hash.verificar("Clave-Segura-123", HASH)
+    return {"ok": valida}
+
+
+@app.get("/ping")
+async def ping():
+    return {"ok": True}
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def escenario(url: str, ruta_login, clientes: int, segundos: float):
+    """Latencias de /ping (ms) y logins completados"""
+    fin = time.monotonic() + segundos
+    logins = 0
+
+    async def cliente_login(http):
+        nonlocal logins
+        while time.monotonic() < fin:
+            await http.post(ruta_login)
+            logins += 1
+
+    async def sonda(http):
+        latencias = []
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            await http.get("/ping")
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            await asyncio.sleep(0.01)
+        return latencias
+
+    limites = httpx.Limits(max_connections=clientes + 2)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60) as http:
+        tareas = [asyncio.create_task(cliente_login(http)) for _ in range(clientes if ruta_login else 0)]
+        latencias = await sonda(http)
+        await asyncio.gather(*tareas)
+    return latencias, logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=16, help="Clientes haciendo login en paralelo")
+    parser.add_argument("--segundos", type=float, default=5.0)
+    args = parser.parse_args()
+
+    puerto = _puerto_libre()
+    servidor = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=puerto, log_level="warning"))
+    hilo = threading.Thread(target=servidor.run, daemon=True)
+    hilo.start()
+    while not servidor.started:
+        time.sleep(0.05)
+    url = f"http://127.0.0.1:{puerto}"
+
+    print(f"{args.clientes} clientes, {args.segundos:.0f}s por escenario, "
+          f"{servicio_hash.workers} hilos de hashing\n")
+    print(f"{'escenario':<20}{'ping p50 ms':>12}{'ping p99 ms':>12}{'logins/s':>10}")
+    for nombre, ruta in (("sin carga", None), ("bcrypt en el loop", "/login-bloqueante"), ("pool de hashing", "/login")):
+        latencias, logins = asyncio.run(escenario(url, ruta, args.clientes, args.segundos))
+        latencias.sort()
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        print(f"{nombre:<20}{statistics.median(latencias):>12.1f}{p99:>12.1f}{logins / args.segundos:>10.1f}")
+
+    servidor.should_exit = True
+    hilo.join(5)
+
+
+if __name__ == "__main__":
+    main()
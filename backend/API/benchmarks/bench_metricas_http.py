@@ -0,0 +1,107 @@
+"""
+Benchmark: costo por petición de los middlewares de métricas
+
+Llama directamente (sin HTTP ni FastAPI) a una app ASGI mínima que fija la
+ruta en el scope y responde vacío, con y sin MiddlewareMetricasHTTP y
+MiddlewareMetricasDB, y reporta los µs por petición que agrega cada
+configuración. Las configuraciones se alternan en cada repetición para que el
+ruido afecte a todas por igual. También mide observar() aislado y el costo de
+exportar /metrics con --series rutas.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_metricas_http --peticiones 50000
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.metricas_db_service import MiddlewareMetricasDB
+from app.services.metricas_service import MetricasHTTP, MiddlewareMetricasHTTP, RegistroMetricas
+
+
+class _Ruta:
+    path = "/documentos/{documento_id}"
+
+
+async def app_minima(scope, receive, send):
+    """Lo que hace el router al resolver la ruta, sin el costo del endpoint"""
+    scope["route"] = _Ruta
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def crear_app(middlewares):
+    app = app_minima
+    for middleware in middlewares:
+        app = middleware(app)
+    return app
+
+
+async def medir(app, peticiones: int) -> float:
+    """µs por petición llamando a la app ASGI directamente"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/documentos/abc", "raw_path": b"/documentos/abc",
+        "root_path": "", "query_string": b"", "headers": [], "client": ("127.0.0.1", 1),
+        "server": ("127.0.0.1", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensaje):
+        pass
+
+    for _ in range(1000):
+        await app(dict(scope), receive, send)
+    inicio = time.perf_counter()
+    for _ in range(peticiones):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - inicio) / peticiones * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peticiones", type=int, default=50000)
+    parser.add_argument("--series", type=int, default=25, help="Rutas distintas para medir la exportación")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Se reporta la mejor")
+    args = parser.parse_args()
+
+    configuraciones = [
+        ("sin middlewares", []),
+        ("MiddlewareMetricasHTTP", [MiddlewareMetricasHTTP]),
+        ("MiddlewareMetricasDB", [MiddlewareMetricasDB]),
+        ("ambos", [MiddlewareMetricasDB, MiddlewareMetricasHTTP]),
+    ]
+    resultados = {nombre: float("inf") for nombre, _ in configuraciones}
+    for _ in range(args.repeticiones):
+        for nombre, middlewares in configuraciones:
+            us = asyncio.run(medir(crear_app(middlewares), args.peticiones))
+            resultados[nombre] = min(resultados[nombre], us)
+
+    base = resultados["sin middlewares"]
+    print(f"{args.peticiones} peticiones por configuración (mejor de {args.repeticiones})\n")
+    print(f"{'configuración':<26}{'µs/petición':>13}{'agregado':>11}")
+    for nombre, us in resultados.items():
+        print(f"{nombre:<26}{us:>13.2f}{us - base:>+11.2f}")
+
+    metricas = MetricasHTTP()
+    n = 1_000_000
+    inicio = time.perf_counter()
+    for _ in range(n):
+        metricas.observar("GET", "/documentos/{documento_id}", 200, 0.003)
+    print(f"\nobservar() aislado: {(time.perf_counter() - inicio) / n * 1e9:.0f} ns")
+
+    for i in range(args.series):
+        for estado in (200, 404, 500):
+            metricas.observar("GET", f"/ruta_{i}", estado, 0.01)
+    registro = RegistroMetricas(directorio="")
+    registro.registrar(metricas.familias)
+    inicio = time.perf_counter()
+    texto = registro.exportar()
+    print(f"exportar {args.series * 3} series: {(time.perf_counter() - inicio) * 1e3:.2f} ms "
+          f"({len(texto.splitlines())} líneas)")
+
+
+if __name__ == "__main__":
+    main()
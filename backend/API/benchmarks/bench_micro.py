@@ -0,0 +1,279 @@
+"""
+Microbenchmarks de las funciones puras que están en el camino de las peticiones
+
+Mide por separado, con entradas realistas (válidas e inválidas mezcladas):
+validadores de RUT, teléfono y contraseña, create_access_token y la
+validación del JWT, los schemas de registro, checkout y la página de
+/usuarios/me/compras, y generar_pdf_documento. Por cada caso reporta µs de
+CPU por llamada (mejor de --repeticiones lotes de al menos --lote-ms,
+alternando los casos) y el pico de memoria asignada por llamada (tracemalloc,
+en una pasada aparte para que no afecte el tiempo).
+
+Con --guardar escribe la línea base; sin él compara contra ella y termina con
+código 1 si algún caso empeora más que --umbral (CPU) o --umbral-memoria
+(pico). Los casos que superan el umbral de CPU se vuelven a medir antes de
+fallar, para no reportar ruido. La línea base depende de la máquina: generarla
+en la misma donde se compara, antes del cambio (y con la máquina en reposo).
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_micro --guardar
+    python -m benchmarks.bench_micro --umbral 0.10
+    python -m benchmarks.bench_micro --casos rut telefono
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from app.auth import _decodificar_token, create_access_token
+from app.schemas import CheckoutRequest, CompraResponse, UsuarioCreate
+from app.services.documento_service import generar_pdf_documento
+from app.validators import validar_complejidad_password, validar_rut_chileno, validar_telefono_chileno
+from benchmarks.bench_render_pdf import generar_snapshots
+
+LINEA_BASE = os.path.join(os.path.dirname(__file__), "resultados", "micro_base.json")
+
+
+@dataclass
+class Caso:
+    nombre: str
+    funcion: Callable[[Any], Any]
+    entradas: List[Any]
+
+
+# ==================== ENTRADAS ====================
+
+def _dv(numero: int) -> str:
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - suma % 11
+    return "0" if dv == 11 else "K" if dv == 10 else str(dv)
+
+
+def ruts(rnd: random.Random, n: int) -> List[str]:
+    """Como llegan de los formularios: con y sin puntos, k minúscula y ~10% con DV incorrecto"""
+    salida = []
+    for _ in range(n):
+        numero = rnd.randint(5_000_000, 26_000_000)
+        dv = _dv(numero)
+        if rnd.random() < 0.1:
+            dv = "0" if dv != "0" else "1"
+        formato = rnd.random()
+        if formato < 0.5:
+            salida.append(f"{numero:,}".replace(",", ".") + f"-{dv}")
+        elif formato < 0.8:
+            salida.append(f"{numero}-{dv.lower()}")
+        else:
+            salida.append(f"{numero}{dv}")
+    return salida
+
+
+def telefonos(rnd: random.Random, n: int) -> List[str]:
+    formatos = ["+569{0}", "569{0}", "9{0}", "+56 9 {1} {2}", "(9) {1}-{2}", "{0}", "+56 9 {1}"]
+    salida = []
+    for _ in range(n):
+        numero = f"{rnd.randint(10_000_000, 99_999_999)}"
+        salida.append(rnd.choice(formatos).format(numero, numero[:4], numero[4:]))
+    return salida
+
+
+def passwords(rnd: random.Random, n: int) -> List[str]:
+    ejemplos = ["Clave-Segura-123", "UnabTaller2025", "corta1A", "sinmayusculas123", "SINMINUSCULAS123",
+                "SinNumerosNunca", "Contraseña-Muy-Larga-Con-Ñandú-2025"]
+    return [rnd.choice(ejemplos) for _ in range(n)]
+
+
+def registros(rnd: random.Random, n: int) -> List[Dict[str, Any]]:
+    return [{
+        "email": f"usuario{i}@unab.cl", "username": f"usuario{i}", "password": "Clave-Segura-123",
+        "nombre": "Ana", "apellido": "Pérez", "rut": r, "telefono": t,
+    } for i, (r, t) in enumerate(zip(ruts(rnd, n), telefonos(rnd, n)))]
+
+
+def checkouts(rnd: random.Random, n: int, lineas: int = 10) -> List[Dict[str, Any]]:
+    return [{
+        "rut": r, "email": "ana@unab.cl", "telefono": t, "metodo_envio_id": 1,
+        "direccion": {"direccion": "Av. República 239", "comuna": "Santiago", "ciudad": "Santiago"},
+        "productos": [{"producto_id": rnd.randint(1, 10), "cantidad": rnd.randint(1, 3),
+                       "precio": float(rnd.randint(1, 200) * 990)} for _ in range(lineas)],
+    } for r, t in zip(ruts(rnd, n), telefonos(rnd, n))]
+
+
+def paginas_compras(rnd: random.Random, n: int, compras: int = 20, lineas: int = 4) -> List[List[Dict[str, Any]]]:
+    """Páginas de /usuarios/me/compras (los objetos ORM se leen por atributo; aquí dicts con los mismos campos)"""
+    ahora = datetime(2025, 6, 1, 12, 0, 0)
+    paginas = []
+    for _ in range(n):
+        pagina = []
+        for c in range(compras):
+            documento_id = uuid.UUID(int=rnd.getrandbits(128))
+            fecha = ahora - timedelta(days=c)
+            detalles = [{
+                "id": uuid.UUID(int=rnd.getrandbits(128)), "documento_id": documento_id,
+                "producto": f"Producto {rnd.randint(1, 500)}", "precio": float(rnd.randint(1, 200) * 990),
+                "cantidad": rnd.randint(1, 3), "fecha_creacion": fecha, "fecha_actualizacion": fecha,
+                "metadata_json": {"id": rnd.randint(1, 10), "categoria": "Tecnología", "rating": 4.5,
+                                  "imagenes": ["/img/a.jpg", "/img/b.jpg"], "caracteristicas": ["A", "B", "C"]},
+            } for _ in range(lineas)]
+            pagina.append({
+                "id": documento_id, "estado": "completado", "monto_total": sum(d["precio"] for d in detalles),
+                "fecha_creacion": fecha, "fecha_actualizacion": fecha, "detalles": detalles,
+                "ruta_documento": f"2025/06/01/{documento_id}.pdf", "pdf_estado": "listo",
+            })
+        paginas.append(pagina)
+    return paginas
+
+
+def casos(directorio_pdf: str) -> List[Caso]:
+    rnd = random.Random(2025)
+    tokens = [create_access_token({"sub": f"usuario{i}", "rol": "user"}) for i in range(50)]
+    compras_adapter = TypeAdapter(List[CompraResponse])
+    return [
+        Caso("validar_rut_chileno", validar_rut_chileno, ruts(rnd, 500)),
+        Caso("validar_telefono_chileno", validar_telefono_chileno, telefonos(rnd, 500)),
+        Caso("validar_complejidad_password", validar_complejidad_password, passwords(rnd, 500)),
+        Caso("create_access_token", lambda i: create_access_token({"sub": f"usuario{i}", "rol": "user"}),
+             list(range(50))),
+        Caso("jwt.decode (_decodificar_token)", _decodificar_token, tokens),
+        Caso("UsuarioCreate", UsuarioCreate.model_validate, registros(rnd, 100)),
+        Caso("CheckoutRequest (10 líneas)", CheckoutRequest.model_validate, checkouts(rnd, 100)),
+        Caso("página de compras (20x4) validar+json",
+             lambda pagina: compras_adapter.dump_json(compras_adapter.validate_python(pagina), by_alias=True),
+             paginas_compras(rnd, 10)),
+        Caso("generar_pdf_documento (5 líneas)",
+             lambda s: generar_pdf_documento(s.documento, s.usuario, s.detalles, base_path=directorio_pdf),
+             generar_snapshots(10, 5)),
+    ]
+
+
+# ==================== MEDICIÓN ====================
+
+def calibrar(caso: Caso, lote_ms: float) -> int:
+    """Pasadas por las entradas que llenan un lote (la primera pasada sirve de calentamiento)"""
+    inicio = time.process_time()
+    for entrada in caso.entradas:
+        caso.funcion(entrada)
+    pasada = max(time.process_time() - inicio, 1e-6)
+    return max(1, int(lote_ms / 1e3 / pasada))
+
+
+def cpu_por_llamada(caso: Caso, pasadas: int) -> float:
+    """µs de CPU por llamada en un lote"""
+    funcion, entradas = caso.funcion, caso.entradas
+    inicio = time.process_time()
+    for _ in range(pasadas):
+        for entrada in entradas:
+            funcion(entrada)
+    return (time.process_time() - inicio) / (pasadas * len(entradas)) * 1e6
+
+
+def pico_por_llamada(caso: Caso, muestras: int = 20) -> float:
+    """KiB: mayor pico de memoria asignada durante una llamada (por encima de lo que ya estaba asignado)"""
+    tracemalloc.start()
+    try:
+        pico = 0
+        for entrada in caso.entradas[:muestras]:
+            actual, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            caso.funcion(entrada)
+            pico = max(pico, tracemalloc.get_traced_memory()[1] - actual)
+    finally:
+        tracemalloc.stop()
+    return pico / 1024
+
+
+def regresiones(base: Dict[str, Dict[str, float]], actual: Dict[str, Dict[str, float]],
+                umbral: float, umbral_memoria: float) -> List[str]:
+    problemas = []
+    for nombre, medida in actual.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            continue
+        if medida["cpu_us"] > anterior["cpu_us"] * (1 + umbral):
+            problemas.append(f"{nombre}: CPU {anterior['cpu_us']:.2f} -> {medida['cpu_us']:.2f} µs")
+        # 1 KiB de holgura: en picos pequeños el redondeo de tracemalloc pesa mucho
+        if medida["pico_kib"] > anterior["pico_kib"] * (1 + umbral_memoria) + 1:
+            problemas.append(f"{nombre}: memoria {anterior['pico_kib']:.1f} -> {medida['pico_kib']:.1f} KiB")
+    return problemas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--casos", nargs="+", help="Solo los casos cuyo nombre contenga alguno de estos textos")
+    parser.add_argument("--repeticiones", type=int, default=7, help="Lotes por caso; se reporta el mejor")
+    parser.add_argument("--lote-ms", type=float, default=200, help="Duración mínima de cada lote")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--guardar", action="store_true", help="Guardar esta corrida como línea base")
+    parser.add_argument("--umbral", type=float, default=0.20, help="Aumento de CPU tolerado (0.20 = 20%%)")
+    parser.add_argument("--umbral-memoria", type=float, default=0.10, help="Aumento del pico de memoria tolerado")
+    args = parser.parse_args()
+
+    base: Dict[str, Dict[str, float]] = {}
+    if not args.guardar and os.path.exists(args.linea_base):
+        with open(args.linea_base) as archivo:
+            base = json.load(archivo)["casos"]
+
+    actual: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as directorio_pdf:
+        seleccion = [c for c in casos(directorio_pdf)
+                     if not args.casos or any(texto.lower() in c.nombre.lower() for texto in args.casos)]
+        pasadas = [calibrar(caso, args.lote_ms) for caso in seleccion]
+        # Alternar los casos en cada repetición para que el ruido de la máquina afecte a todos por igual
+        cpu = [float("inf")] * len(seleccion)
+        for _ in range(args.repeticiones):
+            for i, caso in enumerate(seleccion):
+                cpu[i] = min(cpu[i], cpu_por_llamada(caso, pasadas[i]))
+        # Confirmar las posibles regresiones de CPU con más lotes
+        for i, caso in enumerate(seleccion):
+            anterior = base.get(caso.nombre)
+            if anterior and cpu[i] > anterior["cpu_us"] * (1 + args.umbral):
+                for _ in range(args.repeticiones * 2):
+                    cpu[i] = min(cpu[i], cpu_por_llamada(caso, pasadas[i]))
+
+        print(f"{'caso':<40}{'CPU µs':>11}{'base':>11}{'pico KiB':>10}{'base':>9}")
+        for caso, cpu_us in zip(seleccion, cpu):
+            medida = {"cpu_us": round(cpu_us, 3), "pico_kib": round(pico_por_llamada(caso), 2)}
+            actual[caso.nombre] = medida
+            anterior = base.get(caso.nombre, {})
+            print(f"{caso.nombre:<40}{medida['cpu_us']:>11.2f}{anterior.get('cpu_us', float('nan')):>11.2f}"
+                  f"{medida['pico_kib']:>10.1f}{anterior.get('pico_kib', float('nan')):>9.1f}")
+
+    if args.guardar:
+        os.makedirs(os.path.dirname(os.path.abspath(args.linea_base)), exist_ok=True)
+        with open(args.linea_base, "w") as archivo:
+            json.dump({
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "maquina": platform.node(),
+                "casos": actual,
+            }, archivo, indent=2, ensure_ascii=False)
+        print(f"\nLínea base guardada en {args.linea_base}")
+        return
+
+    if not base:
+        print(f"\nSin línea base en {args.linea_base}; ejecutar primero con --guardar")
+        return
+    problemas = regresiones(base, actual, args.umbral, args.umbral_memoria)
+    if problemas:
+        print(f"\n{len(problemas)} regresiones (umbral CPU {args.umbral:.0%}, memoria {args.umbral_memoria:.0%}):")
+        for problema in problemas:
+            print(f"  {problema}")
+        sys.exit(1)
+    print("\nSin regresiones")
+
+
+if __name__ == "__main__":
+    main()
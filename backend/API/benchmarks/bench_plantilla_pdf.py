@@ -0,0 +1,242 @@
+"""
+Microbenchmark de la plantilla precompilada de comprobantes (ReceiptTemplate)
+
+Mide el tiempo de CPU por comprobante renderizado en memoria:
+- "anterior": el cuerpo de generar_pdf_documento antes de ReceiptTemplate
+  (copiado aquí como referencia, sin la parte de carpetas y archivo), que
+  rehacía la hoja de estilos, los TableStyle y el pie en cada llamada
+- "plantilla nueva": renderizar_pdf con una ReceiptTemplate construida en cada
+  render (el costo de la plantilla sin reutilizarla)
+- "plantilla compartida": renderizar_pdf con obtener_plantilla(), lo que usa
+  la aplicación
+
+Antes de medir verifica, con rl_config.invariant, que la implementación
+anterior y la actual generen exactamente los mismos bytes.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_plantilla_pdf --comprobantes 300
+"""
+import argparse
+import io
+import statistics
+import time
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from app.services.documento_service import ReceiptTemplate, obtener_plantilla, renderizar_pdf
+from benchmarks.bench_render_pdf import generar_snapshots
+
+
+def _estilo_clave_valor():
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5F5F5')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+    ])
+
+
+def renderizar_anterior(destino, documento, usuario, detalles) -> None:
+    """generar_pdf_documento antes de ReceiptTemplate (el mismo story, escrito en `destino`)"""
+    doc = SimpleDocTemplate(destino, pagesize=A4)
+    story = []
+    styles = getSampleStyleSheet()
+
+    titulo_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=20,
+                                  textColor=colors.HexColor('#002B5C'), spaceAfter=30, alignment=TA_CENTER)
+    subtitulo_style = ParagraphStyle('CustomSubtitle', parent=styles['Normal'], fontSize=12,
+                                     textColor=colors.HexColor('#666666'), alignment=TA_CENTER, spaceAfter=20)
+
+    story.append(Paragraph("COMPROBANTE DE COMPRA", titulo_style))
+    story.append(Paragraph("Universidad Andrés Bello", subtitulo_style))
+    story.append(Spacer(1, 0.5*cm))
+
+    info_table = Table([
+        ['Número de Compra:', str(documento.id)],
+        ['Fecha:', documento.fecha_creacion.strftime('%d/%m/%Y %H:%M:%S')],
+        ['Estado:', documento.estado.upper()],
+    ], colWidths=[5*cm, 10*cm])
+    info_table.setStyle(_estilo_clave_valor())
+    story.append(info_table)
+    story.append(Spacer(1, 0.5*cm))
+
+    story.append(Paragraph("<b>DATOS DEL COMPRADOR</b>", styles['Heading2']))
+    comprador_data = [
+        ['Nombre:', f"{usuario.nombre or ''} {usuario.apellido or ''}".strip() or 'N/A'],
+        ['Email:', usuario.email],
+    ]
+    if usuario.rut:
+        comprador_data.append(['RUT:', usuario.rut])
+    if usuario.telefono:
+        comprador_data.append(['Teléfono:', usuario.telefono])
+    comprador_table = Table(comprador_data, colWidths=[5*cm, 10*cm])
+    comprador_table.setStyle(_estilo_clave_valor())
+    story.append(comprador_table)
+    story.append(Spacer(1, 0.5*cm))
+
+    if documento.metadata_json:
+        metadata = documento.metadata_json
+        if 'direccion' in metadata or 'metodo_envio' in metadata:
+            story.append(Paragraph("<b>INFORMACIÓN DE ENVÍO</b>", styles['Heading2']))
+            envio_data = []
+            if 'direccion' in metadata:
+                direccion = metadata['direccion']
+                envio_data.append(['Dirección:', direccion.get('direccion', 'N/A')])
+                if direccion.get('comuna'):
+                    envio_data.append(['Comuna:', direccion['comuna']])
+                if direccion.get('ciudad'):
+                    envio_data.append(['Ciudad:', direccion['ciudad']])
+                if direccion.get('codigo_postal'):
+                    envio_data.append(['Código Postal:', direccion['codigo_postal']])
+            if 'metodo_envio' in metadata:
+                metodo = metadata['metodo_envio']
+                envio_data.append(['Método de Envío:', metodo.get('nombre', 'N/A')])
+                if metodo.get('tiempo'):
+                    envio_data.append(['Tiempo Estimado:', metodo['tiempo']])
+            if envio_data:
+                envio_table = Table(envio_data, colWidths=[5*cm, 10*cm])
+                envio_table.setStyle(_estilo_clave_valor())
+                story.append(envio_table)
+                story.append(Spacer(1, 0.5*cm))
+
+    story.append(Paragraph("<b>DETALLE DE PRODUCTOS</b>", styles['Heading2']))
+    detalle_data = [['Producto', 'Cantidad', 'Precio Unitario', 'Subtotal']]
+    for detalle in detalles:
+        subtotal = (detalle.precio or 0) * (detalle.cantidad or 0)
+        detalle_data.append([
+            detalle.producto,
+            str(detalle.cantidad or 0),
+            f"${detalle.precio:,.0f}" if detalle.precio else "$0",
+            f"${subtotal:,.0f}"
+        ])
+    detalle_table = Table(detalle_data, colWidths=[8*cm, 2*cm, 3*cm, 2*cm])
+    detalle_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#002B5C')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('ALIGN', (3, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F9F9F9')]),
+    ]))
+    story.append(detalle_table)
+    story.append(Spacer(1, 0.5*cm))
+
+    subtotal_productos = sum((d.precio or 0) * (d.cantidad or 0) for d in detalles)
+    costo_envio = documento.metadata_json.get('costo_envio', 0) if documento.metadata_json else 0
+    total = documento.monto_total
+    totales_table = Table([
+        ['Subtotal Productos:', f"${subtotal_productos:,.0f}"],
+        ['Costo de Envío:', f"${costo_envio:,.0f}"],
+        ['TOTAL:', f"${total:,.0f}"],
+    ], colWidths=[10*cm, 5*cm])
+    totales_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, -1), (-1, -1), 12),
+        ('FONTSIZE', (0, 0), (0, -2), 10),
+        ('TEXTCOLOR', (0, -1), (-1, -1), colors.HexColor('#C8102E')),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('LINEBELOW', (0, -2), (-1, -2), 1, colors.grey),
+    ]))
+    story.append(totales_table)
+    story.append(Spacer(1, 1*cm))
+
+    pie_text = """
+    <para align="center">
+    <b>Universidad Andrés Bello</b><br/>
+    Gracias por su compra<br/>
+    Para consultas: contacto@unab.cl<br/>
+    <i>Este es un comprobante de compra, no constituye una factura tributaria.</i>
+    </para>
+    """
+    story.append(Paragraph(pie_text, styles['Normal']))
+    doc.build(story)
+
+
+def verificar(snapshots) -> None:
+    """Misma salida byte a byte (invariant fija fecha de creación e id del PDF)"""
+    anterior_invariant = rl_config.invariant
+    rl_config.invariant = 1
+    try:
+        for snapshot in snapshots:
+            anterior, actual = io.BytesIO(), io.BytesIO()
+            renderizar_anterior(anterior, snapshot.documento, snapshot.usuario, snapshot.detalles)
+            renderizar_pdf(actual, snapshot.documento, snapshot.usuario, snapshot.detalles)
+            assert anterior.getvalue() == actual.getvalue(), "el PDF difiere de la implementación anterior"
+    finally:
+        rl_config.invariant = anterior_invariant
+
+
+def medir(renderizar) -> float:
+    """Milisegundos de CPU de un comprobante"""
+    inicio = time.process_time()
+    renderizar()
+    return (time.process_time() - inicio) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comprobantes", type=int, default=300)
+    parser.add_argument("--lineas", type=int, default=5, help="Productos por comprobante")
+    args = parser.parse_args()
+
+    snapshots = generar_snapshots(args.comprobantes, args.lineas)
+    verificar(snapshots[:20])
+
+    inicio = time.process_time()
+    for _ in range(100):
+        ReceiptTemplate()
+    construir_ms = (time.process_time() - inicio) * 10
+
+    plantilla = obtener_plantilla()
+    variantes = {
+        "anterior": lambda s: renderizar_anterior(io.BytesIO(), s.documento, s.usuario, s.detalles),
+        "plantilla nueva": lambda s: renderizar_pdf(io.BytesIO(), s.documento, s.usuario, s.detalles,
+                                                    plantilla=ReceiptTemplate()),
+        "plantilla compartida": lambda s: renderizar_pdf(io.BytesIO(), s.documento, s.usuario, s.detalles,
+                                                         plantilla=plantilla),
+    }
+    # Calentar imports y cachés de fuentes de ReportLab
+    for snapshot in snapshots[:10]:
+        for renderizar in variantes.values():
+            renderizar(snapshot)
+
+    # Alternar las variantes para que el ruido de la máquina afecte a todas por igual
+    tiempos = {nombre: [] for nombre in variantes}
+    for snapshot in snapshots:
+        for nombre, renderizar in variantes.items():
+            tiempos[nombre].append(medir(lambda: renderizar(snapshot)))
+
+    print(f"{args.comprobantes} comprobantes de {args.lineas} líneas (CPU, ms por comprobante; "
+          f"salida verificada igual a la implementación anterior)")
+    print(f"construir ReceiptTemplate: {construir_ms:.2f} ms\n")
+    print(f"{'':<22}{'p50':>8}{'media':>8}{'p99':>8}")
+    for nombre, valores in tiempos.items():
+        valores = sorted(valores)
+        p99 = valores[min(len(valores) - 1, int(len(valores) * 0.99))]
+        print(f"{nombre:<22}{statistics.median(valores):>8.2f}{statistics.fmean(valores):>8.2f}{p99:>8.2f}")
+    ahorro = 1 - statistics.fmean(tiempos["plantilla compartida"]) / statistics.fmean(tiempos["anterior"])
+    print(f"\nahorro por comprobante contra la implementación anterior: {ahorro:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: renovaciones por segundo con refresh token vs. login con bcrypt
+
+1. CPU por renovación (sin base de datos): HMAC del token presentado y del
+   nuevo + firma del JWT, comparado con bcrypt + firma del JWT.
+2. Renovaciones por segundo de punta a punta contra PostgreSQL (DATABASE_URL):
+   cada hilo mantiene su propia sesión y rota su refresh token en bucle con
+   rotar_refresh_token. Crea un usuario temporal que se elimina al terminar.
+   Se omite con --sin-db.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_refresh_token --hilos 8 --segundos 5
+"""
+import argparse
+import secrets
+import statistics
+import threading
+import time
+import uuid
+
+from sqlalchemy.exc import OperationalError
+
+from app.auth import create_access_token
+from app.database import SessionLocal
+from app.models import Usuario
+from app.services.hash_service import pwd_context
+from app.services.refresh_token_service import _huella, emitir_refresh_token, rotar_refresh_token
+
+
+def por_segundo(funcion, segundos: float = 1.0) -> float:
+    n = 0
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        funcion()
+        n += 1
+    return n / segundos
+
+
+def medir_cpu():
+    hash_prueba = pwd_context.hash("Clave-Segura-123")
+    claims = {"sub": "bench", "uid": str(uuid.uuid4()), "rol": "user"}
+
+    def renovar():
+        _huella(secrets.token_urlsafe(32))
+        _huella(secrets.token_urlsafe(32))
+        create_access_token(claims)
+
+    def login():
+        pwd_context.verify("Clave-Segura-123", hash_prueba)
+        create_access_token(claims)
+
+    rapido = por_segundo(renovar)
+    lento = por_segundo(login, segundos=3.0)
+    print("CPU por operación (1 hilo, sin base de datos)")
+    print(f"  refresh (HMAC + JWT):  {rapido:>10,.0f}/s  {1e6 / rapido:>9.1f} µs")
+    print(f"  login (bcrypt + JWT):  {lento:>10,.1f}/s  {1e6 / lento:>9.1f} µs")
+    print(f"  {rapido / lento:,.0f}x menos CPU por renovación\n")
+
+
+def trabajador(token, fin, resultado, lock):
+    latencias = []
+    with SessionLocal() as db:
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            token, _ = rotar_refresh_token(db, token)
+            latencias.append((time.perf_counter() - inicio) * 1e3)
+    with lock:
+        resultado.extend(latencias)
+
+
+def medir_db(hilos: int, segundos: float):
+    username = f"bench_refresh_{uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        usuario = Usuario(email=f"{username}@bench.local", username=username,
+                          password_hash=pwd_context.hash("Clave-Segura-123"))
+        db.add(usuario)
+        db.flush()
+        usuario_id = usuario.id
+        tokens = [emitir_refresh_token(db, usuario_id) for _ in range(hilos)]
+        db.commit()
+
+    try:
+        latencias, lock = [], threading.Lock()
+        fin = time.monotonic() + segundos
+        threads = [threading.Thread(target=trabajador, args=(t, fin, latencias, lock)) for t in tokens]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        with SessionLocal() as db:
+            db.query(Usuario).filter(Usuario.id == usuario_id).delete()
+            db.commit()
+
+    latencias.sort()
+    p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+    print(f"PostgreSQL, {hilos} hilos, {segundos:.0f}s")
+    print(f"  renovaciones/s: {len(latencias) / segundos:,.0f}")
+    print(f"  latencia p50: {statistics.median(latencias):.2f} ms  p99: {p99:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hilos", type=int, default=8, help="No más que el pool (10 + 20 de overflow)")
+    parser.add_argument("--segundos", type=float, default=5.0)
+    parser.add_argument("--sin-db", action="store_true", help="Solo medir CPU")
+    args = parser.parse_args()
+
+    medir_cpu()
+    if args.sin_db:
+        return
+    try:
+        medir_db(args.hilos, args.segundos)
+    except OperationalError as e:
+        print(f"PostgreSQL no disponible, se omite la medición de punta a punta: {e.orig}")
+
+
+if __name__ == "__main__":
+    main()
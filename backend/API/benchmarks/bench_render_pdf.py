@@ -0,0 +1,94 @@
+"""
+Benchmark del motor de renderizado de comprobantes PDF
+
+Renderiza comprobantes sintéticos con el motor de procesos usando 1, 2, 4 y 8
+procesos (y en el mismo hilo como referencia) y muestra comprobantes por
+segundo. Los archivos se escriben en un directorio temporal.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_render_pdf --comprobantes 200 --procesos 1 2 4 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.services.documento_service import DocumentoPDF, UsuarioPDF, DetallePDF, SnapshotPDF
+from app.services.motor_pdf_service import MotorPDF
+
+
+def generar_snapshots(n: int, lineas: int, semilla: int = 42):
+    """Comprobantes sintéticos con `lineas` productos cada uno"""
+    rnd = random.Random(semilla)
+    usuario = UsuarioPDF(nombre="Ana", apellido="Pérez", email="ana@unab.cl",
+                         rut="12.345.678-5", telefono="+56912345678")
+    snapshots = []
+    for _ in range(n):
+        detalles = tuple(
+            DetallePDF(producto=f"Producto {rnd.randint(1, 500)}",
+                       precio=float(rnd.randint(1, 200) * 990), cantidad=rnd.randint(1, 4))
+            for _ in range(lineas)
+        )
+        subtotal = sum(d.precio * d.cantidad for d in detalles)
+        snapshots.append(SnapshotPDF(
+            documento=DocumentoPDF(
+                id=uuid.UUID(int=rnd.getrandbits(128)),
+                fecha_creacion=datetime(2025, 1, 1, 12, 0, 0),
+                estado="completado",
+                monto_total=subtotal + 5000,
+                metadata_json={
+                    "direccion": {"direccion": "Av. República 239", "comuna": "Santiago", "ciudad": "Santiago"},
+                    "metodo_envio": {"nombre": "Envío Estándar UNAB", "tiempo": "3-5 días"},
+                    "costo_envio": 5000,
+                },
+            ),
+            usuario=usuario,
+            detalles=detalles,
+        ))
+    return snapshots
+
+
+def medir(motor: MotorPDF, snapshots, base_path: str, concurrencia: int) -> float:
+    """Comprobantes por segundo con `concurrencia` llamadores simultáneos"""
+    with ThreadPoolExecutor(max_workers=concurrencia) as hilos:
+        # Calentar el pool (arranque de todos los procesos e imports) fuera de la medición
+        list(hilos.map(lambda s: motor.renderizar(s, base_path), snapshots[:concurrencia * 2]))
+        inicio = time.perf_counter()
+        list(hilos.map(lambda s: motor.renderizar(s, base_path), snapshots))
+    return len(snapshots) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comprobantes", type=int, default=200)
+    parser.add_argument("--lineas", type=int, default=5, help="Productos por comprobante")
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    snapshots = generar_snapshots(args.comprobantes, args.lineas)
+    print(f"{args.comprobantes} comprobantes de {args.lineas} líneas, {os.cpu_count()} CPUs\n")
+    print(f"{'procesos':<12}{'comprob./s':>12}{'speedup':>10}{'cpu ms/render':>16}")
+
+    with tempfile.TemporaryDirectory() as base_path:
+        motor = MotorPDF(procesos=0)
+        referencia = medir(motor, snapshots, base_path, 1)
+        cpu_ms = motor.estadisticas()["cpu_promedio_ms"]
+        print(f"{'en hilo':<12}{referencia:>12.1f}{1.0:>10.2f}{cpu_ms:>16.1f}")
+
+        for procesos in args.procesos:
+            motor = MotorPDF(procesos=procesos)
+            try:
+                # Tantos llamadores como procesos, como lo hacen los hilos de la cola
+                velocidad = medir(motor, snapshots, base_path, procesos)
+                cpu_ms = motor.estadisticas()["cpu_promedio_ms"]
+            finally:
+                motor.cerrar()
+            print(f"{procesos:<12}{velocidad:>12.1f}{velocidad / referencia:>10.2f}{cpu_ms:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark de la serialización del historial de compras
+
+Arma una página de /usuarios/me/compras con objetos ORM (sin base de datos):
+--compras documentos de --lineas detalles cada uno, con el metadata que guarda
+el checkout (el registro completo del producto: descripción, URLs de imágenes,
+características). Compara tres caminos sobre la misma página:
+
+- response_model: lo que hace FastAPI al retornar las filas (validar, volcar a
+  objetos JSON y json.dumps en JSONResponse)
+- validar+dump_json: TypeAdapter con from_attributes y dump_json de Pydantic
+- SerializadorFilas: lectura directa de atributos y orjson (app.serializacion)
+
+Antes de medir verifica que el JSON sea el mismo en los tres caminos, también
+para los otros listados (detalles, usuarios, direcciones y documentos).
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_serializacion --compras 100 --lineas 10
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, List
+
+from pydantic import TypeAdapter
+
+from app import serializacion
+from app.models import DetalleDocumento, DireccionDespacho, Documento, Usuario
+from app.schemas import (
+    CompraResponse, DetalleDocumentoResponse, DireccionDespachoResponse, DocumentoResponse, UsuarioResponse,
+)
+from app.serializacion import SerializadorFilas
+
+
+def producto(rnd: random.Random, id_: int) -> dict:
+    """Registro de catálogo con la forma de frontend/public/data/productos.json"""
+    return {
+        "id": id_,
+        "nombre": f"Producto {id_} edición año {rnd.randint(2020, 2025)}",
+        "descripcion": " ".join(rnd.choice(["Laptop", "pantalla", "15.6\"", "procesador", "batería", "ideal para",
+                                            "estudiantes", "trabajo", "académico", "garantía", "UNAB"])
+                                for _ in range(24)),
+        "precio": rnd.randint(1, 900) * 990,
+        "categoria": rnd.choice(["Tecnología", "Libros", "Papelería", "Ropa"]),
+        "stock": rnd.randint(0, 200),
+        "rating": round(rnd.uniform(3, 5), 1),
+        "imagenes": [f"https://cdn.ejemplo.cl/catalog/product/cache/{uuid.UUID(int=rnd.getrandbits(128)).hex}/"
+                     f"{id_}-{i}_T{rnd.getrandbits(32)}.png" for i in range(3)],
+        "caracteristicas": [f"Característica {i}: {rnd.choice(['8GB RAM', '256GB SSD', 'Wi-Fi 6', 'USB-C'])}"
+                            for i in range(6)],
+    }
+
+
+def metadata_detalle(info: dict) -> dict:
+    """Metadata de un detalle tal como lo arma el checkout"""
+    return {
+        "id": info["id"], "nombre": info["nombre"], "descripcion": info["descripcion"],
+        "categoria": info["categoria"], "stock": info["stock"], "rating": info["rating"],
+        "imagenes": info["imagenes"], "caracteristicas": info["caracteristicas"],
+        **{k: v for k, v in info.items() if k not in ["id", "nombre", "precio", "stock"]},
+    }
+
+
+def fecha(rnd: random.Random) -> datetime:
+    # asyncpg entrega timestamptz como datetime en UTC
+    return datetime(2025, 6, 1, 12, tzinfo=timezone.utc) - timedelta(seconds=rnd.randint(0, 10**7),
+                                                                      microseconds=rnd.randint(0, 999999))
+
+
+def pagina_compras(rnd: random.Random, compras: int, lineas: int) -> List[Documento]:
+    catalogo = [producto(rnd, i) for i in range(1, 51)]
+    usuario_id = uuid.uuid4()
+    documentos = []
+    for _ in range(compras):
+        creado = fecha(rnd)
+        documento = Documento(
+            id=uuid.UUID(int=rnd.getrandbits(128)), usuario_id=usuario_id, estado="completado",
+            ruta_documento=f"{creado:%Y/%m/%d}/comprobante.pdf", pdf_estado="listo",
+            metadata_json={}, fecha_creacion=creado, fecha_actualizacion=creado,
+        )
+        for info in rnd.sample(catalogo, lineas):
+            documento.detalles.append(DetalleDocumento(
+                id=uuid.UUID(int=rnd.getrandbits(128)), documento_id=documento.id, producto=info["nombre"],
+                precio=float(info["precio"]), cantidad=rnd.randint(1, 3), metadata_json=metadata_detalle(info),
+                fecha_creacion=creado, fecha_actualizacion=creado,
+            ))
+        documento.monto_total = sum(d.precio * d.cantidad for d in documento.detalles)
+        documentos.append(documento)
+    return documentos
+
+
+def otros_listados(rnd: random.Random, documentos: List[Documento]):
+    usuarios = [Usuario(
+        id=uuid.uuid4(), email=f"usuario{i}@unab.cl", username=f"usuario{i}", nombre="José", apellido="Núñez",
+        rut="12345678-5", telefono="+56912345678", activo=True, rol="user",
+        metadata_json={"preferencias": {"boletin": i % 2 == 0}}, fecha_creacion=fecha(rnd), fecha_actualizacion=fecha(rnd),
+    ) for i in range(20)]
+    direcciones = [DireccionDespacho(
+        id=uuid.uuid4(), usuario_id=usuarios[0].id, direccion=f"Av. República {i}", comuna="Santiago",
+        ciudad="Santiago", codigo_postal=None, es_principal=i == 0, activa=True, metadata_json={},
+        fecha_creacion=fecha(rnd), fecha_actualizacion=fecha(rnd),
+    ) for i in range(5)]
+    return [
+        (DetalleDocumentoResponse, documentos[0].detalles),
+        (UsuarioResponse, usuarios),
+        (DireccionDespachoResponse, direcciones),
+        (DocumentoResponse, documentos),
+    ]
+
+
+def response_model(adapter: TypeAdapter) -> Callable[[Any], bytes]:
+    """Lo que hace FastAPI con response_model y JSONResponse"""
+    def serializar(filas):
+        contenido = adapter.dump_python(adapter.validate_python(filas, from_attributes=True), mode="json", by_alias=True)
+        return json.dumps(contenido, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":")).encode("utf-8")
+    return serializar
+
+
+def verificar(listados) -> None:
+    for esquema, filas in listados:
+        serializador = SerializadorFilas(esquema)
+        directo = serializador.dump_json(filas)
+        validado = serializador.dump_json_validado(filas)
+        assert directo == validado, f"{esquema.__name__}: el JSON directo difiere del de Pydantic"
+        assert json.loads(response_model(TypeAdapter(List[esquema]))(filas)) == json.loads(directo), \
+            f"{esquema.__name__}: el JSON difiere del de response_model"
+
+
+def medir(funcion, repeticiones: int) -> float:
+    """Mejor tiempo (s) de `repeticiones` llamadas"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compras", type=int, default=100)
+    parser.add_argument("--lineas", type=int, default=10)
+    parser.add_argument("--repeticiones", type=int, default=20, help="Se reporta la mejor")
+    args = parser.parse_args()
+
+    rnd = random.Random(2025)
+    documentos = pagina_compras(rnd, args.compras, args.lineas)
+    verificar([(CompraResponse, documentos)] + otros_listados(rnd, documentos))
+
+    serializador = SerializadorFilas(CompraResponse)
+    tamano = len(serializador.dump_json(documentos))
+    fastapi = response_model(TypeAdapter(List[CompraResponse]))
+    mediciones = [
+        ("response_model (FastAPI)", lambda: fastapi(documentos)),
+        ("validar+dump_json", lambda: serializador.dump_json_validado(documentos)),
+    ]
+    if serializacion.ORJSON_AVAILABLE:
+        mediciones.append(("SerializadorFilas (orjson)", lambda: serializador.dump_json(documentos)))
+
+    print(f"Página de {args.compras} compras x {args.lineas} líneas: {tamano / 1024:,.0f} KiB de JSON "
+          f"(verificado igual en los tres caminos)\n")
+    print(f"{'':<30}{'ms/página':>11}{'MB/s':>9}{'vs. FastAPI':>13}")
+    base = None
+    for nombre, funcion in mediciones:
+        segundos = medir(funcion, args.repeticiones)
+        base = base or segundos
+        print(f"{nombre:<30}{segundos * 1000:>11.2f}{tamano / segundos / 1e6:>9.1f}{base / segundos:>12.1f}x")
+    if not serializacion.ORJSON_AVAILABLE:
+        print("SerializadorFilas (orjson)    orjson no está instalado (usa validar+dump_json)")
+
+
+if __name__ == "__main__":
+    main()
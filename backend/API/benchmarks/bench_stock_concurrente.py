@@ -0,0 +1,121 @@
+"""
+Benchmark de reserva de stock concurrente (checkout)
+
+Lanza varios hilos que reservan stock sobre unos pocos productos "calientes"
+usando la misma sentencia del checkout y mide compras por segundo, rechazos
+por falta de stock y latencia. Al final verifica que no se haya vendido más
+de lo disponible. Requiere PostgreSQL (usa DATABASE_URL) y trabaja con ids
+altos que se eliminan al terminar.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_stock_concurrente --hilos 16 --productos 4 --stock 2000
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+from app.services.stock_service import reservar_stock, sincronizar_productos, StockInsuficienteError
+
+ID_BASE = 900000
+
+
+def preparar(n_productos: int, stock: int):
+    """Crear los productos calientes con el stock inicial"""
+    ids = list(range(ID_BASE, ID_BASE + n_productos))
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM productos WHERE id >= :base"), {"base": ID_BASE})
+        sincronizar_productos(db, {
+            i: {"id": i, "nombre": f"Bench {i}", "precio": 1.0, "stock": stock} for i in ids
+        })
+        db.commit()
+    return ids
+
+
+def limpiar():
+    with SessionLocal() as db:
+        db.execute(text("DELETE FROM productos WHERE id >= :base"), {"base": ID_BASE})
+        db.commit()
+
+
+def trabajador(ids, duracion, max_lineas, semilla, resultado, lock):
+    rnd = random.Random(semilla)
+    latencias, vendidos = [], {}
+    exitos = rechazos = 0
+    fin = time.monotonic() + duracion
+    with SessionLocal() as db:
+        while time.monotonic() < fin:
+            lineas = rnd.sample(ids, rnd.randint(1, min(max_lineas, len(ids))))
+            cantidades = {i: rnd.randint(1, 3) for i in lineas}
+            inicio = time.perf_counter()
+            try:
+                reservar_stock(db, cantidades)
+                db.commit()
+                exitos += 1
+                for i, c in cantidades.items():
+                    vendidos[i] = vendidos.get(i, 0) + c
+            except StockInsuficienteError:
+                db.rollback()
+                rechazos += 1
+            latencias.append((time.perf_counter() - inicio) * 1e3)
+    with lock:
+        resultado["latencias"].extend(latencias)
+        resultado["exitos"] += exitos
+        resultado["rechazos"] += rechazos
+        for i, c in vendidos.items():
+            resultado["vendidos"][i] = resultado["vendidos"].get(i, 0) + c
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hilos", type=int, default=16, help="No más que el pool (10 + 20 de overflow)")
+    parser.add_argument("--productos", type=int, default=4, help="Cantidad de productos calientes")
+    parser.add_argument("--stock", type=int, default=2000, help="Stock inicial por producto")
+    parser.add_argument("--lineas", type=int, default=3, help="Máximo de líneas por compra")
+    parser.add_argument("--segundos", type=float, default=10.0)
+    args = parser.parse_args()
+
+    ids = preparar(args.productos, args.stock)
+    resultado = {"latencias": [], "exitos": 0, "rechazos": 0, "vendidos": {}}
+    lock = threading.Lock()
+    hilos = [
+        threading.Thread(target=trabajador, args=(ids, args.segundos, args.lineas, n, resultado, lock))
+        for n in range(args.hilos)
+    ]
+    try:
+        inicio = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        duracion = time.perf_counter() - inicio
+
+        with SessionLocal() as db:
+            finales = dict(db.execute(
+                text("SELECT id, stock FROM productos WHERE id >= :base"), {"base": ID_BASE}
+            ).all())
+    finally:
+        limpiar()
+
+    latencias = sorted(resultado["latencias"])
+    print(f"{args.hilos} hilos, {args.productos} productos calientes, {duracion:.1f}s")
+    print(f"compras confirmadas: {resultado['exitos']} ({resultado['exitos'] / duracion:,.0f}/s)")
+    print(f"rechazos por stock:  {resultado['rechazos']}")
+    if latencias:
+        p99 = latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+        print(f"latencia p50 {statistics.median(latencias):.2f} ms, p99 {p99:.2f} ms")
+
+    # Sin sobreventa: lo vendido más lo restante debe ser exactamente el stock inicial
+    for i in ids:
+        vendido = resultado["vendidos"].get(i, 0)
+        assert finales[i] >= 0, (i, finales[i])
+        assert vendido + finales[i] == args.stock, (i, vendido, finales[i])
+    print("verificación OK: sin sobreventa")
+
+
+if __name__ == "__main__":
+    main()
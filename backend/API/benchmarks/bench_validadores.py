@@ -0,0 +1,127 @@
+"""
+Benchmark de los validadores de RUT y teléfono: individual vs. por lotes
+
+Compara la implementación anterior (re.sub en cada llamada y el dígito
+verificador dígito a dígito, copiada aquí como referencia) con la actual:
+validar_rut_chileno en un bucle, validar_ruts por lotes y
+digitos_verificadores sobre números ya parseados (con NumPy si está
+instalado y en Python puro). Antes de medir verifica que ambas
+implementaciones den exactamente los mismos resultados y mensajes.
+
+Uso (desde backend/API):
+    python -m benchmarks.bench_validadores --ruts 1000000
+"""
+import argparse
+import random
+import re
+import time
+
+from app import validators
+from app.validators import (
+    digitos_verificadores, validar_rut_chileno, validar_ruts, validar_telefono_chileno, validar_telefonos,
+)
+from benchmarks.bench_micro import ruts, telefonos
+
+
+def rut_anterior(rut: str):
+    """validar_rut_chileno antes de los patrones precompilados y la tabla de dígitos verificadores"""
+    if not rut:
+        return False, "RUT no puede estar vacío"
+    rut_limpio = re.sub(r'[.\s]', '', rut.strip().upper())
+    if '-' in rut_limpio:
+        partes = rut_limpio.split('-')
+        if len(partes) != 2:
+            return False, "Formato de RUT inválido"
+        numero_str, dv = partes
+    else:
+        if len(rut_limpio) < 2:
+            return False, "RUT demasiado corto"
+        numero_str = rut_limpio[:-1]
+        dv = rut_limpio[-1]
+    if not numero_str.isdigit():
+        return False, "El número del RUT solo puede contener dígitos"
+    if dv not in '0123456789K':
+        return False, "Dígito verificador inválido (debe ser un número o K)"
+    try:
+        numero = int(numero_str)
+    except ValueError:
+        return False, "Número de RUT inválido"
+    if numero < 1000000 or numero > 99999999:
+        return False, "Número de RUT fuera del rango válido"
+    multiplicadores = [2, 3, 4, 5, 6, 7]
+    suma = 0
+    for i, digito in enumerate(numero_str[::-1]):
+        suma += int(digito) * multiplicadores[i % len(multiplicadores)]
+    dv_calculado = 11 - suma % 11
+    dv_calculado = '0' if dv_calculado == 11 else 'K' if dv_calculado == 10 else str(dv_calculado)
+    if dv != dv_calculado:
+        return False, f"Dígito verificador inválido. Esperado: {dv_calculado}"
+    return True, f"{numero_str}-{dv}"
+
+
+def casos_borde(rnd: random.Random):
+    fijos = ["", " ", "1", "-", "123-", "12.345.678-", "12345678-12", "1-2-3", "12 345 678-5", "\t12345678-5\n",
+             "12345678k", "1234567-K", "100000000-1", "0012345678-5", "12.345.678 - 5", "abc"]
+    aleatorios = ["".join(rnd.choice("0123456789kK.- ") for _ in range(rnd.randint(0, 14))) for _ in range(2000)]
+    return fijos + aleatorios
+
+
+def verificar(entradas_rut, entradas_telefono) -> None:
+    esperado = [rut_anterior(r) for r in entradas_rut]
+    assert [validar_rut_chileno(r) for r in entradas_rut] == esperado, "validar_rut_chileno cambió de resultado"
+    lote = validar_ruts(entradas_rut)
+    assert [(bool(v), x) for v, x in zip(lote.validos, lote.valores)] == esperado, "validar_ruts difiere"
+    lote = validar_telefonos(entradas_telefono)
+    assert ([(bool(v), x) for v, x in zip(lote.validos, lote.valores)]
+            == [validar_telefono_chileno(t) for t in entradas_telefono]), "validar_telefonos difiere"
+
+
+def medir(funcion, repeticiones: int) -> float:
+    """Mejor tiempo (s) de `repeticiones` llamadas"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ruts", type=int, default=200000)
+    parser.add_argument("--repeticiones", type=int, default=3, help="Se reporta la mejor")
+    args = parser.parse_args()
+
+    rnd = random.Random(2025)
+    entradas = ruts(rnd, args.ruts)
+    entradas_telefono = telefonos(rnd, args.ruts)
+    verificar(entradas[:20000] + casos_borde(rnd), entradas_telefono[:20000])
+    numeros = [rnd.randint(1_000_000, 99_999_999) for _ in range(args.ruts)]
+
+    mediciones = [
+        ("RUT anterior (bucle)", lambda: [rut_anterior(r) for r in entradas]),
+        ("validar_rut_chileno (bucle)", lambda: [validar_rut_chileno(r) for r in entradas]),
+        ("validar_ruts (lote)", lambda: validar_ruts(entradas)),
+        ("teléfono (bucle)", lambda: [validar_telefono_chileno(t) for t in entradas_telefono]),
+        ("validar_telefonos (lote)", lambda: validar_telefonos(entradas_telefono)),
+    ]
+    disponible = validators.NUMPY_AVAILABLE
+    validators.NUMPY_AVAILABLE = False
+    dv_python = medir(lambda: digitos_verificadores(numeros), args.repeticiones)
+    validators.NUMPY_AVAILABLE = disponible
+
+    print(f"{args.ruts:,} entradas (resultados verificados contra la implementación anterior)\n")
+    print(f"{'':<34}{'ns/entrada':>12}{'entradas/s':>14}")
+    for nombre, funcion in mediciones:
+        segundos = medir(funcion, args.repeticiones)
+        print(f"{nombre:<34}{segundos / args.ruts * 1e9:>12.0f}{args.ruts / segundos:>14,.0f}")
+    print(f"{'digitos_verificadores (Python)':<34}{dv_python / args.ruts * 1e9:>12.0f}{args.ruts / dv_python:>14,.0f}")
+    if disponible:
+        segundos = medir(lambda: digitos_verificadores(numeros), args.repeticiones)
+        print(f"{'digitos_verificadores (NumPy)':<34}{segundos / args.ruts * 1e9:>12.0f}{args.ruts / segundos:>14,.0f}")
+    else:
+        print("digitos_verificadores (NumPy)     NumPy no está instalado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Prueba de carga de extremo a extremo contra una API en ejecución
+
+Ejecuta escenarios con los usuarios de benchmarks.datos_sinteticos a
+concurrencia controlada y reporta, por escenario y concurrencia, peticiones
+por segundo, p50/p95/p99, errores por código y sentencias SQL por petición
+(diferencia de db_route_* en /metrics antes y después de cada corrida):
+
+- login:     POST /token
+- historial: GET /usuarios/me/compras?limit=20 siguiendo X-Next-Cursor (--paginas)
+- checkout:  POST /checkout con --lineas productos distintos
+- pdf:       GET /documentos/{id}/pdf de una compra propia (se crea en la preparación)
+
+Los resultados se guardan en JSON con el commit actual para compararlos entre
+versiones con --comparar. La API debe tener LIMITE_LOGIN_USUARIO y
+LIMITE_LOGIN_IP altos, stock suficiente (datos_sinteticos --stock) y, con
+varios workers, METRICAS_DIR para que /metrics los sume a todos.
+
+Uso (desde backend/API):
+    python -m benchmarks.carga --concurrencia 10 50 100 --duracion 30
+    python -m benchmarks.carga --escenarios checkout --lineas 1 10 --metrics-token xxx
+    python -m benchmarks.carga --comparar benchmarks/resultados/base.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.datos_sinteticos import DOMINIO, PASSWORD_SINTETICA, rut_sintetico, telefono_sintetico
+
+ESCENARIOS = ("login", "historial", "checkout", "pdf")
+
+# Ruta (plantilla) con la que cada escenario aparece en las métricas
+RUTAS = {
+    "login": ("POST", "/token"),
+    "historial": ("GET", "/usuarios/me/compras"),
+    "checkout": ("POST", "/checkout"),
+    "pdf": ("GET", "/documentos/{documento_id}/pdf"),
+}
+
+_LINEA_METRICA = re.compile(r'^(db_route_\w+)\{method="([^"]+)",route="([^"]+)"\} (\S+)$')
+
+
+class Sesion:
+    """Usuario sintético con su token y lo que necesitan los escenarios"""
+
+    def __init__(self, n: int, token: str):
+        self.n = n
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.cursor: Optional[str] = None
+        self.paginas = 0
+        self.documento_pdf: Optional[str] = None
+
+
+# ==================== ESCENARIOS ====================
+
+async def escenario_login(http, sesion: Sesion, args, productos):
+    return await http.post("/token", data={"username": f"carga_{sesion.n}", "password": PASSWORD_SINTETICA})
+
+
+async def escenario_historial(http, sesion: Sesion, args, productos):
+    params = {"limit": 20}
+    if sesion.cursor:
+        params["cursor"] = sesion.cursor
+    respuesta = await http.get("/usuarios/me/compras", params=params, headers=sesion.headers)
+    sesion.paginas += 1
+    sesion.cursor = respuesta.headers.get("x-next-cursor")
+    if sesion.paginas >= args.paginas:
+        sesion.cursor, sesion.paginas = None, 0
+    return respuesta
+
+
+def _cuerpo_checkout(n: int, productos, lineas: int, desplazamiento: int = 0):
+    elegidos = [productos[(desplazamiento + k) % len(productos)] for k in range(lineas)]
+    return {
+        "rut": rut_sintetico(n),
+        "email": f"carga_{n}@{DOMINIO}",
+        "telefono": telefono_sintetico(n),
+        "direccion": {"direccion": "Av. Carga 123", "comuna": "Santiago", "ciudad": "Santiago"},
+        "metodo_envio_id": 1,
+        "productos": [{"producto_id": p["id"], "cantidad": 1, "precio": p["precio"]} for p in elegidos],
+    }
+
+
+async def escenario_checkout(http, sesion: Sesion, args, productos):
+    return await http.post("/checkout", json=_cuerpo_checkout(sesion.n, productos, args.lineas_actual, sesion.n),
+                           headers=sesion.headers)
+
+
+async def escenario_pdf(http, sesion: Sesion, args, productos):
+    return await http.get(f"/documentos/{sesion.documento_pdf}/pdf", headers=sesion.headers)
+
+
+FUNCIONES = {
+    "login": escenario_login,
+    "historial": escenario_historial,
+    "checkout": escenario_checkout,
+    "pdf": escenario_pdf,
+}
+
+
+# ==================== PREPARACIÓN ====================
+
+async def iniciar_sesiones(http, cantidad: int) -> List[Sesion]:
+    limite = asyncio.Semaphore(16)
+
+    async def una(n: int) -> Sesion:
+        async with limite:
+            respuesta = await http.post("/token", data={"username": f"carga_{n}", "password": PASSWORD_SINTETICA})
+        if respuesta.status_code != 200:
+            raise RuntimeError(f"login de carga_{n}: {respuesta.status_code} {respuesta.text[:200]}")
+        return Sesion(n, respuesta.json()["access_token"])
+
+    return list(await asyncio.gather(*(una(n) for n in range(cantidad))))
+
+
+async def preparar_pdfs(http, sesiones: List[Sesion], productos, espera_max: float = 120) -> None:
+    """Una compra por sesión y esperar a que su PDF esté generado"""
+    async def una(sesion: Sesion) -> None:
+        respuesta = await http.post("/checkout", json=_cuerpo_checkout(sesion.n, productos, 3),
+                                    headers=sesion.headers)
+        if respuesta.status_code != 201:
+            raise RuntimeError(f"checkout de preparación: {respuesta.status_code} {respuesta.text[:200]}")
+        documento_id = respuesta.json()["id"]
+        fin = time.monotonic() + espera_max
+        while time.monotonic() < fin:
+            pdf = await http.get(f"/documentos/{documento_id}/pdf", headers=sesion.headers)
+            if pdf.status_code == 200:
+                sesion.documento_pdf = documento_id
+                return
+            if pdf.status_code != 202:
+                raise RuntimeError(f"PDF de preparación: {pdf.status_code} {pdf.text[:200]}")
+            await asyncio.sleep(float(pdf.headers.get("retry-after", "1")))
+        raise RuntimeError(f"el PDF de {documento_id} no estuvo listo en {espera_max:.0f} s")
+
+    await asyncio.gather(*(una(s) for s in sesiones))
+
+
+# ==================== MÉTRICAS ====================
+
+async def leer_metricas(http, token: str) -> Optional[Dict]:
+    """Contadores db_route_* por (método, ruta); None si /metrics no está disponible"""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    try:
+        respuesta = await http.get("/metrics", headers=headers)
+    except httpx.HTTPError:
+        return None
+    if respuesta.status_code != 200:
+        return None
+    valores: Dict = {}
+    for linea in respuesta.text.splitlines():
+        coincidencia = _LINEA_METRICA.match(linea)
+        if coincidencia:
+            nombre, metodo, ruta, valor = coincidencia.groups()
+            valores[(nombre, metodo, ruta)] = float(valor)
+    return valores
+
+
+def consultas_por_peticion(antes: Optional[Dict], despues: Optional[Dict], escenario: str) -> Dict:
+    if antes is None or despues is None:
+        return {}
+    metodo, ruta = RUTAS[escenario]
+
+    def delta(nombre):
+        clave = (nombre, metodo, ruta)
+        return despues.get(clave, 0) - antes.get(clave, 0)
+
+    peticiones = delta("db_route_requests_total")
+    if not peticiones:
+        return {}
+    return {
+        "consultas_por_peticion": round(delta("db_route_queries_total") / peticiones, 2),
+        "db_ms_por_peticion": round(delta("db_route_query_seconds_total") / peticiones * 1e3, 3),
+    }
+
+
+# ==================== EJECUCIÓN ====================
+
+def _percentil(cuantiles: List[float], p: int) -> float:
+    return round(cuantiles[p - 1], 2)
+
+
+async def correr(http, escenario: str, sesiones: List[Sesion], concurrencia: int, args, productos) -> Dict:
+    funcion = FUNCIONES[escenario]
+    inicio_medicion = time.monotonic() + args.calentamiento
+    fin = inicio_medicion + args.duracion
+    latencias: List[float] = []
+    estados: Counter = Counter()
+    fallas: Counter = Counter()
+
+    async def trabajador(w: int) -> None:
+        sesion = sesiones[w % len(sesiones)]
+        while time.monotonic() < fin:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await funcion(http, sesion, args, productos)
+                estado = respuesta.status_code
+            except httpx.HTTPError as e:
+                estado = None
+                fallas[type(e).__name__] += 1
+            duracion = (time.perf_counter() - inicio) * 1e3
+            if time.monotonic() >= inicio_medicion and estado is not None:
+                estados[estado] += 1
+                if estado < 400:
+                    latencias.append(duracion)
+
+    antes = await leer_metricas(http, args.metrics_token)
+    await asyncio.gather(*(trabajador(w) for w in range(concurrencia)))
+    despues = await leer_metricas(http, args.metrics_token)
+
+    resultado = {
+        "escenario": escenario,
+        "concurrencia": concurrencia,
+        "peticiones": sum(estados.values()),
+        "exitosas": len(latencias),
+        "errores": {str(e): c for e, c in estados.items() if e >= 400},
+        "fallas_conexion": dict(fallas),
+        "rps": round(len(latencias) / args.duracion, 1),
+    }
+    if escenario == "checkout":
+        resultado["lineas"] = args.lineas_actual
+    if len(latencias) >= 2:
+        cuantiles = statistics.quantiles(latencias, n=100, method="inclusive")
+        resultado.update({
+            "p50_ms": _percentil(cuantiles, 50),
+            "p95_ms": _percentil(cuantiles, 95),
+            "p99_ms": _percentil(cuantiles, 99),
+            "max_ms": round(max(latencias), 2),
+        })
+    resultado.update(consultas_por_peticion(antes, despues, escenario))
+    return resultado
+
+
+def _imprimir(resultado: Dict) -> None:
+    nombre = resultado["escenario"]
+    if "lineas" in resultado:
+        nombre += f" ({resultado['lineas']} líneas)"
+    errores = sum(resultado["errores"].values()) + sum(resultado["fallas_conexion"].values())
+
+    def valor(clave, formato):
+        return format(resultado[clave], formato) if clave in resultado else "-"
+
+    print(f"{nombre:<24}{resultado['concurrencia']:>6}{resultado['rps']:>10.1f}"
+          f"{valor('p50_ms', '.1f'):>9}{valor('p95_ms', '.1f'):>9}{valor('p99_ms', '.1f'):>9}"
+          f"{errores:>8}{valor('consultas_por_peticion', '.1f'):>10}")
+
+
+async def ejecutar(args) -> List[Dict]:
+    conexiones = max(args.concurrencia) + 4
+    limites = httpx.Limits(max_connections=conexiones, max_keepalive_connections=conexiones)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=args.timeout) as http:
+        catalogo = await http.get("/productos", params={"limit": 100})
+        catalogo.raise_for_status()
+        productos = [p for p in catalogo.json()["items"] if p["precio"] > 0]
+        if "checkout" in args.escenarios and max(args.lineas) > len(productos):
+            raise RuntimeError(f"--lineas {max(args.lineas)} supera los {len(productos)} productos del catálogo")
+
+        clientes = args.clientes or max(args.concurrencia)
+        print(f"Iniciando sesión con {clientes} usuarios sintéticos...")
+        sesiones = await iniciar_sesiones(http, clientes)
+        if "pdf" in args.escenarios:
+            print("Preparando una compra con PDF por usuario...")
+            await preparar_pdfs(http, sesiones, productos)
+
+        print(f"\n{args.duracion:.0f} s por corrida ({args.calentamiento:g} s de calentamiento)\n")
+        print(f"{'escenario':<24}{'conc.':>6}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'errores':>8}{'SQL/req':>10}")
+        resultados = []
+        for escenario in args.escenarios:
+            for lineas in (args.lineas if escenario == "checkout" else [None]):
+                args.lineas_actual = lineas
+                for concurrencia in args.concurrencia:
+                    resultado = await correr(http, escenario, sesiones, concurrencia, args, productos)
+                    _imprimir(resultado)
+                    resultados.append(resultado)
+        return resultados
+
+
+# ==================== RESULTADOS ====================
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+def _clave(resultado: Dict):
+    return resultado["escenario"], resultado.get("lineas"), resultado["concurrencia"]
+
+
+def comparar(base: Dict, actual: Dict) -> None:
+    print(f"\nComparación {base['commit']} -> {actual['commit']}\n")
+    print(f"{'escenario':<24}{'conc.':>6}{'req/s':>16}{'p95 ms':>16}{'p99 ms':>16}{'SQL/req':>12}")
+    anteriores = {_clave(r): r for r in base["resultados"]}
+
+    def cambio(anterior, nuevo, clave):
+        if clave not in anterior or clave not in nuevo:
+            return "-"
+        a, n = anterior[clave], nuevo[clave]
+        return f"{n:.1f} ({(n - a) / a * 100:+.0f}%)" if a else f"{n:.1f}"
+
+    for resultado in actual["resultados"]:
+        anterior = anteriores.get(_clave(resultado))
+        if anterior is None:
+            continue
+        nombre = resultado["escenario"] + (f" ({resultado['lineas']} líneas)" if "lineas" in resultado else "")
+        consultas = "-"
+        if "consultas_por_peticion" in anterior and "consultas_por_peticion" in resultado:
+            consultas = f"{anterior['consultas_por_peticion']:.1f}->{resultado['consultas_por_peticion']:.1f}"
+        print(f"{nombre:<24}{resultado['concurrencia']:>6}{cambio(anterior, resultado, 'rps'):>16}"
+              f"{cambio(anterior, resultado, 'p95_ms'):>16}{cambio(anterior, resultado, 'p99_ms'):>16}"
+              f"{consultas:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--escenarios", nargs="+", choices=ESCENARIOS, default=list(ESCENARIOS))
+    parser.add_argument("--concurrencia", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--duracion", type=float, default=20, help="Segundos medidos por corrida")
+    parser.add_argument("--calentamiento", type=float, default=3, help="Segundos sin medir al inicio de cada corrida")
+    parser.add_argument("--clientes", type=int, default=0, help="Usuarios distintos (por defecto, la mayor concurrencia)")
+    parser.add_argument("--lineas", type=int, nargs="+", default=[3], help="Productos por checkout")
+    parser.add_argument("--paginas", type=int, default=5, help="Páginas del historial antes de volver a la primera")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--metrics-token", default=os.getenv("METRICS_TOKEN", ""))
+    parser.add_argument("--salida", help="Archivo JSON (por defecto benchmarks/resultados/<fecha>_<commit>.json)")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para mostrar las diferencias")
+    args = parser.parse_args()
+
+    try:
+        resultados = asyncio.run(ejecutar(args))
+    except httpx.ConnectError as e:
+        print(f"No se pudo conectar a {args.url}: {e}")
+        sys.exit(2)
+    except (RuntimeError, httpx.HTTPStatusError) as e:
+        print(f"Error en la preparación: {e}")
+        sys.exit(1)
+
+    commit = _commit()
+    datos = {
+        "commit": commit,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "url": args.url,
+        "parametros": {k: v for k, v in vars(args).items()
+                       if k not in ("metrics_token", "lineas_actual", "salida", "comparar")},
+        "resultados": resultados,
+    }
+    salida = args.salida or os.path.join(
+        os.path.dirname(__file__), "resultados", f"{datetime.now():%Y%m%d-%H%M%S}_{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, "w") as archivo:
+        json.dump(datos, archivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar) as archivo:
+            comparar(json.load(archivo), datos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Verificación: /usuarios/me/compras hace un número constante de consultas
+
+Crea un usuario temporal con --documentos compras de --lineas detalles cada
+una, llama al endpoint con distintos tamaños de página (limit) y cuenta las
+sentencias SQL que ejecutan todos los engines (primaria y réplicas) durante
+cada petición. Termina con
+código 1 si el conteo depende del tamaño de página (regresión N+1).
+Requiere PostgreSQL (usa DATABASE_URL); el usuario se elimina al terminar.
+
+Uso (desde backend/API):
+    python -m benchmarks.contar_consultas_compras --documentos 100 --limites 1 10 100
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+# Sin consumidores de la cola de PDFs: el script solo lee
+os.environ.setdefault("PDF_WORKERS", "0")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from app.auth import create_access_token
+from app.database import SessionLocal
+from app.main import app
+from app.models import DetalleDocumento, Documento, Usuario
+from app.services.identidad_service import cache_identidades
+
+
+def preparar(documentos: int, lineas: int):
+    username = f"bench_compras_{uuid.uuid4().hex[:8]}"
+    with SessionLocal() as db:
+        usuario = Usuario(email=f"{username}@bench.local", username=username, password_hash="-")
+        db.add(usuario)
+        db.flush()
+        ids = [uuid.uuid4() for _ in range(documentos)]
+        db.execute(insert(Documento), [
+            {"id": i, "usuario_id": usuario.id, "estado": "completado", "metadata_json": {"n": n}}
+            for n, i in enumerate(ids)
+        ])
+        db.execute(insert(DetalleDocumento), [
+            {"documento_id": i, "producto": f"Producto {k}", "precio": 1000.0, "cantidad": 1,
+             "metadata_json": {"id": k, "caracteristicas": ["a", "b"]}}
+            for i in ids for k in range(lineas)
+        ])
+        db.commit()
+        return usuario.id, username
+
+
+def limpiar(usuario_id):
+    with SessionLocal() as db:
+        db.query(Usuario).filter(Usuario.id == usuario_id).delete()
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documentos", type=int, default=100)
+    parser.add_argument("--lineas", type=int, default=3, help="Detalles por documento")
+    parser.add_argument("--limites", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    try:
+        usuario_id, username = preparar(args.documentos, args.lineas)
+    except OperationalError as e:
+        print(f"PostgreSQL no disponible: {e.orig}")
+        sys.exit(2)
+
+    sentencias = []
+    # En la clase Engine: con réplicas configuradas el endpoint lee de un engine de réplica
+    event.listen(Engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *a: sentencias.append(sql))
+    token = create_access_token({"sub": username})
+    conteos = {}
+    try:
+        with TestClient(app) as cliente:
+            for limite in args.limites:
+                # Con la identidad en caché solo se cuentan las consultas del endpoint
+                cliente.get("/usuarios/me/compras", params={"limit": 1},
+                            headers={"Authorization": f"Bearer {token}"})
+                sentencias.clear()
+                inicio = time.perf_counter()
+                respuesta = cliente.get("/usuarios/me/compras", params={"limit": limite},
+                                        headers={"Authorization": f"Bearer {token}"})
+                ms = (time.perf_counter() - inicio) * 1e3
+                respuesta.raise_for_status()
+                conteos[limite] = len(sentencias)
+                print(f"limit={limite:<5} compras={len(respuesta.json()):<5} consultas={len(sentencias):<3} {ms:8.1f} ms")
+    finally:
+        cache_identidades.invalidar(username)
+        limpiar(usuario_id)
+
+    if not all(conteos.values()):
+        print("ERROR: no se registraron consultas; el conteo no verifica nada")
+        sys.exit(1)
+    if len(set(conteos.values())) != 1:
+        print("ERROR: el número de consultas depende del tamaño de página (N+1)")
+        sys.exit(1)
+    print("OK: número de consultas constante")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Generador de datos sintéticos para las pruebas de carga
+
+Carga usuarios, documentos (compras) y detalle_documentos con COPY, generando
+las filas al vuelo (memoria constante aunque sean millones). Todos los usuarios
+sintéticos se llaman carga_<n>, tienen email @carga.local y la contraseña
+PASSWORD_SINTETICA, así benchmarks.carga puede iniciar sesión con ellos. Las
+compras se reparten entre los usuarios con fechas de los últimos dos años y
+detalles con la forma que deja /checkout (metadata con el producto completo).
+
+El trigger que recalcula monto_total se deshabilita durante la carga de
+detalles (monto_total ya se escribe calculado) si el usuario es dueño de la
+tabla. Requiere PostgreSQL (DATABASE_URL).
+
+Uso (desde backend/API):
+    python -m benchmarks.datos_sinteticos --usuarios 100000 --documentos 5000000 --detalles 20000000
+    python -m benchmarks.datos_sinteticos --usuarios 1000 --stock 10000000
+    python -m benchmarks.datos_sinteticos --limpiar
+"""
+import argparse
+import functools
+import io
+import itertools
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database import engine
+from app.services.catalogo_service import catalogo_productos
+from app.services.hash_service import pwd_context
+from app.services.stock_service import sincronizar_productos
+
+PASSWORD_SINTETICA = "Carga-Sintetica-2025!"
+DOMINIO = "carga.local"
+RUT_BASE = 40_000_000
+
+COMUNAS = ["Santiago", "Providencia", "Ñuñoa", "Viña del Mar", "Concepción", "Las Condes", "Maipú"]
+
+
+def rut_sintetico(n: int) -> str:
+    """RUT válido y único para el usuario sintético n"""
+    numero = RUT_BASE + n
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    dv = 11 - suma % 11
+    return f"{numero}-{'0' if dv == 11 else 'K' if dv == 10 else dv}"
+
+
+def telefono_sintetico(n: int) -> str:
+    return f"+569{10_000_000 + n % 90_000_000}"
+
+
+def _csv(valor: str) -> str:
+    """Campo CSV entre comillas (JSON, nombres con comas)"""
+    return '"' + valor.replace('"', '""') + '"'
+
+
+def _uuid(n: int) -> str:
+    """Texto de uuid.UUID(int=n) sin construir el objeto"""
+    h = f"{n:032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+class _FuenteCSV(io.TextIOBase):
+    """Archivo de solo lectura que entrega las líneas CSV de un generador (para copy_expert)"""
+
+    def __init__(self, lineas, lineas_por_bloque: int = 2000):
+        self._lineas = iter(lineas)
+        self._por_bloque = lineas_por_bloque
+        self._bloque = ""
+        self._posicion = 0
+        self.escritas = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> str:
+        if self._posicion >= len(self._bloque):
+            bloque = list(itertools.islice(self._lineas, self._por_bloque))
+            self.escritas += len(bloque)
+            self._bloque, self._posicion = "".join(bloque), 0
+        # Entregar menos de size está permitido: copy_expert vuelve a leer hasta recibir ""
+        fin = len(self._bloque) if size < 0 else self._posicion + size
+        datos = self._bloque[self._posicion:fin]
+        self._posicion += len(datos)
+        return datos
+
+
+def _copiar(cursor, tabla: str, columnas, lineas) -> None:
+    fuente = _FuenteCSV(lineas)
+    inicio = time.perf_counter()
+    cursor.copy_expert(f"COPY {tabla} ({', '.join(columnas)}) FROM STDIN WITH (FORMAT csv)", fuente, size=1 << 20)
+    segundos = time.perf_counter() - inicio
+    print(f"  {tabla:<20} {fuente.escritas:>12,} filas  {segundos:8.1f} s  {fuente.escritas / segundos:>10,.0f} filas/s")
+
+
+class Generador:
+    """Líneas CSV deterministas a partir del índice: documentos y detalles coinciden sin guardar nada en memoria"""
+
+    def __init__(self, usuarios: int, documentos: int, detalles: int, productos, semilla: int):
+        self.usuarios = usuarios
+        self.documentos = documentos
+        self.detalles = detalles
+        self.productos = productos
+        self.rnd = random.Random(semilla)
+        # Ids = base aleatoria de la corrida + índice
+        self.base_usuario = self.rnd.getrandbits(88) << 40
+        self.base_documento = self.rnd.getrandbits(88) << 40
+        self.ahora = datetime.now()
+
+    def id_usuario(self, n: int) -> str:
+        return _uuid(self.base_usuario + n)
+
+    def id_documento(self, i: int) -> str:
+        return _uuid(self.base_documento + i)
+
+    @functools.lru_cache(maxsize=None)
+    def _patron(self, cantidad_lineas: int, desplazamiento: int, variacion: int):
+        """(k, producto, cantidad) de un documento; se repite cada len(productos) * 3 documentos"""
+        return tuple(
+            (k, self.productos[(desplazamiento + k) % len(self.productos)], 1 + (variacion + k) % 3)
+            for k in range(cantidad_lineas)
+        )
+
+    def lineas(self, i: int):
+        """Detalles del documento i: reparto parejo de --detalles entre los documentos"""
+        base, resto = divmod(self.detalles, self.documentos)
+        return self._patron(base + (1 if i < resto else 0), (i * 7) % len(self.productos), i % 3)
+
+    def fecha(self, i: int) -> str:
+        return (self.ahora - timedelta(seconds=(i * 7919) % (730 * 86400))).isoformat(" ")
+
+    def lineas_usuarios(self, password_hash: str):
+        metadata = _csv(json.dumps({"origen": "datos_sinteticos"}))
+        for n in range(self.usuarios):
+            creado = (self.ahora - timedelta(days=n % 1000)).isoformat(" ")
+            yield (f"{self.id_usuario(n)},carga_{n}@{DOMINIO},carga_{n},{password_hash},Nombre{n},Apellido{n},"
+                   f"{rut_sintetico(n)},{telefono_sintetico(n)},t,user,{metadata},{creado}\n")
+
+    def lineas_documentos(self):
+        for i in range(self.documentos):
+            n = i % self.usuarios
+            subtotal = sum(float(p["precio"]) * cantidad for _, p, cantidad in self.lineas(i))
+            metadata = {
+                "rut": rut_sintetico(n), "email": f"carga_{n}@{DOMINIO}", "telefono": telefono_sintetico(n),
+                "direccion": {"direccion": f"Av. Sintética {i % 9999}", "comuna": COMUNAS[i % len(COMUNAS)],
+                              "ciudad": "Santiago", "codigo_postal": None},
+                "metodo_envio": {"id": 1, "nombre": "Envío Estándar UNAB", "precio": 5},
+                "costo_envio": 5, "subtotal": subtotal,
+            }
+            yield (f"{self.id_documento(i)},{self.id_usuario(n)},completado,{subtotal + 5},"
+                   f"{_csv(json.dumps(metadata, ensure_ascii=False))},{self.fecha(i)}\n")
+
+    def lineas_detalles(self):
+        # Nombre, precio y metadata (misma forma que guarda /checkout) ya en CSV, una vez por producto
+        campos_producto = {p["id"]: f'{_csv(p["nombre"])},{p["precio"]}' for p in self.productos}
+        metadata_producto = {
+            p["id"]: _csv(json.dumps({**{k: v for k, v in p.items() if k not in ("precio", "stock")},
+                                      "stock": p.get("stock")}, ensure_ascii=False))
+            for p in self.productos
+        }
+        for i in range(self.documentos):
+            documento = self.base_documento + i
+            documento_id = _uuid(documento)
+            fecha = self.fecha(i)
+            for k, producto, cantidad in self.lineas(i):
+                # Id del detalle: el del documento con la línea en los bits altos
+                yield (f"{_uuid(documento ^ (k + 1) << 64)},{documento_id},{campos_producto[producto['id']]},"
+                       f"{cantidad},{metadata_producto[producto['id']]},{fecha}\n")
+
+
+def limpiar() -> None:
+    """Eliminar los usuarios sintéticos (sus compras y detalles se borran en cascada)"""
+    inicio = time.perf_counter()
+    with engine.begin() as conn:
+        borrados = conn.execute(
+            text("DELETE FROM usuarios WHERE email LIKE :dominio"), {"dominio": f"%@{DOMINIO}"}
+        ).rowcount
+    print(f"{borrados:,} usuarios sintéticos eliminados en {time.perf_counter() - inicio:.1f} s")
+
+
+def cargar(args) -> None:
+    productos = list(catalogo_productos.cargar().datos.values())
+    if not productos:
+        print("No se encontró productos.json")
+        sys.exit(1)
+
+    with engine.connect() as conn:
+        existentes = conn.execute(
+            text("SELECT count(*) FROM usuarios WHERE email LIKE :dominio"), {"dominio": f"%@{DOMINIO}"}
+        ).scalar()
+    if existentes:
+        print(f"Ya hay {existentes:,} usuarios sintéticos; ejecutar primero con --limpiar")
+        sys.exit(1)
+
+    generador = Generador(args.usuarios, args.documentos, args.detalles, productos, args.semilla)
+    password_hash = pwd_context.hash(PASSWORD_SINTETICA)
+    print(f"Cargando {args.usuarios:,} usuarios, {args.documentos:,} documentos, {args.detalles:,} detalles")
+
+    conexion = engine.raw_connection()
+    try:
+        cursor = conexion.cursor()
+        _copiar(cursor, "usuarios",
+                ["id", "email", "username", "password_hash", "nombre", "apellido", "rut", "telefono",
+                 "activo", "rol", "metadata", "fecha_creacion"],
+                generador.lineas_usuarios(password_hash))
+        conexion.commit()
+
+        if args.documentos:
+            _copiar(cursor, "documentos",
+                    ["id", "usuario_id", "estado", "monto_total", "metadata", "fecha_creacion"],
+                    generador.lineas_documentos())
+            conexion.commit()
+
+        if args.detalles and args.documentos:
+            # monto_total ya viene calculado: evitar que el trigger lo recalcule sobre millones de filas
+            try:
+                cursor.execute("ALTER TABLE detalle_documentos DISABLE TRIGGER trigger_detalle_monto_insert")
+                trigger_deshabilitado = True
+            except Exception as e:
+                conexion.rollback()
+                print(f"  (no se pudo deshabilitar el trigger de monto_total: {str(e).splitlines()[0]})")
+                trigger_deshabilitado = False
+            _copiar(cursor, "detalle_documentos",
+                    ["id", "documento_id", "producto", "precio", "cantidad", "metadata", "fecha_creacion"],
+                    generador.lineas_detalles())
+            if trigger_deshabilitado:
+                cursor.execute("ALTER TABLE detalle_documentos ENABLE TRIGGER trigger_detalle_monto_insert")
+            conexion.commit()
+
+        if args.stock:
+            # Stock alto para que los checkouts de la prueba de carga no se agoten
+            with engine.begin() as conn:
+                sincronizar_productos(conn, {p["id"]: p for p in productos})
+                conn.execute(text("UPDATE productos SET stock = :stock"), {"stock": args.stock})
+            print(f"  productos            stock = {args.stock:,}")
+
+        inicio = time.perf_counter()
+        for tabla in ("usuarios", "documentos", "detalle_documentos"):
+            cursor.execute(f"ANALYZE {tabla}")
+        conexion.commit()
+        print(f"  ANALYZE              {time.perf_counter() - inicio:8.1f} s")
+    finally:
+        conexion.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--usuarios", type=int, default=1000)
+    parser.add_argument("--documentos", type=int, default=None, help="Por defecto 50 por usuario")
+    parser.add_argument("--detalles", type=int, default=None, help="Por defecto 4 por documento")
+    parser.add_argument("--stock", type=int, default=0, help="Fijar el stock de todos los productos")
+    parser.add_argument("--semilla", type=int, default=2025)
+    parser.add_argument("--limpiar", action="store_true", help="Eliminar los datos sintéticos y terminar")
+    args = parser.parse_args()
+    if args.documentos is None:
+        args.documentos = args.usuarios * 50
+    if args.detalles is None:
+        args.detalles = args.documentos * 4
+
+    try:
+        if args.limpiar:
+            limpiar()
+        else:
+            cargar(args)
+    except OperationalError as e:
+        print(f"PostgreSQL no disponible: {e.orig}")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,8 +38,10 @@ CREATE TABLE IF NOT EXISTS documentos (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     usuario_id UUID NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
     estado VARCHAR(50) DEFAULT 'borrador',
-    monto_total FLOAT DEFAULT 0,
+    -- NOT NULL: la paginación por monto compara (monto_total, id) y un NULL quedaría fuera
+    monto_total FLOAT NOT NULL DEFAULT 0,
     ruta_documento VARCHAR(255),
+    pdf_estado VARCHAR(20),
     metadata JSONB DEFAULT '{}',
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -57,6 +59,41 @@ CREATE TABLE IF NOT EXISTS detalle_documentos (
     fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Tabla de productos (stock transaccional; el catálogo descriptivo sigue en productos.json)
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    nombre VARCHAR(255) NOT NULL,
+    precio FLOAT NOT NULL DEFAULT 0,
+    stock INTEGER NOT NULL DEFAULT 0,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT ck_productos_stock_no_negativo CHECK (stock >= 0)
+);
+
+-- Cola durable de generación de comprobantes PDF
+CREATE TABLE IF NOT EXISTS trabajos_pdf (
+    id BIGSERIAL PRIMARY KEY,
+    documento_id UUID NOT NULL UNIQUE REFERENCES documentos(id) ON DELETE CASCADE,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    ultimo_error TEXT,
+    disponible_en TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    bloqueado_hasta TIMESTAMP WITH TIME ZONE,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Refresh tokens (solo el HMAC del token; rotan dentro de una familia por login)
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    token_hash BYTEA PRIMARY KEY,
+    familia UUID NOT NULL,
+    usuario_id UUID NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    expira_en TIMESTAMP WITH TIME ZONE NOT NULL,
+    usado_en TIMESTAMP WITH TIME ZONE,
+    revocado BOOLEAN NOT NULL DEFAULT false,
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indices para mejor rendimiento
 
 CREATE INDEX idx_usuarios_rut ON usuarios(rut);
@@ -65,6 +102,7 @@ CREATE INDEX idx_usuarios_email ON usuarios(email);
 CREATE INDEX idx_documentos_usuario ON documentos(usuario_id);
 CREATE INDEX idx_documentos_estado ON documentos(estado);
 CREATE INDEX idx_documentos_metadata ON documentos USING GIN (metadata);
+CREATE INDEX idx_documentos_pdf_estado ON documentos(pdf_estado) WHERE pdf_estado <> 'listo';
 CREATE INDEX idx_detalle_documento ON detalle_documentos(documento_id);
 CREATE INDEX idx_detalle_metadata ON detalle_documentos USING GIN (metadata);
 CREATE INDEX idx_direcciones_usuario ON direcciones_despacho(usuario_id);
@@ -73,6 +111,14 @@ CREATE INDEX idx_direcciones_activa ON direcciones_despacho(activa);
 CREATE INDEX idx_direcciones_comuna ON direcciones_despacho(comuna);
 CREATE INDEX idx_direcciones_ciudad ON direcciones_despacho(ciudad);
 CREATE INDEX idx_direcciones_metadata ON direcciones_despacho USING GIN (metadata);
+CREATE INDEX idx_trabajos_pdf_cola ON trabajos_pdf(disponible_en) WHERE estado IN ('pendiente', 'procesando');
+-- Paginación por cursor: (columna de orden, id) por cada orden de los listados
+CREATE INDEX idx_usuarios_fecha_id ON usuarios(fecha_creacion, id);
+CREATE INDEX idx_documentos_usuario_fecha_id ON documentos(usuario_id, fecha_creacion, id);
+CREATE INDEX idx_documentos_usuario_monto_id ON documentos(usuario_id, monto_total, id);
+CREATE INDEX idx_refresh_tokens_familia ON refresh_tokens(familia);
+CREATE INDEX idx_refresh_tokens_usuario ON refresh_tokens(usuario_id) WHERE NOT revocado;
+CREATE INDEX idx_refresh_tokens_expira ON refresh_tokens(expira_en);
 
 -- Función para actualizar fecha_actualizacion automáticamente
 CREATE OR REPLACE FUNCTION actualizar_fecha_actualizacion()
@@ -99,28 +145,74 @@ CREATE TRIGGER trigger_detalle_actualizacion
     FOR EACH ROW
     EXECUTE FUNCTION actualizar_fecha_actualizacion();
 
--- Función para calcular monto_total automáticamente
+CREATE TRIGGER trigger_productos_actualizacion
+    BEFORE UPDATE ON productos
+    FOR EACH ROW
+    EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_trabajos_pdf_actualizacion
+    BEFORE UPDATE ON trabajos_pdf
+    FOR EACH ROW
+    EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+-- Recalcular monto_total (detalles + costo de envío) de un conjunto de documentos
+CREATE OR REPLACE FUNCTION recalcular_monto_total(ids UUID[])
+RETURNS VOID AS $$
+BEGIN
+  UPDATE documentos d
+  SET monto_total = COALESCE(t.suma, 0) + COALESCE((d.metadata->>'costo_envio')::FLOAT, 0)
+  FROM (
+    SELECT doc.id, SUM(dd.precio * dd.cantidad) AS suma
+    FROM unnest(ids) AS doc(id)
+    LEFT JOIN detalle_documentos dd ON dd.documento_id = doc.id
+    GROUP BY doc.id
+  ) t
+  WHERE d.id = t.id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger por sentencia: un solo recálculo por INSERT/UPDATE/DELETE, sin importar cuántas filas afecte
 CREATE OR REPLACE FUNCTION actualizar_monto_total()
 RETURNS TRIGGER AS $$
+DECLARE
+  ids UUID[];
 BEGIN
-  IF TG_OP = 'DELETE' THEN
-    UPDATE documentos
-    SET monto_total = COALESCE((SELECT SUM(precio * cantidad) FROM detalle_documentos WHERE documento_id = OLD.documento_id), 0)
-    WHERE id = OLD.documento_id;
-    RETURN OLD;
+  IF TG_OP = 'INSERT' THEN
+    SELECT array_agg(DISTINCT documento_id) INTO ids FROM nuevos;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT array_agg(DISTINCT documento_id) INTO ids FROM antiguos;
   ELSE
-    UPDATE documentos
-    SET monto_total = COALESCE((SELECT SUM(precio * cantidad) FROM detalle_documentos WHERE documento_id = NEW.documento_id), 0)
-    WHERE id = NEW.documento_id;
-    RETURN NEW;
+    SELECT array_agg(DISTINCT documento_id) INTO ids
+    FROM (SELECT documento_id FROM nuevos UNION SELECT documento_id FROM antiguos) cambios;
   END IF;
+  IF ids IS NOT NULL THEN
+    PERFORM recalcular_monto_total(ids);
+  END IF;
+  RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Las tablas de transición no pueden compartirse entre eventos: un trigger por operación
 DROP TRIGGER IF EXISTS trigger_detalle_monto ON detalle_documentos;
-CREATE TRIGGER trigger_detalle_monto
-    AFTER INSERT OR UPDATE OR DELETE ON detalle_documentos
-    FOR EACH ROW
+DROP TRIGGER IF EXISTS trigger_detalle_monto_insert ON detalle_documentos;
+CREATE TRIGGER trigger_detalle_monto_insert
+    AFTER INSERT ON detalle_documentos
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_monto_total();
+
+DROP TRIGGER IF EXISTS trigger_detalle_monto_update ON detalle_documentos;
+CREATE TRIGGER trigger_detalle_monto_update
+    AFTER UPDATE ON detalle_documentos
+    REFERENCING OLD TABLE AS antiguos NEW TABLE AS nuevos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_monto_total();
+
+DROP TRIGGER IF EXISTS trigger_detalle_monto_delete ON detalle_documentos;
+CREATE TRIGGER trigger_detalle_monto_delete
+    AFTER DELETE ON detalle_documentos
+    REFERENCING OLD TABLE AS antiguos
+    FOR EACH STATEMENT
     EXECUTE FUNCTION actualizar_monto_total();
 
 -- Usuario de prueba (password: admin123)
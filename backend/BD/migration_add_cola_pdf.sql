@@ -0,0 +1,57 @@
+-- Migración: Cola de generación de comprobantes PDF
+-- Ejecutar este script si la base de datos ya existe
+
+-- Agregar columna pdf_estado a documentos si no existe
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_name = 'documentos' 
+        AND column_name = 'pdf_estado'
+    ) THEN
+        ALTER TABLE documentos 
+        ADD COLUMN pdf_estado VARCHAR(20);
+        
+        -- Los documentos que ya tienen PDF quedan como listos
+        UPDATE documentos SET pdf_estado = 'listo' WHERE ruta_documento IS NOT NULL;
+        
+        CREATE INDEX IF NOT EXISTS idx_documentos_pdf_estado 
+        ON documentos(pdf_estado) WHERE pdf_estado <> 'listo';
+        
+        RAISE NOTICE 'Columna pdf_estado agregada a documentos';
+    ELSE
+        RAISE NOTICE 'Columna pdf_estado ya existe en documentos';
+    END IF;
+END $$;
+
+-- Crear tabla de trabajos si no existe
+CREATE TABLE IF NOT EXISTS trabajos_pdf (
+    id BIGSERIAL PRIMARY KEY,
+    documento_id UUID NOT NULL UNIQUE REFERENCES documentos(id) ON DELETE CASCADE,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    ultimo_error TEXT,
+    disponible_en TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    bloqueado_hasta TIMESTAMP WITH TIME ZONE,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_trabajos_pdf_cola 
+ON trabajos_pdf(disponible_en) WHERE estado IN ('pendiente', 'procesando');
+
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'trigger_trabajos_pdf_actualizacion'
+    ) THEN
+        CREATE TRIGGER trigger_trabajos_pdf_actualizacion
+            BEFORE UPDATE ON trabajos_pdf
+            FOR EACH ROW
+            EXECUTE FUNCTION actualizar_fecha_actualizacion();
+        
+        RAISE NOTICE 'Trigger trigger_trabajos_pdf_actualizacion creado';
+    ELSE
+        RAISE NOTICE 'Trigger trigger_trabajos_pdf_actualizacion ya existe';
+    END IF;
+END $$;
@@ -0,0 +1,29 @@
+-- Migración: Crear tabla productos para el control de stock en checkout
+-- Ejecutar este script si la base de datos ya existe
+-- El stock inicial se copia desde productos.json al iniciar la API (INSERT ... ON CONFLICT DO NOTHING)
+
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    nombre VARCHAR(255) NOT NULL,
+    precio FLOAT NOT NULL DEFAULT 0,
+    stock INTEGER NOT NULL DEFAULT 0,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT ck_productos_stock_no_negativo CHECK (stock >= 0)
+);
+
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'trigger_productos_actualizacion'
+    ) THEN
+        CREATE TRIGGER trigger_productos_actualizacion
+            BEFORE UPDATE ON productos
+            FOR EACH ROW
+            EXECUTE FUNCTION actualizar_fecha_actualizacion();
+        
+        RAISE NOTICE 'Trigger trigger_productos_actualizacion creado';
+    ELSE
+        RAISE NOTICE 'Trigger trigger_productos_actualizacion ya existe';
+    END IF;
+END $$;
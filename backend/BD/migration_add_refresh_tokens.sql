@@ -0,0 +1,16 @@
+-- Migración: Refresh tokens con rotación
+-- Ejecutar este script si la base de datos ya existe
+
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    token_hash BYTEA PRIMARY KEY,
+    familia UUID NOT NULL,
+    usuario_id UUID NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+    expira_en TIMESTAMP WITH TIME ZONE NOT NULL,
+    usado_en TIMESTAMP WITH TIME ZONE,
+    revocado BOOLEAN NOT NULL DEFAULT false,
+    fecha_creacion TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_familia ON refresh_tokens(familia);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_usuario ON refresh_tokens(usuario_id) WHERE NOT revocado;
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expira ON refresh_tokens(expira_en);
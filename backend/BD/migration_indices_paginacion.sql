@@ -0,0 +1,18 @@
+-- Migración: Índices para la paginación por cursor (keyset)
+-- Ejecutar este script si la base de datos ya existe.
+-- CONCURRENTLY no bloquea las escrituras; psql ejecuta cada sentencia en su propia transacción.
+
+-- GET /usuarios (fecha_creacion, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_usuarios_fecha_id
+ON usuarios(fecha_creacion, id);
+
+-- GET /documentos y /usuarios/me/compras?orden=fecha_asc|fecha_desc
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documentos_usuario_fecha_id
+ON documentos(usuario_id, fecha_creacion, id);
+
+-- /usuarios/me/compras?orden=monto_asc|monto_desc
+-- Con monto_total NULL la comparación (monto_total, id) > (...) descarta la fila: sin NULLs
+UPDATE documentos SET monto_total = 0 WHERE monto_total IS NULL;
+ALTER TABLE documentos ALTER COLUMN monto_total SET NOT NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documentos_usuario_monto_id
+ON documentos(usuario_id, monto_total, id);
@@ -0,0 +1,68 @@
+-- Migración: Reemplazar el trigger por fila de monto_total por triggers por sentencia
+-- Ejecutar este script si la base de datos ya existe
+-- El checkout inserta todos los detalles en un solo INSERT; con estos triggers el
+-- total de cada documento se recalcula una vez por sentencia y no una vez por fila.
+-- monto_total pasa a incluir metadata.costo_envio (igual que el total del PDF).
+
+-- Recalcular monto_total (detalles + costo de envío) de un conjunto de documentos
+CREATE OR REPLACE FUNCTION recalcular_monto_total(ids UUID[])
+RETURNS VOID AS $$
+BEGIN
+  UPDATE documentos d
+  SET monto_total = COALESCE(t.suma, 0) + COALESCE((d.metadata->>'costo_envio')::FLOAT, 0)
+  FROM (
+    SELECT doc.id, SUM(dd.precio * dd.cantidad) AS suma
+    FROM unnest(ids) AS doc(id)
+    LEFT JOIN detalle_documentos dd ON dd.documento_id = doc.id
+    GROUP BY doc.id
+  ) t
+  WHERE d.id = t.id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger por sentencia: un solo recálculo por INSERT/UPDATE/DELETE, sin importar cuántas filas afecte
+CREATE OR REPLACE FUNCTION actualizar_monto_total()
+RETURNS TRIGGER AS $$
+DECLARE
+  ids UUID[];
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    SELECT array_agg(DISTINCT documento_id) INTO ids FROM nuevos;
+  ELSIF TG_OP = 'DELETE' THEN
+    SELECT array_agg(DISTINCT documento_id) INTO ids FROM antiguos;
+  ELSE
+    SELECT array_agg(DISTINCT documento_id) INTO ids
+    FROM (SELECT documento_id FROM nuevos UNION SELECT documento_id FROM antiguos) cambios;
+  END IF;
+  IF ids IS NOT NULL THEN
+    PERFORM recalcular_monto_total(ids);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Las tablas de transición no pueden compartirse entre eventos: un trigger por operación
+DROP TRIGGER IF EXISTS trigger_detalle_monto ON detalle_documentos;
+DROP TRIGGER IF EXISTS trigger_detalle_monto_insert ON detalle_documentos;
+CREATE TRIGGER trigger_detalle_monto_insert
+    AFTER INSERT ON detalle_documentos
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_monto_total();
+
+DROP TRIGGER IF EXISTS trigger_detalle_monto_update ON detalle_documentos;
+CREATE TRIGGER trigger_detalle_monto_update
+    AFTER UPDATE ON detalle_documentos
+    REFERENCING OLD TABLE AS antiguos NEW TABLE AS nuevos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_monto_total();
+
+DROP TRIGGER IF EXISTS trigger_detalle_monto_delete ON detalle_documentos;
+CREATE TRIGGER trigger_detalle_monto_delete
+    AFTER DELETE ON detalle_documentos
+    REFERENCING OLD TABLE AS antiguos
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION actualizar_monto_total();
+
+-- Recalcular con la nueva regla los totales de documentos que tienen detalles
+SELECT recalcular_monto_total(ARRAY(SELECT DISTINCT documento_id FROM detalle_documentos));
@@ -0,0 +1,19 @@
+#!/bin/bash
+# Réplica de solo lectura: clona la primaria con pg_basebackup la primera vez y arranca en standby
+set -e
+
+until pg_isready -h db -U replicador; do
+    echo "Esperando a la primaria..."
+    sleep 2
+done
+
+if [ -z "$(ls -A "$PGDATA" 2>/dev/null)" ]; then
+    mkdir -p "$PGDATA"
+    chown postgres:postgres "$PGDATA"
+    chmod 700 "$PGDATA"
+    # -R escribe standby.signal y primary_conninfo
+    PGPASSWORD="$POSTGRES_PASSWORD" gosu postgres \
+        pg_basebackup -h db -U replicador -D "$PGDATA" -R -X stream -P
+fi
+
+exec docker-entrypoint.sh postgres
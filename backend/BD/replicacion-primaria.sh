@@ -0,0 +1,9 @@
+#!/bin/bash
+# Prepara la primaria para replicación en streaming (solo en la primera inicialización del volumen)
+set -e
+
+psql -v ON_ERROR_STOP=1 --username "$POSTGRES_USER" --dbname "$POSTGRES_DB" <<-EOSQL
+    CREATE ROLE replicador WITH REPLICATION LOGIN PASSWORD '${POSTGRES_PASSWORD}';
+EOSQL
+
+echo "host replication replicador all scram-sha-256" >> "$PGDATA/pg_hba.conf"
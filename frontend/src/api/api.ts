@@ -40,9 +40,42 @@ export async function getProducts(): Promise<Product[]> {
   }
 }
 
+export interface ProductSearchParams {
+  q?: string;
+  categoria?: string;
+  precio_min?: number;
+  precio_max?: number;
+  orden?: 'id' | 'precio_asc' | 'precio_desc' | 'rating_asc' | 'rating_desc';
+  skip?: number;
+  limit?: number;
+}
+
+export interface ProductSearchResult {
+  total: number;
+  skip: number;
+  limit: number;
+  items: Product[];
+}
+
+// Búsqueda, filtros y paginación resueltos en el backend (GET /productos)
+export async function searchProducts(params: ProductSearchParams = {}): Promise<ProductSearchResult> {
+  const res = await backendClient.get('/productos', { params });
+  return res.data as ProductSearchResult;
+}
+
+async function findLocalProduct(id: number): Promise<Product | null> {
+  try {
+    const res = await backendClient.get(`/productos/${id}`);
+    return res.data as Product;
+  } catch (e: any) {
+    if (e?.response?.status === 404) return null;
+    const local = await loadLocalList();
+    return local.find(p => p.id === id) ?? null;
+  }
+}
+
 export async function getProductById(id: number): Promise<Product | null> {
-  const local = await loadLocalList();
-  const foundLocal = local.find(p => p.id === id);
+  const foundLocal = await findLocalProduct(id);
   if (!foundLocal) return null; 
 
   try {